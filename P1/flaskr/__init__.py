@@ -11,13 +11,34 @@ from typing import Optional, Dict, Any
 from flask import Flask, session
 from flask_sqlalchemy import SQLAlchemy
 
-from flaskr.db import get_db, initialize_northwind
+from flaskr.db import (
+    get_db,
+    init_app,
+    initialize_northwind,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_WRITER_POOL_SIZE,
+    DEFAULT_POOL_TIMEOUT,
+    DEFAULT_CACHE_SIZE_KIB,
+    DEFAULT_MMAP_SIZE,
+    DEFAULT_BUSY_TIMEOUT_MS,
+)
 from flaskr.products import products_bp
 from flaskr.user import bp as user_bp
-from flaskr.cart import cart_bp
+from flaskr.cart import cart_bp, expire_carts_command, start_cart_expiry_worker
 from flaskr.orders import orders_bp
 from flaskr.landing import landing_bp
 from flaskr.checkout import checkout_bp
+from flaskr.idempotency import expire_idempotency_keys_command
+from flaskr.logs import init_logging
+from flaskr.metrics import init_metrics
+from flaskr.passwords import DEFAULT_HASH_METHOD
+from flaskr.profiling import init_profiling
+from flaskr.sessions import (
+    expire_sessions_command,
+    is_sessionless,
+    make_session_interface,
+    sessionless,
+)
 
 db = SQLAlchemy()
 
@@ -40,6 +61,52 @@ def create_app(test_config: Optional[Dict[str, Any]] = None) -> Flask:
         SECRET_KEY=os.getenv("SECRET_KEY", os.urandom(24).hex()),
         DATABASE=db_path if test_config is None else test_config["DATABASE"],
         SQLALCHEMY_DATABASE_URI=f"sqlite:///{db_path}",
+        DB_POOL_SIZE=DEFAULT_POOL_SIZE,
+        DB_WRITER_POOL_SIZE=DEFAULT_WRITER_POOL_SIZE,
+        DB_SPLIT_READS=True,
+        PRODUCTS_PAGE_SIZE=50,
+        PRODUCTS_MAX_PAGE_SIZE=200,
+        CATALOG_CACHE_ENABLED=True,
+        CATALOG_CACHE_TTL=1.0,
+        CATALOG_CACHE_MAX_PRODUCTS=100_000,
+        ORDERS_PAGE_SIZE=20,
+        ORDERS_INCLUDE_ITEMS=True,
+        CART_RETENTION_DAYS=30,
+        CART_EXPIRY_BATCH_SIZE=500,
+        CART_EXPIRY_INTERVAL=0,
+        ORDER_QUEUE_ENABLED=False,
+        ORDER_QUEUE_MAX_BATCH=32,
+        ORDER_QUEUE_MAX_WAIT=0.005,
+        ORDER_QUEUE_TIMEOUT=30.0,
+        IDEMPOTENCY_KEY_TTL=86400,
+        IDEMPOTENCY_CLAIM_TIMEOUT=60,
+        AUTH_CACHE_ENABLED=True,
+        AUTH_CACHE_TTL=30.0,
+        AUTH_CACHE_MAX_ENTRIES=1024,
+        PASSWORD_HASH_METHOD=DEFAULT_HASH_METHOD,
+        PASSWORD_HASH_WORKERS=min(4, os.cpu_count() or 1),
+        PASSWORD_HASH_MAX_PENDING=64,
+        PASSWORD_HASH_TIMEOUT=10.0,
+        SESSION_BACKEND="sqlite",
+        DB_POOL_TIMEOUT=DEFAULT_POOL_TIMEOUT,
+        DB_CACHE_SIZE_KIB=DEFAULT_CACHE_SIZE_KIB,
+        DB_MMAP_SIZE=DEFAULT_MMAP_SIZE,
+        DB_BUSY_TIMEOUT_MS=DEFAULT_BUSY_TIMEOUT_MS,
+        DB_INSTRUMENT=False,
+        DB_SLOW_QUERY_MS=100.0,
+        DB_EXPLAIN_SLOW_QUERIES=True,
+        METRICS_ENABLED=False,
+        METRICS_PATH="/metrics",
+        METRICS_TOKEN=None,
+        PROFILE_SAMPLE_RATE=0.0,
+        PROFILE_TOKEN=None,
+        PROFILE_DIR=None,
+        PROFILE_INTERVAL=0.005,
+        PROFILE_FLUSH_INTERVAL=10.0,
+        LOG_ASYNC=True,
+        LOG_LEVEL="INFO",
+        LOG_FILE=None,
+        LOG_QUEUE_SIZE=10_000,
     )
 
     if test_config is None:
@@ -52,16 +119,24 @@ def create_app(test_config: Optional[Dict[str, Any]] = None) -> Flask:
     except OSError:
         pass
 
+    init_logging(app)
+    init_app(app)
+    init_metrics(app)
+    init_profiling(app)
+
     with app.app_context():
         initialize_northwind()
 
+    app.session_interface = make_session_interface(app)
+
     @app.before_request
     def ensure_session_id() -> None:
         """Ensure session_id exists before each request, or create one."""
-        if "session_id" not in session:
+        if not is_sessionless() and "session_id" not in session:
             session["session_id"] = secrets.token_hex(16)
 
     @app.route("/hello")
+    @sessionless
     def hello() -> str:
         """Simple test route."""
         return "Hello, World!"
@@ -75,4 +150,10 @@ def create_app(test_config: Optional[Dict[str, Any]] = None) -> Flask:
     app.register_blueprint(landing_bp)
     app.register_blueprint(checkout_bp)
 
+    app.cli.add_command(expire_carts_command)
+    app.cli.add_command(expire_idempotency_keys_command)
+    app.cli.add_command(expire_sessions_command)
+    if app.config["CART_EXPIRY_INTERVAL"] > 0:
+        start_cart_expiry_worker(app)
+
     return app
@@ -1,19 +1,35 @@
 """
 Cart module for managing shopping cart functionality.
 
-This module includes routes for viewing, adding, and removing items
-in the shopper's cart, as well as auxiliary functions such as
-cleanup and timestamp handling.
+This module includes routes for viewing, adding (one at a time or in
+bulk), and removing items in the shopper's cart, which accept idempotency
+keys so client retries are not applied twice, as well as auxiliary functions such as
+timestamp handling and batched expiry of stale carts, which runs from the
+`expire-carts` CLI command or a background worker thread.
 """
 
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 
-from flask import Blueprint, request, session, redirect, url_for, render_template
+import click
+from flask import (
+    Blueprint,
+    Flask,
+    current_app,
+    request,
+    session,
+    redirect,
+    url_for,
+    render_template,
+)
+from flask.cli import with_appcontext
 from werkzeug.wrappers import Response as WerkzeugResponse
 
+from flaskr.catalog import get_catalog
 from flaskr.db import get_db
+from flaskr.idempotency import idempotent
 
 cart_bp = Blueprint("cart", __name__, url_prefix="/cart")
 
@@ -23,22 +39,52 @@ def view_cart() -> str:
     """
     Show all items in this shopper's cart, including product details.
 
+    Product names and prices come from the in-process catalog cache when it is
+    available, so only the shopper's cart rows are read from the database. If
+    a cart product is not in the snapshot yet, the cart is read with a join.
+
     Returns:
         str: Rendered template with items in the cart.
     """
     cart_id: str = session["session_id"]
     db = get_db()
 
-    rows = db.execute(
-        """
-        SELECT sc.ProductID, sc.Quantity, sc.AddedAt,
-               p.ProductName, p.UnitPrice
-        FROM Shopping_cart sc
-        JOIN Products p ON sc.ProductID = p.ProductID
-        WHERE sc.ShopperID = ?
-        """,
-        (cart_id,),
-    ).fetchall()
+    rows: Optional[List[Any]] = None
+    catalog = get_catalog(db)
+    if catalog is not None:
+        cart_rows = db.execute(
+            """
+            SELECT ProductID, Quantity, AddedAt
+            FROM Shopping_cart
+            WHERE ShopperID = ?
+            """,
+            (cart_id,),
+        ).fetchall()
+        products = [catalog.by_id.get(product_id) for product_id, _, _ in cart_rows]
+        # A product newer than the snapshot falls through to the join below.
+        if all(product is not None for product in products):
+            rows = [
+                {
+                    "ProductID": product_id,
+                    "Quantity": quantity,
+                    "AddedAt": added_at,
+                    "ProductName": product.ProductName,
+                    "UnitPrice": product.UnitPrice,
+                }
+                for (product_id, quantity, added_at), product in zip(cart_rows, products)
+            ]
+
+    if rows is None:
+        rows = db.execute(
+            """
+            SELECT sc.ProductID, sc.Quantity, sc.AddedAt,
+                   p.ProductName, p.UnitPrice
+            FROM Shopping_cart sc
+            JOIN Products p ON sc.ProductID = p.ProductID
+            WHERE sc.ShopperID = ?
+            """,
+            (cart_id,),
+        ).fetchall()
 
     items: List[Dict[str, Any]] = []
     total: float = 0.0
@@ -59,11 +105,23 @@ def view_cart() -> str:
     return render_template("cart/cart_html.html", items=items, total=total)
 
 
+UPSERT_CART_ITEM: str = """
+    INSERT INTO Shopping_cart (ShopperID, ProductID, Quantity, AddedAt)
+    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (ShopperID, ProductID) DO UPDATE
+    SET Quantity = Quantity + excluded.Quantity, AddedAt = CURRENT_TIMESTAMP
+"""
+
+
 @cart_bp.route("add/", methods=["POST"])
+@idempotent
 def add_to_cart() -> Tuple[Dict[str, str], int]:
     """
     Add a product to the cart, or increase quantity if it already exists.
 
+    The insert-or-increment is a single UPSERT, so concurrent adds of the same
+    product cannot lose an update.
+
     Returns:
         Tuple[Dict[str, str], int]: A JSON status message and HTTP code.
     """
@@ -74,39 +132,91 @@ def add_to_cart() -> Tuple[Dict[str, str], int]:
     )  # Default to 1 if missing
 
     db = get_db()
+    db.execute(UPSERT_CART_ITEM, (cart_id, product_id, added_quantity))
+    db.commit()
+    return {"status": "success", "message": "Item added to cart"}, 200
 
-    existing_item: Optional[sqlite3.Row] = db.execute(
-        """
-        SELECT Quantity FROM Shopping_cart
-        WHERE ShopperID = ? AND ProductID = ?
-        """,
-        (cart_id, product_id),
-    ).fetchone()
 
-    if existing_item:
-        new_quantity: int = existing_item["Quantity"] + added_quantity
-        db.execute(
-            """
-            UPDATE Shopping_cart
-            SET Quantity = ?, AddedAt = CURRENT_TIMESTAMP
-            WHERE ShopperID = ? AND ProductID = ?
-            """,
-            (new_quantity, cart_id, product_id),
-        )
+def _bulk_items() -> List[Tuple[int, int]]:
+    """
+    Read (product_id, quantity) pairs from a JSON body or repeated form fields.
+
+    JSON bodies look like `{"items": [{"product_id": 1, "quantity": 2}, ...]}`;
+    forms repeat `product_id` and `quantity` in the same order.
+
+    Raises:
+        ValueError: If the payload is missing or has invalid ids or quantities.
+    """
+    pairs: List[Tuple[Any, Any]]
+    if request.is_json:
+        body = request.get_json(silent=True) or {}
+        raw_items = body.get("items") if isinstance(body, dict) else None
+        if not isinstance(raw_items, list):
+            raise ValueError("Expected a list of items.")
+        pairs = [
+            (item.get("product_id"), item.get("quantity", 1))
+            for item in raw_items
+            if isinstance(item, dict)
+        ]
+        if len(pairs) != len(raw_items):
+            raise ValueError("Each item must be an object.")
     else:
-        db.execute(
-            """
-            INSERT INTO Shopping_cart (ShopperID, ProductID, Quantity, AddedAt)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-            """,
-            (cart_id, product_id, added_quantity),
-        )
+        product_ids = request.form.getlist("product_id")
+        quantities = request.form.getlist("quantity")
+        if quantities and len(quantities) != len(product_ids):
+            raise ValueError("Each product_id needs a matching quantity.")
+        pairs = list(zip(product_ids, quantities or ["1"] * len(product_ids)))
 
-    db.commit()
-    return {"status": "success", "message": "Item added to cart"}, 200
+    if not pairs:
+        raise ValueError("No items to add.")
+
+    items: List[Tuple[int, int]] = []
+    for product_id, quantity in pairs:
+        try:
+            items.append((int(product_id), int(quantity)))
+        except (TypeError, ValueError) as e:
+            raise ValueError("Product ids and quantities must be integers.") from e
+        if items[-1][1] < 1:
+            raise ValueError("Quantities must be at least 1.")
+    return items
+
+
+@cart_bp.route("add-bulk", methods=["POST"])
+@idempotent
+def add_bulk_to_cart() -> Tuple[Dict[str, Any], int]:
+    """
+    Add many products to the cart in one transaction.
+
+    Used by "reorder" and "add bundle" flows so N items cost one commit.
+
+    Returns:
+        Tuple[Dict[str, Any], int]: A JSON status message and HTTP code.
+    """
+    cart_id: str = session["session_id"]
+    try:
+        items = _bulk_items()
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+
+    db = get_db()
+    try:
+        db.executemany(
+            UPSERT_CART_ITEM,
+            [(cart_id, product_id, quantity) for product_id, quantity in items],
+        )
+        db.commit()
+    except sqlite3.Error:
+        db.rollback()
+        raise
+    return {
+        "status": "success",
+        "message": f"{len(items)} items added to cart",
+        "count": len(items),
+    }, 200
 
 
 @cart_bp.route("remove/", methods=["POST"])
+@idempotent
 def remove_from_cart() -> WerkzeugResponse:
     """
     Remove a single product from the cart by its ProductID.
@@ -143,17 +253,134 @@ def get_est_time() -> datetime:
     return datetime.now()
 
 
-def cleanup_old_cart_entries() -> None:
+def expire_cart_batch(db: sqlite3.Connection, cutoff: str, batch_size: int) -> int:
     """
-    Remove cart entries older than 30 days.
+    Delete at most `batch_size` cart rows added before `cutoff` and commit.
+
+    The rows are located through the `AddedAt` index, so each batch touches
+    only the rows it deletes and holds the write lock briefly.
+
+    Args:
+        db (sqlite3.Connection): A writable database connection.
+        cutoff (str): Rows with `AddedAt` strictly before this timestamp expire.
+        batch_size (int): Maximum number of rows to delete.
+
+    Returns:
+        int: The number of rows deleted.
     """
-    db = get_db()
-    one_month_ago: datetime = get_est_time() - timedelta(days=30)
-    db.execute(
+    cursor = db.execute(
         """
         DELETE FROM Shopping_cart
-        WHERE AddedAt < ?
+        WHERE rowid IN (
+            SELECT rowid FROM Shopping_cart
+            WHERE AddedAt < ?
+            LIMIT ?
+        )
         """,
-        (one_month_ago,),
+        (cutoff, batch_size),
     )
     db.commit()
+    return cursor.rowcount
+
+
+def cart_expiry_cutoff(db: sqlite3.Connection, retention_days: int) -> str:
+    """
+    Return the UTC timestamp before which cart rows are stale.
+
+    Computed by SQLite so it has the same format as `CURRENT_TIMESTAMP`.
+    """
+    return db.execute(
+        "SELECT datetime('now', ?)", (f"-{int(retention_days)} days",)
+    ).fetchone()[0]
+
+
+def cleanup_old_cart_entries(
+    retention_days: Optional[int] = None, batch_size: Optional[int] = None
+) -> int:
+    """
+    Remove cart entries older than the retention period, in bounded batches.
+
+    Args:
+        retention_days (Optional[int]): Defaults to `CART_RETENTION_DAYS` (30);
+            0 expires every row added before now.
+        batch_size (Optional[int]): Defaults to `CART_EXPIRY_BATCH_SIZE` (500).
+
+    Raises:
+        ValueError: If `batch_size` is less than 1.
+
+    Returns:
+        int: The total number of rows deleted.
+    """
+    config = current_app.config
+    if retention_days is None:
+        retention_days = config.get("CART_RETENTION_DAYS", 30)
+    if batch_size is None:
+        batch_size = config.get("CART_EXPIRY_BATCH_SIZE", 500)
+
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    db = get_db()
+    cutoff = cart_expiry_cutoff(db, retention_days)
+    total = 0
+    while True:
+        deleted = expire_cart_batch(db, cutoff, batch_size)
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def _run_cart_expiry(app: Flask, stop: threading.Event) -> None:
+    """
+    Worker loop: expire stale carts every `CART_EXPIRY_INTERVAL` seconds.
+
+    Each batch runs in its own app context so the writer connection is
+    returned to the pool between batches and requests can interleave.
+    """
+    while not stop.wait(app.config["CART_EXPIRY_INTERVAL"]):
+        try:
+            with app.app_context():
+                cutoff = cart_expiry_cutoff(
+                    get_db(write=True), app.config.get("CART_RETENTION_DAYS", 30)
+                )
+            batch_size = app.config.get("CART_EXPIRY_BATCH_SIZE", 500)
+            while not stop.is_set():
+                with app.app_context():
+                    deleted = expire_cart_batch(get_db(write=True), cutoff, batch_size)
+                if deleted < batch_size:
+                    break
+        except sqlite3.Error as e:
+            app.logger.warning("Cart expiry failed: %s", e)
+
+
+def start_cart_expiry_worker(app: Flask) -> threading.Event:
+    """
+    Start a daemon thread that periodically expires stale carts.
+
+    Args:
+        app (Flask): The application whose database should be cleaned.
+
+    Returns:
+        threading.Event: Set it to stop the worker.
+    """
+    stop = threading.Event()
+    worker = threading.Thread(
+        target=_run_cart_expiry, args=(app, stop), name="cart-expiry", daemon=True
+    )
+    worker.start()
+    app.extensions["cart_expiry_worker"] = (worker, stop)
+    return stop
+
+
+@click.command("expire-carts")
+@click.option(
+    "--days", type=click.IntRange(min=0), default=None, help="Retention period in days."
+)
+@click.option(
+    "--batch-size", type=click.IntRange(min=1), default=None, help="Rows deleted per batch."
+)
+@with_appcontext
+def expire_carts_command(days: Optional[int], batch_size: Optional[int]) -> None:
+    """Flask CLI command to delete stale shopping cart rows, e.g. from cron."""
+    deleted = cleanup_old_cart_entries(days, batch_size)
+    click.echo(f"Expired {deleted} cart entries.")
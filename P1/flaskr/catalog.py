@@ -0,0 +1,264 @@
+"""
+Catalog module for an in-process cache of the product catalog.
+
+Products change rarely but are read by every catalog page and cart view, so
+each app keeps one immutable snapshot of the catalog in memory, indexed by
+ProductID and CategoryID. Triggers on `Products` bump a counter in
+`Catalog_version`; once the snapshot is older than `CATALOG_CACHE_TTL`
+seconds, a single primary-key read of that counter decides whether it is
+still current or has to be reloaded. `UnitsInStock` changes with every order,
+so it is left out of the snapshot and read live for the products shown.
+"""
+
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+import sqlite3
+from flask import current_app
+
+from flaskr.db import select_columns
+
+CATALOG_FIELDS: Tuple[str, ...] = (
+    "ProductID",
+    "ProductName",
+    "CategoryID",
+    "QuantityPerUnit",
+    "UnitPrice",
+    "ReorderLevel",
+)
+
+_CACHE_EXTENSION_KEY = "catalog_cache"
+_cache_lock = threading.Lock()
+
+
+class CatalogProduct:
+    """A compact, read-only product row that can be indexed like `sqlite3.Row`."""
+
+    __slots__ = CATALOG_FIELDS
+
+    ProductID: int
+    ProductName: str
+    CategoryID: Any
+    QuantityPerUnit: Any
+    UnitPrice: Any
+    ReorderLevel: Any
+
+    def __init__(self, row: sqlite3.Row) -> None:
+        for field in CATALOG_FIELDS:
+            object.__setattr__(self, field, row[field])
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("CatalogProduct is read-only")
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in CATALOG_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def keys(self) -> Tuple[str, ...]:
+        """Return the column names, mirroring `sqlite3.Row.keys()`."""
+        return CATALOG_FIELDS
+
+
+class CatalogSnapshot:
+    """An immutable view of the catalog at one `Catalog_version`."""
+
+    __slots__ = ("version", "checked_at", "by_id", "_all", "_by_category")
+
+    def __init__(self, version: int, rows: List[sqlite3.Row]) -> None:
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.by_id: Dict[int, CatalogProduct] = {}
+        self._all: Tuple["array[int]", List[CatalogProduct]] = (array("q"), [])
+        self._by_category: Dict[Any, Tuple["array[int]", List[CatalogProduct]]] = {}
+
+        for row in rows:  # rows arrive ordered by ProductID
+            product = CatalogProduct(row)
+            self.by_id[product.ProductID] = product
+            for ids, products in (
+                self._all,
+                self._by_category.setdefault(product.CategoryID, (array("q"), [])),
+            ):
+                ids.append(product.ProductID)
+                products.append(product)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def page(
+        self, category_id: Optional[int], after_id: Optional[int], limit: int
+    ) -> List[CatalogProduct]:
+        """
+        Return up to `limit` products ordered by ProductID, after `after_id`.
+
+        Args:
+            category_id (Optional[int]): Only return this category, if given.
+            after_id (Optional[int]): Keyset cursor; start after this ProductID.
+            limit (int): Maximum number of products to return.
+
+        Returns:
+            List[CatalogProduct]: The products on the page.
+        """
+        if category_id is None:
+            ids, products = self._all
+        else:
+            ids, products = self._by_category.get(category_id, (array("q"), []))
+        start = bisect_right(ids, after_id) if after_id is not None else 0
+        return products[start : start + limit]
+
+
+class CatalogCache:  # pylint: disable=too-many-instance-attributes
+    """
+    Thread-safe holder of the current `CatalogSnapshot` with hit/miss counters.
+
+    Catalogs with more than `max_products` rows are not cached at all so the
+    cache cannot grow without bound; callers fall back to SQL.
+    """
+
+    def __init__(self, ttl: float = 1.0, max_products: int = 100_000) -> None:
+        self.ttl = ttl
+        self.max_products = max_products
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.bypasses = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._oversized_version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self, db: sqlite3.Connection) -> Optional[CatalogSnapshot]:
+        """
+        Return a current snapshot, reloading it from `db` if the catalog changed.
+
+        Returns:
+            Optional[CatalogSnapshot]: The snapshot, or None if the catalog is too
+            large to cache or the database has no `Catalog_version` counter.
+        """
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - snapshot.checked_at < self.ttl:
+            self.hits += 1
+            return snapshot
+
+        try:
+            version_row = db.execute(
+                "SELECT version FROM Catalog_version WHERE id = 1"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            version_row = None
+        if version_row is None:
+            self.bypasses += 1
+            return None
+        version: int = version_row[0]
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                snapshot.checked_at = now
+                self.revalidations += 1
+                self.hits += 1
+                return snapshot
+            if version == self._oversized_version:
+                self.bypasses += 1
+                return None
+
+            self.misses += 1
+            rows = db.execute(
+                f"SELECT {select_columns(db, 'Products', CATALOG_FIELDS)} FROM Products "
+                "ORDER BY ProductID LIMIT ?",
+                (self.max_products + 1,),
+            ).fetchall()
+            if len(rows) > self.max_products:
+                self._snapshot = None
+                self._oversized_version = version
+                return None
+            # The counter was read before the rows, so a concurrent write can only
+            # make this snapshot look older than it is and trigger a reload.
+            self._snapshot = CatalogSnapshot(version, rows)
+            return self._snapshot
+
+    def clear(self) -> None:
+        """Drop the cached snapshot so the next lookup reloads it."""
+        with self._lock:
+            self._snapshot = None
+            self._oversized_version = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the size of the cached catalog."""
+        snapshot = self._snapshot
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "bypasses": self.bypasses,
+            "products": len(snapshot) if snapshot is not None else 0,
+            "version": snapshot.version if snapshot is not None else None,
+        }
+
+
+def with_live_stock(
+    db: sqlite3.Connection, products: List[CatalogProduct]
+) -> List[Dict[str, Any]]:
+    """
+    Return cached products as dicts with `UnitsInStock` read from the database.
+
+    Stock changes with every order, so it is not part of the snapshot and is
+    looked up by primary key for the products being shown.
+
+    Args:
+        db (sqlite3.Connection): The database connection.
+        products (List[CatalogProduct]): The products of one page.
+
+    Returns:
+        List[Dict[str, Any]]: The products, in order, including `UnitsInStock`.
+    """
+    if not products:
+        return []
+    ids = [product.ProductID for product in products]
+    stock = {
+        row["ProductID"]: row["UnitsInStock"]
+        for row in db.execute(
+            "SELECT ProductID, UnitsInStock FROM Products "
+            f"WHERE ProductID IN ({', '.join('?' * len(ids))})",
+            ids,
+        ).fetchall()
+    }
+    return [
+        dict(
+            {field: getattr(product, field) for field in CATALOG_FIELDS},
+            UnitsInStock=stock.get(product.ProductID),
+        )
+        for product in products
+    ]
+
+
+def get_catalog_cache() -> CatalogCache:
+    """Return the current application's catalog cache, creating it on first use."""
+    cache: Optional[CatalogCache] = current_app.extensions.get(_CACHE_EXTENSION_KEY)
+    if cache is None:
+        with _cache_lock:
+            cache = current_app.extensions.get(_CACHE_EXTENSION_KEY)
+            if cache is None:
+                cache = CatalogCache(
+                    ttl=current_app.config.get("CATALOG_CACHE_TTL", 1.0),
+                    max_products=current_app.config.get(
+                        "CATALOG_CACHE_MAX_PRODUCTS", 100_000
+                    ),
+                )
+                current_app.extensions[_CACHE_EXTENSION_KEY] = cache
+    return cache
+
+
+def get_catalog(db: sqlite3.Connection) -> Optional[CatalogSnapshot]:
+    """
+    Return the cached catalog for the current app, or None to fall back to SQL.
+
+    Args:
+        db (sqlite3.Connection): Connection used to revalidate or reload the cache.
+    """
+    if not current_app.config.get("CATALOG_CACHE_ENABLED", True):
+        return None
+    return get_catalog_cache().get(db)
@@ -2,15 +2,23 @@
 Checkout module for handling the cart checkout process.
 
 This module manages the checkout flow, including verifying user session,
-checking cart contents, placing orders, and clearing cart entries.
+checking cart contents, and placing orders. An order is placed in one
+`BEGIN IMMEDIATE` transaction that writes the order header and line items,
+decrements stock and clears the cart, so it costs a single commit. With
+`ORDER_QUEUE_ENABLED`, orders go through the group-commit order queue instead.
+A POST carrying an idempotency key places at most one order however often
+the client retries it.
 """
 
 # pylint: disable=too-many-locals, too-many-return-statements, broad-exception-caught
 
-from typing import Union, Any
+import logging
+import sqlite3
+from typing import Union, Any, Tuple
 
 from flask import (
     Blueprint,
+    current_app,
     request,
     session,
     redirect,
@@ -21,12 +29,131 @@ from flask import (
 )
 from werkzeug.wrappers import Response as WerkzeugResponse
 
-from flaskr.db import get_db
+from flaskr.db import get_db, record_order_stats, release_writer
+from flaskr.idempotency import idempotent
+from flaskr.order_queue import get_order_queue
+
+logger = logging.getLogger(__name__)
 
 checkout_bp = Blueprint("checkout", __name__, url_prefix="/checkout")
 
 
+class InsufficientStockError(Exception):
+    """Raised when a cart line asks for more units than are in stock."""
+
+
+def write_order(
+    db: sqlite3.Connection, user_id: str, cart_id: Any, shipping: Tuple[Any, ...]
+) -> int:
+    """
+    Turn the shopper's cart into an order inside the caller's transaction.
+
+    Inserts the `Orders` header, copies every cart line into `Order Details`
+    at the current unit price, decrements `UnitsInStock` for all lines at
+    once, adds the order to the customer's `CustomerOrderStats` row, and
+    clears the cart. The caller commits or rolls back.
+
+    Args:
+        db (sqlite3.Connection): A writable database connection.
+        user_id (str): The customer placing the order.
+        cart_id (Any): The shopper ID whose cart is being checked out.
+        shipping (Tuple[Any, ...]): ShipVia, ShipName, ShipAddress, ShipCity,
+            ShipRegion, ShipPostalCode and ShipCountry, in that order.
+
+    Returns:
+        int: The new OrderID.
+
+    Raises:
+        InsufficientStockError: If any product has fewer units than ordered.
+    """
+    employee = db.execute(
+        """
+        SELECT EmployeeID
+        FROM Employees
+        WHERE LastName = 'WEB' AND EmployeeID = 999999
+        """
+    ).fetchone()
+
+    cursor = db.execute(
+        """
+        INSERT INTO Orders (
+            CustomerID, EmployeeID, OrderDate, RequiredDate,
+            ShippedDate, ShipVia, Freight, ShipName,
+            ShipAddress, ShipCity, ShipRegion,
+            ShipPostalCode, ShipCountry
+        )
+        VALUES (
+            ?, ?, CURRENT_TIMESTAMP, NULL, NULL, ?, 0, ?,
+            ?, ?, ?, ?, ?
+        )
+        """,
+        (user_id, employee["EmployeeID"], *shipping),
+    )
+    order_id: int = cursor.lastrowid  # type: ignore[assignment]
+
+    lines: int = db.execute(
+        """
+        INSERT INTO "Order Details" (OrderID, ProductID, UnitPrice, Quantity, Discount)
+        SELECT ?, sc.ProductID, p.UnitPrice, sc.Quantity, 0
+        FROM Shopping_cart sc
+        JOIN Products p ON p.ProductID = sc.ProductID
+        WHERE sc.ShopperID = ?
+        """,
+        (order_id, cart_id),
+    ).rowcount
+
+    # Products with NULL stock are not stock-tracked and always qualify.
+    stocked: int = db.execute(
+        """
+        UPDATE Products
+        SET UnitsInStock = UnitsInStock - sc.Quantity
+        FROM Shopping_cart sc
+        WHERE sc.ShopperID = ?
+          AND sc.ProductID = Products.ProductID
+          AND (Products.UnitsInStock IS NULL
+               OR Products.UnitsInStock >= sc.Quantity)
+        """,
+        (cart_id,),
+    ).rowcount
+    if stocked != lines:
+        raise InsufficientStockError(order_id)
+
+    record_order_stats(db, order_id)
+
+    db.execute("DELETE FROM Shopping_cart WHERE ShopperID = ?", (cart_id,))
+    return order_id
+
+
+def place_order(user_id: str, cart_id: Any, shipping: Tuple[Any, ...]) -> int:
+    """
+    Write one order with `write_order` in its own `BEGIN IMMEDIATE` transaction.
+
+    When `ORDER_QUEUE_ENABLED` is set the order is handed to the group-commit
+    order queue instead. Any writer connection this request holds, e.g. from
+    reads when `DB_SPLIT_READS` is off, is released first so the queue thread
+    can lease it.
+
+    Returns:
+        int: The new OrderID.
+    """
+    if current_app.config.get("ORDER_QUEUE_ENABLED", False):
+        app = current_app._get_current_object()  # type: ignore[attr-defined]  # pylint: disable=protected-access
+        release_writer()
+        return get_order_queue(app, write_order).submit(user_id, cart_id, shipping)
+
+    db = get_db(write=True)
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        order_id = write_order(db, user_id, cart_id, shipping)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return order_id
+
+
 @checkout_bp.route("/", methods=["GET", "POST"])
+@idempotent
 def checkout() -> Union[str, FlaskResponse, WerkzeugResponse]:
     """
     Handle the checkout process.
@@ -39,10 +166,12 @@ def checkout() -> Union[str, FlaskResponse, WerkzeugResponse]:
 
     cart_id: Any = session.get("session_id")
     if not cart_id:
-        print("No cart found, redirecting to cart view.")
+        logger.info("No cart found, redirecting to cart view.")
         return redirect(url_for("cart.view_cart"))
 
-    db = get_db()
+    # Read through a read-only connection so that, with the order queue
+    # enabled, checkout never holds the single writer connection itself.
+    db = get_db(write=False)
 
     cart_items = db.execute(
         """
@@ -78,32 +207,10 @@ def checkout() -> Union[str, FlaskResponse, WerkzeugResponse]:
             ship_via: int = int(request.form.get("ship_via", 1))
 
             try:
-                employee = db.execute(
-                    """
-                    SELECT EmployeeID 
-                    FROM Employees 
-                    WHERE LastName = 'WEB' AND EmployeeID = 999999
-                    """
-                ).fetchone()
-
-                employee_id = employee["EmployeeID"]
-
-                cursor = db.execute(
-                    """
-                    INSERT INTO Orders (
-                        CustomerID, EmployeeID, OrderDate, RequiredDate, 
-                        ShippedDate, ShipVia, Freight, ShipName, 
-                        ShipAddress, ShipCity, ShipRegion, 
-                        ShipPostalCode, ShipCountry
-                    )
-                    VALUES (
-                        ?, ?, CURRENT_TIMESTAMP, NULL, NULL, ?, 0, ?, 
-                        ?, ?, ?, ?, ?
-                    )
-                    """,
+                place_order(
+                    user_id,
+                    cart_id,
                     (
-                        user_id,
-                        employee_id,
                         ship_via,
                         ship_name,
                         ship_address,
@@ -113,23 +220,17 @@ def checkout() -> Union[str, FlaskResponse, WerkzeugResponse]:
                         ship_country,
                     ),
                 )
-                db.commit()
-
-                order_id: Any = cursor.lastrowid  # pylint: disable=unused-variable
+            except InsufficientStockError:
+                flash(
+                    "Some items in your cart are no longer in stock. "
+                    "Please review your cart.",
+                    "danger",
+                )
+                return redirect(url_for("cart.view_cart"))
             except Exception as e:
-                db.rollback()
                 flash(f"An error occurred during order placement: {e}", "danger")
                 return redirect(url_for("cart.view_cart"))
 
-
-            db.execute("DELETE FROM Shopping_cart WHERE ShopperID = ?", (cart_id,))
-            db.commit()
-
-            db.execute(
-                "DELETE FROM Shopping_cart WHERE AddedAt < datetime('now', '-1 month')"
-            )
-            db.commit()
-
             flash("Order placed successfully, thank you!")
             return redirect(url_for("orders.view_orders"))
         return redirect(url_for("cart.view_cart"))
@@ -1,62 +1,683 @@
 """
 Database module for managing SQLite connections and initialization.
 
-This module provides functions to establish a database connection,
-close connections, and initialize the required tables in `northwind.db`.
+This module provides bounded, per-process pools of pre-configured SQLite
+connections, the `get_db()`/`close_db()` pair used by every blueprint, and
+functions to initialize the required tables in `northwind.db`.
+
+Requests with a safe HTTP method (GET, HEAD, OPTIONS) are served from a pool
+of read-only connections; everything else goes through the writer pool, which
+defaults to a single connection so writers queue in-process instead of
+contending for SQLite's write lock.
 """
 
+import os
+import queue
 import sqlite3
-from typing import Any
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, FrozenSet, Iterator, Optional, Sequence
+
+import click
+from flask import Flask, g, current_app, has_request_context, request
+from flask.cli import with_appcontext
+
+from flaskr.querystats import QueryCursor, QueryStats, add_server_timing, get_query_stats
+
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_WRITER_POOL_SIZE = 1
+DEFAULT_POOL_TIMEOUT = 5.0
+DEFAULT_CACHE_SIZE_KIB = 8192
+DEFAULT_MMAP_SIZE = 64 * 1024 * 1024
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+
+_POOL_EXTENSION_KEY = "sqlite_pool"
+_READ_POOL_EXTENSION_KEY = "sqlite_read_pool"
+_COLUMNS_EXTENSION_KEY = "table_columns"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+_pool_lock = threading.Lock()
+
+
+class PoolTimeout(sqlite3.OperationalError):  # pylint: disable=too-few-public-methods
+    """Raised when no pooled connection becomes available within the timeout."""
+
+
+@dataclass
+class PoolStats:
+    """Counters describing how a `ConnectionPool` is being used."""
+
+    checkouts: int = 0
+    waits: int = 0
+    wait_time: float = 0.0
+    timeouts: int = 0
+    created: int = 0
+    discarded: int = 0
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    SQLite connection that is leased from, and returned to, a `ConnectionPool`.
+
+    Calling `close()` on a leased connection hands it back to the pool instead of
+    closing the underlying database handle. Once returned, the handle refuses to
+    run statements so that a stale reference cannot leak into another request.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.pool: Optional["ConnectionPool"] = None
+        self.leased = True
+        self.query_stats: Optional[QueryStats] = None
+
+    def _ensure_leased(self) -> None:
+        if not self.leased:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+
+    def execute(self, *args: Any) -> sqlite3.Cursor:  # type: ignore[override]
+        """Run one statement, timed when the pool has query statistics."""
+        self._ensure_leased()
+        if self.query_stats is not None:
+            return self.cursor(QueryCursor).execute(*args)
+        return super().execute(*args)
+
+    def executemany(self, *args: Any) -> sqlite3.Cursor:  # type: ignore[override]
+        """Run one statement per parameter set, timed like `execute()`."""
+        self._ensure_leased()
+        if self.query_stats is not None:
+            return self.cursor(QueryCursor).executemany(*args)
+        return super().executemany(*args)
+
+    def executescript(self, *args: Any) -> sqlite3.Cursor:  # type: ignore[override]
+        """Run a script of statements on a leased connection."""
+        self._ensure_leased()
+        return super().executescript(*args)
+
+    def cursor(self, *args: Any, **kwargs: Any) -> sqlite3.Cursor:  # type: ignore[override]
+        """Open a cursor on a leased connection."""
+        self._ensure_leased()
+        return super().cursor(*args, **kwargs)
+
+    def close(self) -> None:
+        """Return the connection to its pool, or close it if it is not pooled."""
+        if self.pool is None:
+            super().close()
+        elif self.leased:
+            self.pool.release(self)
 
-from flask import g, current_app
+    def discard(self) -> None:
+        """Close the underlying database handle for good."""
+        self.leased = False
+        super().close()
 
 
-def get_db() -> sqlite3.Connection:
+class ConnectionPool:  # pylint: disable=too-many-instance-attributes
+    """
+    Bounded, thread-safe pool of pre-warmed SQLite connections.
+
+    Connections are opened lazily up to `size`, configured with the given
+    pragmas, and kept open between requests. Idle connections are handed out
+    most-recently-used first so their page caches stay warm. A `readonly` pool
+    opens the database with `mode=ro` and `query_only` so it can never write.
+    With `query_stats`, connections time their statements into it.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self,
+        database: str,
+        size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_POOL_TIMEOUT,
+        pragmas: Optional[Dict[str, Any]] = None,
+        readonly: bool = False,
+        query_stats: Optional[QueryStats] = None,
+    ) -> None:
+        self.database = database
+        self.query_stats = query_stats
+        self.readonly = readonly
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.pragmas: Dict[str, Any] = dict(pragmas or {})
+        if readonly:
+            # The journal mode is a property of the file and is set by writers.
+            self.pragmas.pop("journal_mode", None)
+            self.pragmas["query_only"] = 1
+        self.pid = os.getpid()
+        self.stats = PoolStats()
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._closed = False
+
+    def _connect(self) -> PooledConnection:
+        """Open, configure and warm up a new pooled connection."""
+        if self.readonly:
+            target, uri = f"file:{quote(self.database)}?mode=ro", True
+        else:
+            target, uri = self.database, False
+        conn = sqlite3.connect(
+            target,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            factory=PooledConnection,
+            uri=uri,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}").fetchall()
+        # Load the schema now rather than on the first real query.
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        conn.pool = self
+        conn.query_stats = self.query_stats
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        """
+        Check a connection out of the pool, opening or waiting for one as needed.
+
+        Raises:
+            PoolTimeout: If the pool is exhausted for longer than `timeout` seconds.
+        """
+        conn: Optional[PooledConnection] = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self.stats.created - self.stats.discarded < self.size
+                if grow:
+                    self.stats.created += 1
+            if grow:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self.stats.created -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self.stats.timeouts += 1
+                    raise PoolTimeout(  # pylint: disable=raise-missing-from
+                        f"No database connection available after {self.timeout}s"
+                    )
+                finally:
+                    with self._lock:
+                        self.stats.waits += 1
+                        self.stats.wait_time += time.perf_counter() - started
+
+        conn.leased = True
+        with self._lock:
+            self.stats.checkouts += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        """Return a connection to the pool, rolling back any open transaction."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        finally:
+            with self._lock:
+                self._in_use -= 1
+
+        conn.leased = False
+        if self._closed or os.getpid() != self.pid:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def _discard(self, conn: PooledConnection) -> None:
+        conn.discard()
+        with self._lock:
+            self.stats.discarded += 1
+
+    def close(self) -> None:
+        """Close every idle connection; leased ones are closed when released."""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return a snapshot of the pool counters for sizing and monitoring."""
+        with self._lock:
+            snapshot: Dict[str, Any] = asdict(self.stats)
+            snapshot["in_use"] = self._in_use
+        snapshot["idle"] = self._idle.qsize()
+        snapshot["size"] = self.size
+        return snapshot
+
+
+def _pool_from_config(app: Flask, readonly: bool = False) -> ConnectionPool:
+    """Build a reader or writer `ConnectionPool` from the application's configuration."""
+    config = app.config
+    if readonly:
+        size = config.get("DB_POOL_SIZE", DEFAULT_POOL_SIZE)
+    else:
+        size = config.get("DB_WRITER_POOL_SIZE", DEFAULT_WRITER_POOL_SIZE)
+    return ConnectionPool(
+        config["DATABASE"],
+        size=size,
+        timeout=config.get("DB_POOL_TIMEOUT", DEFAULT_POOL_TIMEOUT),
+        pragmas={
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -int(config.get("DB_CACHE_SIZE_KIB", DEFAULT_CACHE_SIZE_KIB)),
+            "mmap_size": int(config.get("DB_MMAP_SIZE", DEFAULT_MMAP_SIZE)),
+            "busy_timeout": int(
+                config.get("DB_BUSY_TIMEOUT_MS", DEFAULT_BUSY_TIMEOUT_MS)
+            ),
+            "temp_store": "MEMORY",
+        },
+        readonly=readonly,
+        query_stats=get_query_stats(app),
+    )
+
+
+def get_pool(app: Optional[Flask] = None, readonly: bool = False) -> ConnectionPool:
+    """
+    Return the writer (or read-only) connection pool for `app` (default: the current app).
+
+    A new pool is built on first use, after a fork, or when `DATABASE` changes.
     """
-    Get the SQLite database connection, ensuring it reads from `app.config['DATABASE']`.
+    app = app or current_app._get_current_object()  # type: ignore[attr-defined]  # pylint: disable=protected-access
+    key = _READ_POOL_EXTENSION_KEY if readonly else _POOL_EXTENSION_KEY
+    pool: Optional[ConnectionPool] = app.extensions.get(key)
+    if (
+        pool is None
+        or pool.pid != os.getpid()
+        or pool.database != app.config["DATABASE"]
+    ):
+        with _pool_lock:
+            pool = app.extensions.get(key)
+            if (
+                pool is None
+                or pool.pid != os.getpid()
+                or pool.database != app.config["DATABASE"]
+            ):
+                if pool is not None and pool.pid == os.getpid():
+                    pool.close()
+                pool = _pool_from_config(app, readonly)
+                app.extensions[key] = pool
+    return pool
+
+
+def close_pool(app: Flask) -> None:
+    """Close the application's connection pools, if they were created."""
+    for key in (_READ_POOL_EXTENSION_KEY, _POOL_EXTENSION_KEY):
+        pool: Optional[ConnectionPool] = app.extensions.pop(key, None)
+        if pool is not None:
+            pool.close()
+
+
+def pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """Return usage counters for the current application's reader and writer pools."""
+    return {
+        "read": get_pool(readonly=True).metrics(),
+        "write": get_pool().metrics(),
+    }
+
+
+def split_reads(app: Optional[Flask] = None) -> bool:
+    """Return True when read-only connections are enabled for the application."""
+    config = (app or current_app).config
+    return bool(config.get("DB_SPLIT_READS", True) and config["DATABASE"] != ":memory:")
+
+
+def _reads_only() -> bool:
+    """Return True when the current request may be served by a read-only connection."""
+    return has_request_context() and request.method in SAFE_METHODS and split_reads()
+
+
+def get_db(write: Optional[bool] = None) -> sqlite3.Connection:
+    """
+    Get a pooled SQLite connection for `app.config['DATABASE']`.
+
+    Safe-method requests get a read-only connection; other requests, CLI
+    commands and plain app contexts get the writer connection. The same
+    connection is returned for the lifetime of the app context and is handed
+    back to the pool by `close_db()`.
+
+    Args:
+        write (Optional[bool]): None picks by request method. True forces the
+            writer connection, e.g. for a GET that writes. False asks for a
+            read-only connection, e.g. for a lookup in a POST that should not
+            hold the single writer.
 
     Returns:
         sqlite3.Connection: The SQLite database connection.
     """
-    if "db" not in g:
-        g.db = sqlite3.connect(
-            current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
-    return g.db
+    if write is None:
+        if "db" not in g:
+            readonly = _reads_only()
+            key = "db_reader" if readonly else "db_writer"
+            g.db = g.pop(key, None) or get_pool(readonly=readonly).acquire()
+        return g.db
 
+    readonly = not write and split_reads()
+    current = g.get("db")
+    if current is not None and current.pool.readonly == readonly:
+        return current
+    key = "db_reader" if readonly else "db_writer"
+    if key not in g:
+        setattr(g, key, get_pool(readonly=readonly).acquire())
+    return g.get(key)
 
-def close_db(e=None) -> None:
+
+@contextmanager
+def writer_connection() -> Iterator[sqlite3.Connection]:
     """
-    Close the database connection if it exists.
+    Lease the writer connection for a short block of work.
+
+    Reuses the writer the app context already holds; otherwise the connection
+    goes back to the pool when the block exits instead of being held until
+    teardown, so the rest of the request does not keep the single writer.
+
+    Yields:
+        sqlite3.Connection: The writer connection. The caller commits.
+    """
+    for key in ("db", "db_writer"):
+        held = g.get(key)
+        if held is not None and not held.pool.readonly:
+            yield held
+            return
+    conn = get_pool().acquire()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def release_writer() -> None:
+    """
+    Hand the writer connection held by the app context back to the pool.
+
+    Call this before waiting on another thread that needs the writer, e.g.
+    the order queue; a later `get_db()` leases a connection again. Any open
+    transaction on the released connection is rolled back.
+    """
+    for key in ("db", "db_writer"):
+        held = g.get(key)
+        if held is not None and not held.pool.readonly:
+            g.pop(key).close()
+
+
+def close_db(_e: Optional[BaseException] = None) -> None:
+    """
+    Return the database connections to the pool if they exist.
 
     This function is registered with Flask's `teardown_appcontext` to ensure
-    the database connection is properly closed after each request.
+    the database connections are released after each request.
+    """
+    for key in ("db_reader", "db_writer", "db"):
+        db = g.pop(key, None)
+        if db is not None:
+            db.close()
+
+
+def table_columns(db: sqlite3.Connection, table: str) -> FrozenSet[str]:
+    """
+    Return the column names of `table`, looked up once per application.
+
+    `northwind.db` files differ: `initialize_northwind()` may have created a
+    minimal `Products` table without the optional Northwind columns.
+
+    Args:
+        db (sqlite3.Connection): The database connection.
+        table (str): The table name.
+
+    Returns:
+        FrozenSet[str]: The table's columns (empty if it does not exist).
+    """
+    cache: Dict[str, FrozenSet[str]] = current_app.extensions.setdefault(
+        _COLUMNS_EXTENSION_KEY, {}
+    )
+    columns = cache.get(table)
+    if columns is None:
+        columns = cache[table] = frozenset(
+            row[1] for row in db.execute(f'PRAGMA table_info("{table}")').fetchall()
+        )
+    return columns
+
+
+def select_columns(
+    db: sqlite3.Connection, table: str, columns: Sequence[str], alias: str = ""
+) -> str:
+    """
+    Build a SELECT list of `columns`, selecting NULL for those `table` lacks.
+
+    Args:
+        db (sqlite3.Connection): The database connection.
+        table (str): The table the columns belong to.
+        columns (Sequence[str]): The wanted column names, in order.
+        alias (str): Table alias to qualify the columns with, if any.
+
+    Returns:
+        str: e.g. `"p.ProductID, NULL AS CategoryID"`.
+    """
+    present = table_columns(db, table)
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(
+        f"{prefix}{column}" if column in present else f"NULL AS {column}"
+        for column in columns
+    )
+
+
+def ensure_product_search_index(db: sqlite3.Connection) -> bool:
+    """
+    Create the `Products_fts` full-text index and its sync triggers if missing.
+
+    The index is an external-content FTS5 table over `Products.ProductName`,
+    kept current by triggers, and populated from `Products` when first created.
+
+    Args:
+        db (sqlite3.Connection): A writable database connection.
+
+    Returns:
+        bool: False if this SQLite build has no FTS5 support, True otherwise.
+    """
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Products_fts'"
+    ).fetchone()
+    if exists is None:
+        try:
+            db.execute(
+                """
+                CREATE VIRTUAL TABLE Products_fts USING fts5(
+                    ProductName,
+                    content = 'Products',
+                    content_rowid = 'ProductID',
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                );
+                """
+            )
+        except sqlite3.OperationalError:
+            return False
+
+    db.executescript(
+        """
+        CREATE TRIGGER IF NOT EXISTS Products_fts_ai AFTER INSERT ON Products BEGIN
+            INSERT INTO Products_fts (rowid, ProductName)
+            VALUES (new.ProductID, new.ProductName);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS Products_fts_ad AFTER DELETE ON Products BEGIN
+            INSERT INTO Products_fts (Products_fts, rowid, ProductName)
+            VALUES ('delete', old.ProductID, old.ProductName);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS Products_fts_au
+        AFTER UPDATE OF ProductID, ProductName ON Products BEGIN
+            INSERT INTO Products_fts (Products_fts, rowid, ProductName)
+            VALUES ('delete', old.ProductID, old.ProductName);
+            INSERT INTO Products_fts (rowid, ProductName)
+            VALUES (new.ProductID, new.ProductName);
+        END;
+        """
+    )
+
+    if exists is None:
+        rebuild_product_search_index(db)
+    return True
+
+
+def rebuild_product_search_index(db: sqlite3.Connection) -> None:
+    """
+    Repopulate `Products_fts` from the `Products` table and commit.
+
+    Args:
+        db (sqlite3.Connection): A writable database connection.
     """
-    db = g.pop("db", None)
-    if db is not None:
-        db.close()
-    print(e)
+    db.execute("INSERT INTO Products_fts (Products_fts) VALUES ('rebuild')")
+    db.commit()
+
+
+@click.command("rebuild-search-index")
+@with_appcontext
+def rebuild_search_index_command() -> None:
+    """Flask CLI command to (re)build the product full-text search index."""
+    db = get_db()
+    if not ensure_product_search_index(db):
+        click.echo("FTS5 is not available; product search will use LIKE.")
+        return
+    rebuild_product_search_index(db)
+    click.echo("Rebuilt the product search index.")
+
+
+def ensure_customer_order_stats(db: sqlite3.Connection) -> None:
+    """
+    Create the `CustomerOrderStats` rollup if missing and backfill it from `Orders`.
+
+    Args:
+        db (sqlite3.Connection): A writable database connection.
+    """
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'CustomerOrderStats'"
+    ).fetchone()
+    if exists is not None:
+        return
+    db.execute(
+        """
+        CREATE TABLE CustomerOrderStats (
+            CustomerID TEXT PRIMARY KEY,
+            OrderCount INTEGER NOT NULL DEFAULT 0,
+            LifetimeSpend NUMERIC NOT NULL DEFAULT 0,
+            LastOrderDate DATETIME
+        ) WITHOUT ROWID;
+        """
+    )
+    rebuild_customer_order_stats(db)
+
+
+def rebuild_customer_order_stats(db: sqlite3.Connection) -> int:
+    """
+    Recompute `CustomerOrderStats` from `Orders` and `Order Details` and commit.
+
+    Checkout keeps the rollup current; run this to backfill it or after
+    orders were written by anything other than checkout.
+
+    Args:
+        db (sqlite3.Connection): A writable database connection.
+
+    Returns:
+        int: The number of customers in the rollup.
+    """
+    db.execute("DELETE FROM CustomerOrderStats")
+    customers = db.execute(
+        """
+        INSERT INTO CustomerOrderStats (CustomerID, OrderCount, LifetimeSpend, LastOrderDate)
+        SELECT o.CustomerID, COUNT(*), COALESCE(SUM(t.Total), 0), MAX(o.OrderDate)
+        FROM Orders o
+        LEFT JOIN (
+            SELECT OrderID, SUM(UnitPrice * Quantity * (1 - Discount)) AS Total
+            FROM "Order Details"
+            GROUP BY OrderID
+        ) t ON t.OrderID = o.OrderID
+        GROUP BY o.CustomerID
+        """
+    ).rowcount
+    db.commit()
+    return customers
+
+
+def record_order_stats(db: sqlite3.Connection, order_id: int) -> None:
+    """
+    Add one new order and its line items to its customer's `CustomerOrderStats` row.
+
+    Runs inside the caller's transaction, so the rollup commits or rolls back
+    together with the order.
+
+    Args:
+        db (sqlite3.Connection): A writable database connection.
+        order_id (int): An order whose `Order Details` are already written.
+    """
+    db.execute(
+        """
+        INSERT INTO CustomerOrderStats (CustomerID, OrderCount, LifetimeSpend, LastOrderDate)
+        SELECT o.CustomerID, 1,
+               COALESCE((
+                   SELECT SUM(UnitPrice * Quantity * (1 - Discount))
+                   FROM "Order Details"
+                   WHERE OrderID = o.OrderID
+               ), 0),
+               o.OrderDate
+        FROM Orders o
+        WHERE o.OrderID = ?
+        ON CONFLICT (CustomerID) DO UPDATE
+        SET OrderCount = OrderCount + 1,
+            LifetimeSpend = LifetimeSpend + excluded.LifetimeSpend,
+            LastOrderDate = max(COALESCE(LastOrderDate, ''), excluded.LastOrderDate)
+        """,
+        (order_id,),
+    )
+
+
+@click.command("rebuild-order-stats")
+@with_appcontext
+def rebuild_order_stats_command() -> None:
+    """Flask CLI command to backfill the per-customer order summary rollup."""
+    customers = rebuild_customer_order_stats(get_db())
+    click.echo(f"Rebuilt order stats for {customers} customers.")
 
 
 def init_app(app: Any) -> None:
     """
     Register database-related functions with the Flask app.
 
-    This ensures that `close_db()` is called automatically when the application context ends.
+    This ensures that `close_db()` is called automatically when the application context ends,
+    adds the `Server-Timing` header of `DB_INSTRUMENT` and registers the database CLI commands.
 
     Args:
         app (Any): The Flask application instance.
     """
     app.teardown_appcontext(close_db)
+    app.after_request(add_server_timing)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(rebuild_order_stats_command)
 
 
 def initialize_northwind() -> None:
     """
     Ensure the `northwind.db` database has the required tables.
 
-    This function checks if the `Authentication` and `Shopping_cart` tables exist,
-    and creates them if necessary. It also inserts a default employee entry.
+    This function checks if the `Authentication`, `Shopping_cart`, `Order Details`,
+    `Idempotency_keys` and `Sessions` tables exist,
+    and creates them if necessary, together with the product search index and
+    the `Catalog_version` counter used by the catalog cache and the
+    `CustomerOrderStats` rollup.
+    It also inserts a default employee entry.
     """
     db = get_db()
 
@@ -81,6 +702,42 @@ def initialize_northwind() -> None:
         """
     )
 
+    try:
+        # Category pages seek on (CategoryID, ProductID); rowid is implicit.
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_products_category ON Products (CategoryID);"
+        )
+    except sqlite3.OperationalError:
+        pass  # minimal Products table without a CategoryID column
+
+    ensure_product_search_index(db)
+
+    db.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS Catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO Catalog_version (id, version) VALUES (1, 0);
+
+        CREATE TRIGGER IF NOT EXISTS Products_version_ai AFTER INSERT ON Products BEGIN
+            UPDATE Catalog_version SET version = version + 1 WHERE id = 1;
+        END;
+        -- Only the columns the catalog snapshot serves (catalog.CATALOG_FIELDS),
+        -- so checkout's UnitsInStock decrements do not force a reload.
+        DROP TRIGGER IF EXISTS Products_version_au;
+        CREATE TRIGGER Products_version_au AFTER UPDATE OF
+            ProductID, ProductName, CategoryID, QuantityPerUnit, UnitPrice,
+            ReorderLevel, Discontinued
+        ON Products BEGIN
+            UPDATE Catalog_version SET version = version + 1 WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS Products_version_ad AFTER DELETE ON Products BEGIN
+            UPDATE Catalog_version SET version = version + 1 WHERE id = 1;
+        END;
+        """
+    )
+
     db.execute(
         """
         CREATE TABLE IF NOT EXISTS Shopping_cart (
@@ -94,6 +751,67 @@ def initialize_northwind() -> None:
         """
     )
 
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS "Order Details" (
+            OrderID INTEGER NOT NULL,
+            ProductID INTEGER NOT NULL,
+            UnitPrice NUMERIC NOT NULL DEFAULT 0,
+            Quantity INTEGER NOT NULL DEFAULT 1,
+            Discount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (OrderID, ProductID),
+            FOREIGN KEY (OrderID) REFERENCES Orders(OrderID),
+            FOREIGN KEY (ProductID) REFERENCES Products(ProductID)
+        );
+        """
+    )
+
+    db.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_shopping_cart_added_at
+        ON Shopping_cart (AddedAt);
+        """
+    )
+
+    try:
+        # Order history seeks on (CustomerID, OrderDate, OrderID); rowid is implicit.
+        db.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_orders_customer_date
+            ON Orders (CustomerID, OrderDate);
+            """
+        )
+    except sqlite3.OperationalError:
+        pass  # database without an Orders table
+    else:
+        ensure_customer_order_stats(db)
+
+    db.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS Idempotency_keys (
+            ShopperID TEXT NOT NULL,
+            Endpoint TEXT NOT NULL,
+            IdempotencyKey TEXT NOT NULL,
+            RequestHash BLOB NOT NULL,
+            StatusCode INTEGER,
+            ContentType TEXT,
+            Location TEXT,
+            ResponseBody BLOB,
+            CreatedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (ShopperID, Endpoint, IdempotencyKey)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at
+        ON Idempotency_keys (CreatedAt);
+
+        CREATE TABLE IF NOT EXISTS Sessions (
+            SessionKey TEXT PRIMARY KEY,
+            Data BLOB NOT NULL,
+            ExpiresAt INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON Sessions (ExpiresAt);
+        """
+    )
+
     db.execute(
         """
         INSERT INTO Employees (EmployeeID, LastName, FirstName)
@@ -0,0 +1,240 @@
+"""
+Idempotency module for making retried writes safe.
+
+Clients may send an `Idempotency-Key` header (or an `idempotency_key` form
+field) with a POST to an `@idempotent` view. The first request with a key
+claims it in `Idempotency_keys` and runs the view; its response is stored, and
+any retry with the same key from the same shopper gets that stored response
+back without touching the write path again. A retry that arrives while the
+first request is still running gets a 409, and reusing a key for a different
+payload gets a 422. A claim whose request never stored a response, e.g.
+because the worker died, may be taken over after `IDEMPOTENCY_CLAIM_TIMEOUT`
+seconds. Keys expire after `IDEMPOTENCY_KEY_TTL` seconds; expired rows are
+reclaimed on reuse and purged in batches by `expire-idempotency-keys`.
+"""
+
+import functools
+import hashlib
+import sqlite3
+from typing import Any, Callable, Optional, Tuple
+
+import click
+from flask import current_app, request, session
+from flask.cli import with_appcontext
+
+from flaskr.db import get_db, writer_connection
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_FIELD = "idempotency_key"
+MAX_KEY_LENGTH = 255
+
+
+def _request_key() -> Optional[str]:
+    """Return the idempotency key sent with the current request, if any."""
+    key = request.headers.get(IDEMPOTENCY_HEADER) or request.form.get(IDEMPOTENCY_FIELD)
+    return key.strip() if key and key.strip() else None
+
+
+def _request_hash() -> bytes:
+    """Return a short digest of the request payload, ignoring the key itself."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(request.path.encode("utf8"))
+    if request.is_json:
+        digest.update(request.get_data())
+    else:
+        for name in sorted(request.form):
+            if name != IDEMPOTENCY_FIELD:
+                for value in request.form.getlist(name):
+                    digest.update(f"\0{name}={value}".encode("utf8"))
+    return digest.digest()
+
+
+def _ttl_modifier() -> str:
+    """Return the SQLite datetime modifier for the key time-to-live."""
+    return f"-{int(current_app.config.get('IDEMPOTENCY_KEY_TTL', 86400))} seconds"
+
+
+def _claim_timeout_modifier() -> str:
+    """Return the SQLite datetime modifier for the lease on an unfinished claim."""
+    return f"-{int(current_app.config.get('IDEMPOTENCY_CLAIM_TIMEOUT', 60))} seconds"
+
+
+def _claim(shopper_id: str, endpoint: str, key: str, request_hash: bytes) -> Optional[Any]:
+    """
+    Claim `key` for this request, or return the row of an earlier claim.
+
+    An expired row, or a claim left without a response for longer than
+    `IDEMPOTENCY_CLAIM_TIMEOUT`, is taken over as if it did not exist.
+
+    Returns:
+        Optional[Any]: None if the key was claimed, otherwise the live row.
+    """
+    with writer_connection() as db:
+        claimed = db.execute(
+            """
+            INSERT INTO Idempotency_keys (ShopperID, Endpoint, IdempotencyKey, RequestHash)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (ShopperID, Endpoint, IdempotencyKey) DO UPDATE
+            SET RequestHash = excluded.RequestHash, StatusCode = NULL,
+                ContentType = NULL, Location = NULL, ResponseBody = NULL,
+                CreatedAt = CURRENT_TIMESTAMP
+            WHERE CreatedAt < datetime('now', ?)
+               OR (StatusCode IS NULL AND CreatedAt < datetime('now', ?))
+            """,
+            (
+                shopper_id,
+                endpoint,
+                key,
+                request_hash,
+                _ttl_modifier(),
+                _claim_timeout_modifier(),
+            ),
+        ).rowcount
+        db.commit()
+        if claimed:
+            return None
+        return db.execute(
+            """
+            SELECT RequestHash, StatusCode, ContentType, Location, ResponseBody
+            FROM Idempotency_keys
+            WHERE ShopperID = ? AND Endpoint = ? AND IdempotencyKey = ?
+            """,
+            (shopper_id, endpoint, key),
+        ).fetchone()
+
+
+def _replay(row: Any, request_hash: bytes) -> Any:
+    """Build the response for a request whose key was already claimed."""
+    if row is None or row["StatusCode"] is None:
+        return {
+            "status": "error",
+            "message": "A request with this idempotency key is still in progress.",
+        }, 409
+    if row["RequestHash"] != request_hash:
+        return {
+            "status": "error",
+            "message": "This idempotency key was used for a different request.",
+        }, 422
+
+    response = current_app.response_class(
+        row["ResponseBody"], status=row["StatusCode"], content_type=row["ContentType"]
+    )
+    if row["Location"]:
+        response.headers["Location"] = row["Location"]
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _release(shopper_id: str, endpoint: str, key: str) -> None:
+    """Drop an unfinished claim so a retry runs the view again."""
+    with writer_connection() as db:
+        if db.in_transaction:
+            db.rollback()
+        db.execute(
+            """
+            DELETE FROM Idempotency_keys
+            WHERE ShopperID = ? AND Endpoint = ? AND IdempotencyKey = ?
+              AND StatusCode IS NULL
+            """,
+            (shopper_id, endpoint, key),
+        )
+        db.commit()
+
+
+def idempotent(view: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Decorate a view so POSTs carrying an idempotency key run at most once.
+
+    Responses with a status below 500 are stored and replayed; if the view
+    raises or fails with a 5xx, the claim is released so the client can retry.
+    Requests without a key, or that are not POSTs, run the view unchanged.
+    """
+
+    @functools.wraps(view)
+    def wrapped_view(*args: Any, **kwargs: Any) -> Any:
+        key = _request_key() if request.method == "POST" else None
+        if key is None:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return {"status": "error", "message": "Idempotency key is too long."}, 400
+
+        ident: Tuple[str, str, str] = (
+            str(session.get("session_id", "")),
+            request.endpoint or request.path,
+            key,
+        )
+        request_hash = _request_hash()
+        row = _claim(*ident, request_hash)
+        if row is not None:
+            return _replay(row, request_hash)
+
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except BaseException:
+            _release(*ident)
+            raise
+
+        if response.status_code >= 500 or response.is_streamed:
+            _release(*ident)
+            return response
+
+        with writer_connection() as db:
+            db.execute(
+                """
+                UPDATE Idempotency_keys
+                SET StatusCode = ?, ContentType = ?, Location = ?, ResponseBody = ?
+                WHERE ShopperID = ? AND Endpoint = ? AND IdempotencyKey = ?
+                """,
+                (
+                    response.status_code,
+                    response.content_type,
+                    response.headers.get("Location"),
+                    response.get_data(),
+                    *ident,
+                ),
+            )
+            db.commit()
+        return response
+
+    return wrapped_view
+
+
+def expire_idempotency_keys(db: sqlite3.Connection, batch_size: int = 500) -> int:
+    """
+    Delete idempotency keys older than `IDEMPOTENCY_KEY_TTL`, in bounded batches.
+
+    Args:
+        db (sqlite3.Connection): A writable database connection.
+        batch_size (int): Maximum number of rows deleted per transaction.
+
+    Returns:
+        int: The total number of rows deleted.
+    """
+    cutoff = db.execute("SELECT datetime('now', ?)", (_ttl_modifier(),)).fetchone()[0]
+    total = 0
+    while True:
+        deleted = db.execute(
+            """
+            DELETE FROM Idempotency_keys
+            WHERE (ShopperID, Endpoint, IdempotencyKey) IN (
+                SELECT ShopperID, Endpoint, IdempotencyKey
+                FROM Idempotency_keys
+                WHERE CreatedAt < ?
+                LIMIT ?
+            )
+            """,
+            (cutoff, batch_size),
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+@click.command("expire-idempotency-keys")
+@click.option("--batch-size", type=int, default=500, help="Rows deleted per batch.")
+@with_appcontext
+def expire_idempotency_keys_command(batch_size: int) -> None:
+    """Flask CLI command to purge expired idempotency keys, e.g. from cron."""
+    deleted = expire_idempotency_keys(get_db(), batch_size)
+    click.echo(f"Expired {deleted} idempotency keys.")
@@ -4,10 +4,13 @@ Show Landing Page
 
 from flask import Blueprint, render_template
 
+from flaskr.sessions import sessionless
+
 landing_bp = Blueprint("landing", __name__)
 
 
 @landing_bp.route("/")
+@sessionless
 def home() -> str:
     """Show Landing Page"""
     return render_template("landing.html")
@@ -0,0 +1,167 @@
+"""
+Logs module for structured, non-blocking application logging.
+
+`init_logging()` attaches a `QueueHandler` to the `flaskr` logger, which is
+both `app.logger` and the parent of every `flaskr.*` module logger. Request
+threads only put records on a bounded in-memory queue; a background
+`QueueListener` thread formats them as one JSON object per line and writes
+them to stderr (or `LOG_FILE`). If the writer falls behind and the queue
+fills up, records are dropped and counted instead of blocking requests.
+
+Pass structured fields with `extra=`, e.g.
+`logger.info("Order placed", extra={"order_id": 42})`; they become keys of
+the JSON object.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from flask import Flask, has_request_context, request
+
+LOGGER_NAME = "flaskr"
+
+# Attributes every LogRecord has; anything else came in through `extra=`.
+_RECORD_ATTRS = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None)).keys()
+) | {"message", "asctime", "endpoint"}
+_logging_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        endpoint = getattr(record, "endpoint", None)
+        if endpoint:
+            entry["endpoint"] = endpoint
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class StderrHandler(logging.StreamHandler):  # type: ignore[type-arg]
+    """Stream handler writing to whatever `sys.stderr` is at emit time."""
+
+    def __init__(self) -> None:
+        super().__init__(sys.stderr)
+
+    @property  # type: ignore[override]
+    def stream(self) -> Any:
+        """The current `sys.stderr`, so test capture and redirection are honoured."""
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, _: Any) -> None:
+        pass
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks the logging thread.
+
+    Records are reduced to plain data on the calling thread, while the
+    request context is still available, and dropped if the queue is full.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Copy, so handlers further up the hierarchy still see the original.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        if has_request_context():
+            record.endpoint = request.endpoint
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:  # pylint: disable=too-few-public-methods
+    """
+    The queue handler and its writer thread for one process.
+
+    Args:
+        stream_handler (logging.Handler): Handler the writer thread emits to.
+        max_queue (int): Most records waiting to be written.
+    """
+
+    def __init__(self, stream_handler: logging.Handler, max_queue: int = 10_000) -> None:
+        self.pid = os.getpid()
+        self.handler = NonBlockingQueueHandler(queue.Queue(max(1, max_queue)))
+        self.listener = logging.handlers.QueueListener(
+            self.handler.queue, stream_handler, respect_handler_level=True
+        )
+        self.listener.start()
+        self.running = True
+
+    def stop(self) -> None:
+        """Write the queued records and stop the writer thread."""
+        if self.running:
+            self.running = False
+            self.listener.stop()
+
+
+_pipeline: Optional[LogPipeline] = None  # pylint: disable=invalid-name
+
+
+def init_logging(app: Flask) -> Optional[LogPipeline]:
+    """
+    Route the `flaskr` loggers through the process-wide JSON log pipeline.
+
+    The pipeline is built once per process; later apps only update the level.
+    With `LOG_ASYNC` off, logging is left as Flask configures it.
+
+    Returns:
+        Optional[LogPipeline]: The pipeline, or None if it is disabled.
+    """
+    global _pipeline  # pylint: disable=global-statement
+    logger = logging.getLogger(LOGGER_NAME)
+    if not app.config.get("LOG_ASYNC", True):
+        return None
+    with _logging_lock:
+        if _pipeline is None or _pipeline.pid != os.getpid():
+            log_file = app.config.get("LOG_FILE")
+            stream_handler: logging.Handler = (
+                logging.FileHandler(log_file, encoding="utf8")
+                if log_file
+                else StderrHandler()
+            )
+            stream_handler.setFormatter(JsonFormatter())
+            if _pipeline is not None:
+                logger.removeHandler(_pipeline.handler)
+            _pipeline = LogPipeline(stream_handler, app.config.get("LOG_QUEUE_SIZE", 10_000))
+            atexit.register(_pipeline.stop)
+            logger.addHandler(_pipeline.handler)
+        logger.setLevel(app.config.get("LOG_LEVEL", "INFO"))
+    return _pipeline
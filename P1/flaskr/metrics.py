@@ -0,0 +1,276 @@
+"""
+Metrics module for request latency and a Prometheus `/metrics` endpoint.
+
+`init_metrics()` hooks every request: it counts requests in flight and, when
+the request ends, records its latency and status code per endpoint and, with
+`DB_INSTRUMENT` on, the time its SQL statements took. The hot path only does
+a `perf_counter()` call, a bisect and a few counter increments under one lock.
+
+`/metrics` serves these counters in the Prometheus text exposition format,
+together with the hit/miss counters of the catalog and auth caches, the
+connection pool counters and the slow-query count. Each worker process keeps
+its own counters, so scrape every worker (or aggregate by instance).
+
+Metrics are off unless `METRICS_ENABLED` is set. They describe every endpoint
+and query, so also set `METRICS_TOKEN` unless `/metrics` is only reachable
+by the scraper; it must then send `Authorization: Bearer <METRICS_TOKEN>`.
+"""
+
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, Response, current_app, g, request
+
+from flaskr.sessions import sessionless
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED_ENDPOINT = "<unmatched>"
+
+_METRICS_EXTENSION_KEY = "request_metrics"
+# Extensions whose counters are exported when the app has created them.
+_CACHE_EXTENSIONS = {"catalog": "catalog_cache", "auth": "auth_cache"}
+_POOL_EXTENSIONS = {"read": "sqlite_read_pool", "write": "sqlite_pool"}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:  # pylint: disable=too-few-public-methods
+    """Cumulative-on-export latency histogram for one label set."""
+
+    __slots__ = ("buckets", "total", "count")
+
+    def __init__(self) -> None:
+        self.buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        """Add one observation. The caller holds the metrics lock."""
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class RequestMetrics:
+    """Thread-safe per-endpoint request counters for one application."""
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.latency: Dict[Labels, Histogram] = {}
+        self.db_time: Dict[Labels, Histogram] = {}
+        self.responses: Dict[Labels, int] = {}
+        self._lock = threading.Lock()
+
+    def started(self) -> None:
+        """Count a request as in flight."""
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(
+        self, endpoint: str, method: str, status: int, seconds: float, db_seconds: Optional[float]
+    ) -> None:
+        """Record a finished request."""
+        labels = (("endpoint", endpoint), ("method", method))
+        status_labels = labels + (("status", str(status)),)
+        with self._lock:
+            self.in_flight -= 1
+            latency = self.latency.get(labels)
+            if latency is None:
+                latency = self.latency[labels] = Histogram()
+            latency.observe(seconds)
+            self.responses[status_labels] = self.responses.get(status_labels, 0) + 1
+            if db_seconds is not None:
+                db_time = self.db_time.get(labels)
+                if db_time is None:
+                    db_time = self.db_time[labels] = Histogram()
+                db_time.observe(db_seconds)
+
+    def render(self) -> List[str]:
+        """Return the request metrics as Prometheus exposition lines."""
+        with self._lock:
+            lines = _gauge(
+                "flaskr_http_requests_in_flight",
+                "Requests currently being served.",
+                [((), self.in_flight)],
+            )
+            lines += _counter(
+                "flaskr_http_responses_total",
+                "Responses by endpoint, method and status code.",
+                sorted(self.responses.items()),
+            )
+            lines += _histogram(
+                "flaskr_http_request_duration_seconds",
+                "Request latency by endpoint and method.",
+                self.latency,
+            )
+            lines += _histogram(
+                "flaskr_db_request_duration_seconds",
+                "Time spent in SQL statements per request (needs DB_INSTRUMENT).",
+                self.db_time,
+            )
+        return lines
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the exposition format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Iterable[Tuple[str, str]]) -> str:
+    """Format a label set as `{name="value",...}`, or "" if it is empty."""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    """Format a sample value."""
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _samples(
+    name: str, kind: str, help_text: str, samples: Iterable[Tuple[Labels, float]]
+) -> List[str]:
+    """Return the HELP and TYPE lines of a metric followed by its samples."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples)
+    return lines
+
+
+def _gauge(name: str, help_text: str, samples: Iterable[Tuple[Labels, float]]) -> List[str]:
+    """Return the lines of a gauge."""
+    return _samples(name, "gauge", help_text, samples)
+
+
+def _counter(name: str, help_text: str, samples: Iterable[Tuple[Labels, float]]) -> List[str]:
+    """Return the lines of a counter."""
+    return _samples(name, "counter", help_text, samples)
+
+
+def _histogram(name: str, help_text: str, histograms: Dict[Labels, Histogram]) -> List[str]:
+    """Return histogram lines with cumulative buckets, `_sum` and `_count`."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, hist in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), hist.buckets):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(hist.total)}")
+        lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+    return lines
+
+
+def _extension_lines(app: Flask) -> List[str]:
+    """Return cache, pool and query counters of the extensions the app has created."""
+    hits: List[Tuple[Labels, float]] = []
+    misses: List[Tuple[Labels, float]] = []
+    for name, key in _CACHE_EXTENSIONS.items():
+        cache = app.extensions.get(key)
+        if cache is not None:
+            counters = cache.metrics()
+            hits.append(((("cache", name),), counters["hits"]))
+            misses.append(((("cache", name),), counters["misses"]))
+    lines = _counter("flaskr_cache_hits_total", "Cache lookups answered from memory.", hits)
+    lines += _counter("flaskr_cache_misses_total", "Cache lookups that went to SQL.", misses)
+
+    pools = {
+        name: app.extensions[key].metrics()
+        for name, key in _POOL_EXTENSIONS.items()
+        if key in app.extensions
+    }
+    for field, kind, help_text in (
+        ("in_use", "gauge", "Connections currently leased."),
+        ("idle", "gauge", "Open connections waiting in the pool."),
+        ("checkouts", "counter", "Connections leased from the pool."),
+        ("waits", "counter", "Leases that had to wait for a connection."),
+        ("timeouts", "counter", "Leases that gave up waiting."),
+    ):
+        suffix = "_total" if kind == "counter" else ""
+        lines += _samples(
+            f"flaskr_db_pool_{field}{suffix}",
+            kind,
+            help_text,
+            [((("pool", name),), counters[field]) for name, counters in pools.items()],
+        )
+
+    query_stats = app.extensions.get("query_stats")
+    if query_stats is not None:
+        lines += _counter(
+            "flaskr_db_slow_queries_total",
+            "Statements slower than DB_SLOW_QUERY_MS.",
+            [((), query_stats.metrics()["slow"])],
+        )
+    return lines
+
+
+def _request_started() -> None:
+    """Before-request hook counting the request as in flight."""
+    g.request_started = time.perf_counter()
+    current_app.extensions[_METRICS_EXTENSION_KEY].started()
+
+
+def _remember_status(response: Response) -> Response:
+    """After-request hook keeping the status code for `_request_finished`."""
+    g.response_status = response.status_code
+    return response
+
+
+def _request_finished(_: Optional[BaseException] = None) -> None:
+    """Teardown hook recording the request, including ones that raised."""
+    started: Optional[float] = g.pop("request_started", None)
+    if started is None:
+        return
+    totals = g.get("query_totals")
+    current_app.extensions[_METRICS_EXTENSION_KEY].finished(
+        request.endpoint or UNMATCHED_ENDPOINT,
+        request.method,
+        g.get("response_status", 500),
+        time.perf_counter() - started,
+        totals["time"] if totals else None,
+    )
+
+
+def _authorized() -> bool:
+    """Return True unless `METRICS_TOKEN` is set and the request does not send it."""
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token:
+        return True
+    sent = request.headers.get("Authorization", "")
+    return hmac.compare_digest(sent.encode(), f"Bearer {token}".encode())
+
+
+@sessionless
+def metrics_view() -> Response:
+    """Serve the application's metrics in the Prometheus text format."""
+    if not _authorized():
+        return Response(
+            "Unauthorized\n", 401, {"WWW-Authenticate": "Bearer"}, content_type=CONTENT_TYPE
+        )
+    app: Flask = current_app._get_current_object()  # type: ignore[attr-defined]  # pylint: disable=protected-access
+    lines = app.extensions[_METRICS_EXTENSION_KEY].render() + _extension_lines(app)
+    return Response("\n".join(lines) + "\n", content_type=CONTENT_TYPE)
+
+
+def init_metrics(app: Flask) -> None:
+    """
+    Register the request metrics hooks and the `/metrics` route.
+
+    Call this before other request hooks so their time is included. Does
+    nothing unless `METRICS_ENABLED` is set.
+    """
+    if not app.config.get("METRICS_ENABLED", False):
+        return
+    app.extensions[_METRICS_EXTENSION_KEY] = RequestMetrics()
+    app.before_request(_request_started)
+    app.after_request(_remember_status)
+    app.teardown_request(_request_finished)
+    app.add_url_rule(
+        app.config.get("METRICS_PATH", "/metrics"), "metrics", metrics_view
+    )
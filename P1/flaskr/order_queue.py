@@ -0,0 +1,229 @@
+"""
+Order queue module for group-committing checkout bursts.
+
+When `ORDER_QUEUE_ENABLED` is set, checkout requests do not write their order
+themselves. They submit an order intent to a per-app queue and wait; a single
+writer thread drains up to `ORDER_QUEUE_MAX_BATCH` intents (waiting at most
+`ORDER_QUEUE_MAX_WAIT` seconds for a batch to fill) and writes them all in
+one transaction, so a burst of orders pays for one fsync instead of one each.
+Every intent runs inside its own savepoint, so one failing order does not
+affect the others in its batch, and each caller gets back its own OrderID or
+exception. A caller that times out only gives up on an intent the writer has
+not taken yet; once taken, the caller waits for the outcome, so an order is
+never committed behind a TimeoutError.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import Flask
+
+from flaskr.db import get_db
+
+OrderWriter = Callable[[sqlite3.Connection, str, Any, Tuple[Any, ...]], int]
+
+_QUEUE_EXTENSION_KEY = "order_queue"
+_queue_lock = threading.Lock()
+
+# OrderIntent states; each intent leaves PENDING exactly once.
+PENDING, TAKEN, CANCELLED = "pending", "taken", "cancelled"
+
+
+class OrderIntent:  # pylint: disable=too-many-instance-attributes
+    """A checkout waiting for the writer thread to place its order."""
+
+    __slots__ = ("user_id", "cart_id", "shipping", "done", "order_id", "error", "state", "_lock")
+
+    def __init__(self, user_id: str, cart_id: Any, shipping: Tuple[Any, ...]) -> None:
+        self.user_id = user_id
+        self.cart_id = cart_id
+        self.shipping = shipping
+        self.done = threading.Event()
+        self.order_id: Optional[int] = None
+        self.error: Optional[BaseException] = None
+        self.state = PENDING
+        self._lock = threading.Lock()
+
+    def _leave_pending(self, state: str) -> bool:
+        """Move a pending intent to `state`; False if it already left PENDING."""
+        with self._lock:
+            if self.state != PENDING:
+                return False
+            self.state = state
+            return True
+
+    def claim(self) -> bool:
+        """Take the intent for writing; False if its caller has cancelled it."""
+        return self._leave_pending(TAKEN)
+
+    def cancel(self) -> bool:
+        """Withdraw the intent; False if the writer has already taken it."""
+        return self._leave_pending(CANCELLED)
+
+
+class OrderQueue:  # pylint: disable=too-many-instance-attributes
+    """
+    Queue of order intents drained by one writer thread with group commit.
+
+    Args:
+        app (Flask): The application whose database receives the orders.
+        write_order (OrderWriter): Writes one order on a connection that is
+            already inside a transaction and returns its OrderID.
+        max_batch (int): Most intents committed in one transaction.
+        max_wait (float): Seconds to wait for more intents after the first.
+        timeout (float): Seconds a caller waits for its result.
+    """
+
+    def __init__(
+        self,
+        app: Flask,
+        write_order: OrderWriter,
+        max_batch: int = 32,
+        max_wait: float = 0.005,
+        timeout: float = 30.0,
+    ) -> None:
+        self.app = app
+        self.write_order = write_order
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.batches = 0
+        self.orders = 0
+        self.failures = 0
+        self.largest_batch = 0
+        self._intents: "queue.Queue[OrderIntent]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self) -> None:
+        """Start the writer thread if it is not running (e.g. after a fork)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="order-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, user_id: str, cart_id: Any, shipping: Tuple[Any, ...]) -> int:
+        """
+        Queue an order and block until the writer thread has committed it.
+
+        Returns:
+            int: The new OrderID.
+
+        Raises:
+            TimeoutError: If the writer did not take the order within `timeout`;
+                the order is then never placed.
+            Exception: Whatever the order writer raised for this order.
+        """
+        self._ensure_worker()
+        intent = OrderIntent(user_id, cart_id, shipping)
+        self._intents.put(intent)
+        if not intent.done.wait(self.timeout):
+            if intent.cancel():
+                raise TimeoutError("Order was not processed in time")
+            # The writer has taken the intent, so its outcome is on the way.
+            intent.done.wait()
+        if intent.error is not None:
+            raise intent.error
+        assert intent.order_id is not None
+        return intent.order_id
+
+    def _next_batch(self) -> List[OrderIntent]:
+        """Block for one intent, then gather more until the batch is full or stale."""
+        batch = [self._intents.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._intents.get(timeout=remaining))
+                else:
+                    batch.append(self._intents.get_nowait())
+            except queue.Empty:
+                break
+        return [intent for intent in batch if intent.claim()]
+
+    def _run(self) -> None:
+        """Writer thread: place batches of orders until the process exits."""
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self.place_batch(batch)
+
+    def place_batch(self, batch: List[OrderIntent]) -> None:
+        """Write every intent in `batch` in one transaction and wake the callers."""
+        try:
+            with self.app.app_context():
+                db = get_db(write=True)
+                try:
+                    db.execute("BEGIN IMMEDIATE")
+                    for intent in batch:
+                        db.execute("SAVEPOINT order_intent")
+                        try:
+                            intent.order_id = self.write_order(
+                                db, intent.user_id, intent.cart_id, intent.shipping
+                            )
+                        except Exception as e:  # pylint: disable=broad-exception-caught
+                            db.execute("ROLLBACK TO order_intent")
+                            intent.error = e
+                        db.execute("RELEASE order_intent")
+                    db.commit()
+                except sqlite3.Error:
+                    if db.in_transaction:
+                        db.rollback()
+                    raise
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            for intent in batch:
+                if intent.error is None:
+                    intent.order_id, intent.error = None, e
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.orders += sum(1 for intent in batch if intent.error is None)
+                self.failures += sum(1 for intent in batch if intent.error is not None)
+                self.largest_batch = max(self.largest_batch, len(batch))
+            for intent in batch:
+                intent.done.set()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return batch and order counters for tuning the batch size and wait."""
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "orders": self.orders,
+                "failures": self.failures,
+                "largest_batch": self.largest_batch,
+                "pending": self._intents.qsize(),
+            }
+
+
+def get_order_queue(app: Flask, write_order: OrderWriter) -> OrderQueue:
+    """
+    Return the order queue for `app`, creating it from config on first use.
+
+    Args:
+        app (Flask): The application.
+        write_order (OrderWriter): Used only when the queue is created.
+    """
+    order_queue: Optional[OrderQueue] = app.extensions.get(_QUEUE_EXTENSION_KEY)
+    if order_queue is None or order_queue.pid != os.getpid():
+        with _queue_lock:
+            order_queue = app.extensions.get(_QUEUE_EXTENSION_KEY)
+            if order_queue is None or order_queue.pid != os.getpid():
+                order_queue = OrderQueue(
+                    app,
+                    write_order,
+                    max_batch=app.config.get("ORDER_QUEUE_MAX_BATCH", 32),
+                    max_wait=app.config.get("ORDER_QUEUE_MAX_WAIT", 0.005),
+                    timeout=app.config.get("ORDER_QUEUE_TIMEOUT", 30.0),
+                )
+                app.extensions[_QUEUE_EXTENSION_KEY] = order_queue
+    return order_queue
@@ -1,25 +1,142 @@
 """
 Orders module for displaying current user orders.
 
-This module fetches all orders for the logged-in user and displays them in a template.
+This module fetches the logged-in user's orders one page at a time, newest
+first, and displays them in a template. Pages are keyset-paginated on
+(OrderDate, OrderID) through the `idx_orders_customer_date` index, and each
+page's line items and order totals come from the same aggregated query. The
+order count, lifetime spend and last order date shown above the list are read
+from the `CustomerOrderStats` rollup that checkout keeps current.
 """
 
-from typing import Union, List, Dict, Any
+import json
+import sqlite3
+from typing import Union, List, Dict, Any, Optional, Tuple
 
-from flask import Blueprint, render_template, session, redirect, url_for
+from flask import (
+    Blueprint,
+    current_app,
+    render_template,
+    request,
+    session,
+    redirect,
+    url_for,
+)
 from werkzeug.wrappers import Response as WerkzeugResponse
 
 from flaskr.db import get_db
+from flaskr.products import decode_cursor, encode_cursor
 
 
 orders_bp = Blueprint("orders", __name__, url_prefix="/orders")
 
 
+def fetch_order_page(
+    db: sqlite3.Connection,
+    customer_id: str,
+    after: Optional[Dict[str, Any]] = None,
+    limit: int = 20,
+    with_items: bool = True,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Fetch one page of a customer's orders, newest first.
+
+    Args:
+        db (sqlite3.Connection): The database connection.
+        customer_id (str): The customer whose orders are listed.
+        after (Optional[Dict[str, Any]]): Decoded cursor of the previous page.
+        limit (int): Maximum number of orders to return.
+        with_items (bool): Also return each order's `Items` and `OrderTotal`,
+            aggregated in the same query.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Optional[str]]: The orders and the cursor
+        of the next page, or None if this is the last page.
+    """
+    params: Dict[str, Any] = {"customer": customer_id, "limit": limit + 1}
+    seek: str = ""
+    if after and "date" in after:
+        seek = " AND (OrderDate, OrderID) < (:after_date, :after_id)"
+        params.update(after_date=after["date"], after_id=after["id"])
+
+    page_query: str = f"""
+        SELECT * FROM Orders
+        WHERE CustomerID = :customer{seek}
+        ORDER BY OrderDate DESC, OrderID DESC
+        LIMIT :limit
+    """
+    if with_items:
+        rows = db.execute(
+            f"""
+            WITH page AS ({page_query})
+            SELECT page.*,
+                   COALESCE(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)), 0)
+                       AS OrderTotal,
+                   json_group_array(json_object(
+                       'ProductID', od.ProductID,
+                       'ProductName', p.ProductName,
+                       'UnitPrice', od.UnitPrice,
+                       'Quantity', od.Quantity,
+                       'Discount', od.Discount
+                   )) FILTER (WHERE od.OrderID IS NOT NULL) AS Items
+            FROM page
+            LEFT JOIN "Order Details" od ON od.OrderID = page.OrderID
+            LEFT JOIN Products p ON p.ProductID = od.ProductID
+            GROUP BY page.OrderID
+            ORDER BY page.OrderDate DESC, page.OrderID DESC
+            """,
+            params,
+        ).fetchall()
+    else:
+        rows = db.execute(page_query, params).fetchall()
+
+    orders: List[Dict[str, Any]] = []
+    for row in rows:
+        order = dict(row)
+        if with_items:
+            order["Items"] = json.loads(order["Items"] or "[]")
+        orders.append(order)
+
+    next_cursor: Optional[str] = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        last = orders[-1]
+        next_cursor = encode_cursor({"id": last["OrderID"], "date": last["OrderDate"]})
+
+    return orders, next_cursor
+
+
+def fetch_order_summary(db: sqlite3.Connection, customer_id: str) -> Dict[str, Any]:
+    """
+    Return a customer's order count, lifetime spend and last order date.
+
+    A single primary-key read of `CustomerOrderStats`; customers without orders
+    get zeros.
+    """
+    try:
+        row = db.execute(
+            """
+            SELECT OrderCount, LifetimeSpend, LastOrderDate
+            FROM CustomerOrderStats
+            WHERE CustomerID = ?
+            """,
+            (customer_id,),
+        ).fetchone()
+    except sqlite3.OperationalError:
+        row = None  # database without the rollup table
+    if row is None:
+        return {"OrderCount": 0, "LifetimeSpend": 0, "LastOrderDate": None}
+    return dict(row)
+
+
 @orders_bp.route("/")
 def view_orders() -> Union[str, WerkzeugResponse]:
     """
-    Display all orders for the currently logged-in user.
+    Display one page of orders for the currently logged-in user.
     If user is not logged in, redirect to login page.
+
+    Accepts `?after=` with the cursor of the previous page and `?items=0` to
+    leave out line items and totals.
     """
     if "user_id" not in session:
         return redirect(url_for("user.login"))
@@ -27,14 +144,25 @@ def view_orders() -> Union[str, WerkzeugResponse]:
     user_id: str = session["user_id"]
     db = get_db()
 
-    orders = db.execute(
-        """
-        SELECT * FROM Orders WHERE CustomerID = ?
-        ORDER BY OrderDate DESC
-    """,
-        (user_id,),
-    ).fetchall()
+    try:
+        after: Optional[Dict[str, Any]] = decode_cursor(request.args["after"])
+    except (KeyError, ValueError):
+        after = None
+    with_items: bool = request.args.get(
+        "items", "1" if current_app.config.get("ORDERS_INCLUDE_ITEMS", True) else "0"
+    ) != "0"
 
-    orders_list: List[Dict[str, Any]] = [dict(order) for order in orders]
+    orders_list, next_cursor = fetch_order_page(
+        db,
+        user_id,
+        after,
+        current_app.config.get("ORDERS_PAGE_SIZE", 20),
+        with_items,
+    )
 
-    return render_template("orders/orders.html", orders=orders_list)
+    return render_template(
+        "orders/orders.html",
+        orders=orders_list,
+        next_cursor=next_cursor,
+        summary=fetch_order_summary(db, user_id),
+    )
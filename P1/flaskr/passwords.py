@@ -0,0 +1,123 @@
+"""
+Passwords module for hashing off the request threads.
+
+Password hashes are deliberately slow, so during a login storm hashing on the
+request thread starves every other request. Each app instead owns a bounded
+pool of `PASSWORD_HASH_WORKERS` hashing threads (hashlib's scrypt and PBKDF2
+release the GIL while they run). At most `PASSWORD_HASH_MAX_PENDING` hashes
+may be queued or running; beyond that, or when a hash is not done within
+`PASSWORD_HASH_TIMEOUT` seconds, `PasswordHasherBusy` is raised so the view
+can answer 503 instead of piling up work.
+
+`PASSWORD_HASH_METHOD` takes any Werkzeug method string, e.g. `scrypt` or
+`pbkdf2:sha256:600000` to set the iteration count. Hashes made with other
+parameters still verify, and `needs_rehash()` tells login to upgrade them.
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_HASH_METHOD = "scrypt"
+
+_HASHER_EXTENSION_KEY = "password_hasher"
+_hasher_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def hash_params(method: str) -> str:
+    """Return the method-and-cost prefix `method` gives a hash, e.g. "scrypt:32768:8:1"."""
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool already has its maximum of pending work."""
+
+
+class PasswordHasher:  # pylint: disable=too-many-instance-attributes
+    """
+    Bounded pool of threads that hash and verify passwords.
+
+    Args:
+        method (str): Werkzeug hash method string used for new hashes.
+        workers (int): Number of hashing threads.
+        max_pending (int): Most hashes queued or running at once.
+        timeout (float): Seconds a caller waits for its hash.
+    """
+
+    def __init__(
+        self,
+        method: str = DEFAULT_HASH_METHOD,
+        workers: int = 2,
+        max_pending: int = 64,
+        timeout: float = 10.0,
+    ) -> None:
+        self.method = method
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.rejected = 0
+        self.timeouts = 0
+        self.params = hash_params(method)
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="password-hash"
+        )
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run `fn` on the pool and wait for it, or raise if the pool is full or slow."""
+        # The slot is released when the hash finishes, not when this call returns.
+        if not self._slots.acquire(blocking=False):  # pylint: disable=consider-using-with
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many password hashes in progress")
+        try:
+            future: Future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError as e:
+            future.cancel()  # drop it if it has not started yet
+            self.timeouts += 1
+            raise PasswordHasherBusy("Password hash did not finish in time") from e
+
+    def hash(self, password: str) -> str:
+        """Return a new hash of `password` using the configured method."""
+        return self._submit(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        """Return True if `password` matches `pwhash`, whatever its method."""
+        return self._submit(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """Return True if `pwhash` was made with a different method or cost."""
+        return pwhash.split("$", 1)[0] != self.params
+
+    def close(self) -> None:
+        """Stop the hashing threads once queued work is done."""
+        self._executor.shutdown(wait=False)
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Return the current application's password hasher, creating it on first use."""
+    hasher: Optional[PasswordHasher] = current_app.extensions.get(_HASHER_EXTENSION_KEY)
+    if hasher is None or hasher.pid != os.getpid():
+        with _hasher_lock:
+            hasher = current_app.extensions.get(_HASHER_EXTENSION_KEY)
+            if hasher is None or hasher.pid != os.getpid():
+                config = current_app.config
+                hasher = PasswordHasher(
+                    method=config.get("PASSWORD_HASH_METHOD", DEFAULT_HASH_METHOD),
+                    workers=config.get("PASSWORD_HASH_WORKERS", 2),
+                    max_pending=config.get("PASSWORD_HASH_MAX_PENDING", 64),
+                    timeout=config.get("PASSWORD_HASH_TIMEOUT", 10.0),
+                )
+                current_app.extensions[_HASHER_EXTENSION_KEY] = hasher
+    return hasher
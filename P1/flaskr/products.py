@@ -2,23 +2,181 @@
 Products module for listing and searching products.
 
 Allows filtering by search query and optional category ID,
-then displays the results on a homepage template.
+then displays the results on a homepage template or as JSON. Searches use
+the `Products_fts` full-text index when available and fall back to LIKE.
+Listings are paginated with keyset cursors so every page costs the same
+regardless of how deep into the catalog it is.
 """
 
-from typing import Dict, List, Any
+import base64
+import binascii
+import json
+import re
+import sqlite3
+from typing import Dict, List, Any, Optional, Tuple
 
-from flask import Blueprint, render_template, request
+from flask import Blueprint, current_app, render_template, request
 
-from flaskr.db import get_db
+from flaskr.catalog import CATALOG_FIELDS, get_catalog, with_live_stock
+from flaskr.db import get_db, select_columns, table_columns
 
 
 products_bp = Blueprint("products", __name__)
 
+# The catalog snapshot leaves out UnitsInStock, which changes with every order.
+PRODUCT_FIELDS: Tuple[str, ...] = CATALOG_FIELDS + ("UnitsInStock",)
+
+
+def fts_match_expression(search_query: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 MATCH expression of quoted prefix terms.
+
+    Every word must match (implicit AND) and each word also matches longer
+    words it is a prefix of, e.g. "wire mou" matches "Wireless Mouse".
+
+    Args:
+        search_query (str): The raw search text entered by the user.
+
+    Returns:
+        Optional[str]: The MATCH expression, or None if the text has no words.
+    """
+    terms = re.findall(r"\w+", search_query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def encode_cursor(key: Dict[str, Any]) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor token."""
+    raw = json.dumps(key, separators=(",", ":")).encode("utf8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    """
+    Decode a cursor token produced by `encode_cursor`.
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        key = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(key, dict) or not isinstance(key.get("id"), int):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def fetch_product_page(
+    db: sqlite3.Connection,
+    search_query: str = "",
+    category_id: str = "",
+    after: Optional[Dict[str, Any]] = None,
+    limit: int = 50,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page of products matching the search text and category.
+
+    Full-text searches are ordered by relevance, then ProductID; everything else
+    is ordered by ProductID. The next page starts strictly after the sort key in
+    `after`, so no rows are skipped or repeated when paging. Pages without a
+    search are served from the in-process catalog cache when it is available.
+
+    Args:
+        db (sqlite3.Connection): The database connection.
+        search_query (str): Free-text search, or empty for no search.
+        category_id (str): Category filter; ignored unless it is a number and
+            `Products` has a CategoryID column.
+        after (Optional[Dict[str, Any]]): Decoded cursor of the previous page.
+        limit (int): Maximum number of rows to return.
+
+    Returns:
+        Tuple[List[Any], Optional[str]]: The rows (`sqlite3.Row`, or dicts
+        built from the catalog cache) and the cursor of the next page, or None
+        if this is the last page.
+    """
+    after = after or {}
+    params: Dict[str, Any] = {"limit": limit + 1}
+    category_filter: str = ""
+    product_columns: str = select_columns(db, "Products", PRODUCT_FIELDS, "p")
+    if category_id.isdigit() and "CategoryID" in table_columns(db, "Products"):
+        category_filter = " AND p.CategoryID = :category"
+        params["category"] = int(category_id)
+
+    match: Optional[str] = fts_match_expression(search_query) if search_query else None
+    rows: Optional[List[Any]] = None
+
+    if not search_query:
+        catalog = get_catalog(db)
+        if catalog is not None:
+            rows = with_live_stock(
+                db, catalog.page(params.get("category"), after.get("id"), limit + 1)
+            )
+
+    if match is not None:
+        seek: str = ""
+        if "relevance" in after:
+            seek = " WHERE (relevance, ProductID) > (:after_relevance, :after_id)"
+            params.update(after_relevance=float(after["relevance"]), after_id=after["id"])
+        try:
+            rows = db.execute(
+                f"""
+                SELECT * FROM (
+                    SELECT {product_columns}, bm25(Products_fts) AS relevance
+                    FROM Products_fts
+                    JOIN Products p ON p.ProductID = Products_fts.rowid
+                    WHERE Products_fts MATCH :match{category_filter}
+                ){seek}
+                ORDER BY relevance, ProductID
+                LIMIT :limit
+                """,
+                dict(params, match=match),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = None  # no FTS5 index on this database
+
+    if rows is None:
+        sql_query: str = f"SELECT {product_columns} FROM Products p WHERE 1=1"
+        if search_query:
+            sql_query += " AND p.ProductName LIKE :search"
+            params["search"] = f"%{search_query}%"
+        if "id" in after:
+            sql_query += " AND p.ProductID > :after_id"
+            params["after_id"] = after["id"]
+        sql_query += category_filter + " ORDER BY p.ProductID LIMIT :limit"
+        rows = db.execute(sql_query, params).fetchall()
+
+    return _trim_page(rows, limit)
+
+
+def _trim_page(rows: List[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """Drop the look-ahead row past `limit` and return the next page's cursor, if any."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    key: Dict[str, Any] = {"id": last["ProductID"]}
+    if "relevance" in last.keys():
+        key["relevance"] = last["relevance"]
+    return rows, encode_cursor(key)
+
+
+def _requested_page_size() -> int:
+    """Return the page size from `?limit=`, bounded by the configured maximum."""
+    default: int = current_app.config.get("PRODUCTS_PAGE_SIZE", 50)
+    maximum: int = current_app.config.get("PRODUCTS_MAX_PAGE_SIZE", 200)
+    limit: str = request.args.get("limit", "").strip()
+    if not limit.isdigit() or int(limit) == 0:
+        return default
+    return min(int(limit), maximum)
+
 
 @products_bp.route("/products", methods=["GET"])
 def list_products() -> str:
     """
-    Fetch and display products based on search query and/or category ID.
+    Fetch and display one page of products based on search query and/or category ID.
 
     Returns:
         str: The rendered HTML of the products homepage with filtered product list.
@@ -28,18 +186,50 @@ def list_products() -> str:
     search_query: str = request.args.get("search", "").strip()
     category_id: str = request.args.get("category", "").strip()
 
-    sql_query: str = "SELECT * FROM Products WHERE 1=1"
-    params: Dict[str, str] = {}
+    try:
+        after: Optional[Dict[str, Any]] = decode_cursor(request.args["after"])
+    except (KeyError, ValueError):
+        after = None
+
+    products, next_cursor = fetch_product_page(
+        db, search_query, category_id, after, _requested_page_size()
+    )
+
+    return render_template(
+        "products/homepage.html", products=products, next_cursor=next_cursor
+    )
 
-    if search_query:
-        sql_query += " AND ProductName LIKE :search"
-        params["search"] = f"%{search_query}%"
 
-    if category_id.isdigit():
-        sql_query += " AND CategoryID = :category"
-        params["category"] = str(int(category_id))
+@products_bp.route("/api/products", methods=["GET"])
+def api_products() -> Tuple[Dict[str, Any], int]:
+    """
+    Return one page of products as JSON.
+
+    Accepts the same `search` and `category` filters as the HTML listing plus
+    `limit` and `cursor`; pass the returned `next_cursor` to get the next page.
+
+    Returns:
+        Tuple[Dict[str, Any], int]: The products and next cursor, and HTTP code.
+    """
+    after: Optional[Dict[str, Any]] = None
+    cursor: str = request.args.get("cursor", "").strip()
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            return {"status": "error", "message": "Invalid cursor"}, 400
 
-    products = db.execute(sql_query, params).fetchall()
-    products_list: List[Dict[str, Any]] = [dict(row) for row in products]
+    products, next_cursor = fetch_product_page(
+        get_db(),
+        request.args.get("search", "").strip(),
+        request.args.get("category", "").strip(),
+        after,
+        _requested_page_size(),
+    )
 
-    return render_template("products/homepage.html", products=products_list)
+    return {
+        "products": [
+            {key: row[key] for key in row.keys() if key != "relevance"} for row in products
+        ],
+        "next_cursor": next_cursor,
+    }, 200
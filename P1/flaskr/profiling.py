@@ -0,0 +1,180 @@
+"""
+Profiling module for sampling request stacks into flamegraph input.
+
+With `PROFILE_SAMPLE_RATE` above zero, that fraction of requests is profiled;
+a request can also ask to be profiled with an `X-Profile` header whose value
+equals `PROFILE_TOKEN`. While a profiled request runs, one shared sampler
+thread records the request thread's Python stack every `PROFILE_INTERVAL`
+seconds. Samples are aggregated per endpoint and written every
+`PROFILE_FLUSH_INTERVAL` seconds to `<PROFILE_DIR>/<endpoint>.folded` in the
+collapsed-stack format read by `flamegraph.pl`, speedscope and similar tools.
+
+Requests that are not sampled only pay for one `random()` call, and the
+sampler thread sleeps while no profiled request is running.
+"""
+
+import atexit
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Dict, List, Optional
+
+from flask import Flask, current_app, g, request
+
+PROFILE_HEADER = "X-Profile"
+MAX_STACK_DEPTH = 128
+
+_PROFILER_EXTENSION_KEY = "stack_sampler"
+_profiler_lock = threading.Lock()
+
+
+def collapse_stack(frame: Optional[FrameType]) -> List[str]:
+    """Return the stack ending at `frame` as collapsed-stack names, outermost first."""
+    names: List[str] = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            .replace(";", ":")
+        )
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class StackSampler:  # pylint: disable=too-many-instance-attributes
+    """
+    Samples the stacks of registered request threads on one background thread.
+
+    Args:
+        directory (str): Where the `.folded` files are written.
+        interval (float): Seconds between samples.
+        flush_interval (float): Seconds between writes of changed endpoints.
+    """
+
+    def __init__(self, directory: str, interval: float = 0.005, flush_interval: float = 10.0):
+        self.directory = directory
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.pid = os.getpid()
+        self.profiled = 0
+        self.samples: Dict[str, "Counter[str]"] = {}
+        self._targets: Dict[int, str] = {}
+        self._dirty: set = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, endpoint: str) -> None:
+        """Start sampling the calling thread under `endpoint`."""
+        with self._lock:
+            self._targets[threading.get_ident()] = endpoint
+            self.profiled += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="stack-sampler", daemon=True
+                )
+                self._thread.start()
+            self._wakeup.notify()
+
+    def stop(self) -> None:
+        """Stop sampling the calling thread."""
+        with self._lock:
+            self._targets.pop(threading.get_ident(), None)
+
+    def sample(self) -> None:
+        """Record one stack for every registered thread."""
+        frames = sys._current_frames()  # pylint: disable=protected-access
+        with self._lock:
+            for ident, endpoint in self._targets.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = ";".join([endpoint, *collapse_stack(frame)])
+                self.samples.setdefault(endpoint, Counter())[stack] += 1
+                self._dirty.add(endpoint)
+
+    def flush(self) -> None:
+        """Rewrite the `.folded` file of every endpoint with new samples."""
+        with self._lock:
+            dirty = {endpoint: dict(self.samples[endpoint]) for endpoint in self._dirty}
+            self._dirty.clear()
+        if not dirty:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for endpoint, stacks in dirty.items():
+            path = os.path.join(self.directory, f"{endpoint}.folded")
+            with open(f"{path}.tmp", "w", encoding="utf8") as f:
+                for stack, count in sorted(stacks.items()):
+                    f.write(f"{stack} {count}\n")
+            os.replace(f"{path}.tmp", path)
+
+    def _run(self) -> None:
+        """Sampler thread: sample while requests are registered, flush periodically."""
+        last_flush = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._targets:
+                    self._wakeup.wait(self.flush_interval if self._dirty else None)
+            if self._targets:
+                self.sample()
+                time.sleep(self.interval)
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
+
+
+def get_profiler(app: Flask) -> StackSampler:
+    """Return the application's stack sampler, creating it on first use."""
+    sampler: Optional[StackSampler] = app.extensions.get(_PROFILER_EXTENSION_KEY)
+    if sampler is None or sampler.pid != os.getpid():
+        with _profiler_lock:
+            sampler = app.extensions.get(_PROFILER_EXTENSION_KEY)
+            if sampler is None or sampler.pid != os.getpid():
+                sampler = StackSampler(
+                    app.config.get("PROFILE_DIR")
+                    or os.path.join(app.instance_path, "profiles"),
+                    interval=app.config.get("PROFILE_INTERVAL", 0.005),
+                    flush_interval=app.config.get("PROFILE_FLUSH_INTERVAL", 10.0),
+                )
+                atexit.register(sampler.flush)
+                app.extensions[_PROFILER_EXTENSION_KEY] = sampler
+    return sampler
+
+
+def _wants_profile() -> bool:
+    """Return True if the current request should be profiled."""
+    rate = current_app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+    if rate and random.random() < rate:
+        return True
+    token = current_app.config.get("PROFILE_TOKEN")
+    sent = request.headers.get(PROFILE_HEADER)
+    return bool(token and sent and hmac.compare_digest(sent.encode(), token.encode()))
+
+
+def _start_profile() -> None:
+    """Before-request hook registering sampled requests with the sampler."""
+    if request.endpoint is None or not _wants_profile():
+        return
+    app: Flask = current_app._get_current_object()  # type: ignore[attr-defined]  # pylint: disable=protected-access
+    g.profiler = get_profiler(app)
+    g.profiler.start(request.endpoint)
+
+
+def _stop_profile(_: Optional[BaseException] = None) -> None:
+    """Teardown hook unregistering the request from the sampler."""
+    profiler: Optional[StackSampler] = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.stop()
+
+
+def init_profiling(app: Flask) -> None:
+    """Register the sampling hooks if profiling can be triggered at all."""
+    if app.config.get("PROFILE_SAMPLE_RATE", 0.0) or app.config.get("PROFILE_TOKEN"):
+        app.before_request(_start_profile)
+        app.teardown_request(_stop_profile)
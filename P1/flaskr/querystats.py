@@ -0,0 +1,282 @@
+"""
+Query statistics module for opt-in SQL timing and a slow-query log.
+
+With `DB_INSTRUMENT` set, pooled connections run their statements through
+`QueryCursor`, which measures each statement from `execute()` until its rows
+have been fetched. Every statement is recorded in the app's `QueryStats`:
+call count, total and maximum latency, rows, a latency histogram, and the
+endpoint that ran it. Statements slower than `DB_SLOW_QUERY_MS` are logged
+with their `EXPLAIN QUERY PLAN`. Per-request totals are kept in `g` and sent
+back in a `Server-Timing` header.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import (
+    Flask,
+    Response,
+    current_app,
+    g,
+    has_app_context,
+    has_request_context,
+    request,
+)
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+HISTOGRAM_BOUNDS_MS: Tuple[float, ...] = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+MAX_SQL_LENGTH = 200
+MAX_STATEMENTS = 500
+OTHER_STATEMENTS = "<other>"
+
+_STATS_EXTENSION_KEY = "query_stats"
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and truncate `sql` so equal statements share one key."""
+    return " ".join(sql.split())[:MAX_SQL_LENGTH]
+
+
+class StatementStats:  # pylint: disable=too-few-public-methods
+    """Counters and latency histogram for one normalized statement."""
+
+    __slots__ = ("calls", "total_time", "max_time", "rows", "buckets", "endpoints")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+        self.buckets: List[int] = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.endpoints: Dict[str, int] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the counters as plain data."""
+        return {
+            "calls": self.calls,
+            "total_ms": self.total_time * 1000,
+            "max_ms": self.max_time * 1000,
+            "rows": self.rows,
+            "histogram": list(self.buckets),
+            "endpoints": dict(self.endpoints),
+        }
+
+
+class QueryStats:
+    """
+    Thread-safe, in-memory statement statistics for one application.
+
+    Args:
+        slow_ms (float): Statements at least this slow are logged.
+        explain (bool): Log slow statements with their query plan.
+    """
+
+    def __init__(self, slow_ms: float = 100.0, explain: bool = True) -> None:
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.slow = 0
+        self._statements: Dict[str, StatementStats] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, sql: str, seconds: float, rows: int, endpoint: str) -> None:
+        """Record one finished statement."""
+        key = normalize_sql(sql)
+        bucket = bisect_left(HISTOGRAM_BOUNDS_MS, seconds * 1000)
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                if len(self._statements) >= MAX_STATEMENTS:
+                    key = OTHER_STATEMENTS
+                stats = self._statements.setdefault(key, StatementStats())
+            stats.calls += 1
+            stats.total_time += seconds
+            stats.max_time = max(stats.max_time, seconds)
+            stats.rows += rows
+            stats.buckets[bucket] += 1
+            stats.endpoints[endpoint] = stats.endpoints.get(endpoint, 0) + 1
+            if seconds * 1000 >= self.slow_ms:
+                self.slow += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return per-statement counters, slowest total time first."""
+        with self._lock:
+            statements = sorted(
+                ((sql, stats.as_dict()) for sql, stats in self._statements.items()),
+                key=lambda item: item[1]["total_ms"],
+                reverse=True,
+            )
+            return {
+                "histogram_bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+                "slow": self.slow,
+                "statements": dict(statements),
+            }
+
+    def reset(self) -> None:
+        """Forget all recorded statements."""
+        with self._lock:
+            self._statements.clear()
+            self.slow = 0
+
+
+def _current_endpoint() -> str:
+    """Return the endpoint running the statement, or "-" outside requests."""
+    if has_request_context() and request.endpoint:
+        return request.endpoint
+    return "-"
+
+
+def _log_slow(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+    conn: sqlite3.Connection, sql: str, params: Any, seconds: float, rows: int, explain: bool
+) -> None:
+    """Log a slow statement, with its query plan when it has one."""
+    plan = ""
+    if explain and params is not None and sql.lstrip().upper().startswith(_EXPLAINABLE):
+        try:
+            plan = "\n".join(
+                row[3]
+                for row in conn.cursor(sqlite3.Cursor)
+                .execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                .fetchall()
+            )
+        except sqlite3.Error:
+            plan = "(no plan)"
+    logger.warning(
+        "Slow query (%.1f ms, %d rows) in %s: %s\n%s",
+        seconds * 1000,
+        rows,
+        _current_endpoint(),
+        normalize_sql(sql),
+        plan,
+    )
+
+
+class QueryCursor(sqlite3.Cursor):
+    """
+    Cursor that times each statement from `execute()` to its last fetch.
+
+    Statements without a result set are recorded as soon as they run; queries
+    are recorded on the first `fetchone()`/`fetchmany()`/`fetchall()`, when
+    iteration is exhausted, or when the cursor is reused or closed.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._pending: Optional[Tuple[str, Any, float]] = None
+        self._rows = 0
+
+    def _run(self, method: Any, sql: str, params: Any, plan_params: Any) -> "QueryCursor":
+        self._finish()
+        started = time.perf_counter()
+        method(sql, params)
+        self._pending = (sql, plan_params, time.perf_counter() - started)
+        self._rows = 0
+        if self.description is None:
+            self._finish(rows=max(self.rowcount, 0))
+        return self
+
+    def execute(self, sql: str, parameters: Any = ()) -> "QueryCursor":  # type: ignore[override]
+        """Run one statement and start timing it."""
+        return self._run(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> "QueryCursor":  # type: ignore[override]
+        """Run one statement per parameter set and time the whole batch."""
+        # The per-row parameters may be an iterator, so no plan is logged for these.
+        return self._run(super().executemany, sql, seq_of_parameters, None)
+
+    def _timed(self, method: Any, *args: Any) -> Any:
+        started = time.perf_counter()
+        result = method(*args)
+        if self._pending is not None:
+            sql, params, elapsed = self._pending
+            self._pending = (sql, params, elapsed + time.perf_counter() - started)
+        return result
+
+    def fetchone(self) -> Any:
+        """Fetch the next row and record the statement."""
+        row = self._timed(super().fetchone)
+        self._finish(rows=0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args: Any) -> List[Any]:
+        """Fetch the next rows and record the statement."""
+        rows = self._timed(super().fetchmany, *args)
+        self._finish(rows=len(rows))
+        return rows
+
+    def fetchall(self) -> List[Any]:
+        """Fetch the remaining rows and record the statement."""
+        rows = self._timed(super().fetchall)
+        self._finish(rows=self._rows + len(rows))
+        return rows
+
+    def __next__(self) -> Any:
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish(rows=self._rows)
+            raise
+        self._rows += 1
+        return row
+
+    def close(self) -> None:
+        """Record any pending statement and close the cursor."""
+        self._finish(rows=self._rows)
+        super().close()
+
+    def _finish(self, rows: int = 0) -> None:
+        """Record the pending statement, if any."""
+        if self._pending is None:
+            return
+        sql, params, seconds = self._pending
+        self._pending = None
+        stats: Optional[QueryStats] = getattr(self.connection, "query_stats", None)
+        if stats is None:
+            return
+        stats.observe(sql, seconds, rows, _current_endpoint())
+        if has_app_context():
+            totals = g.setdefault("query_totals", {"count": 0, "time": 0.0, "rows": 0})
+            totals["count"] += 1
+            totals["time"] += seconds
+            totals["rows"] += rows
+        if seconds * 1000 >= stats.slow_ms:
+            _log_slow(self.connection, sql, params, seconds, rows, stats.explain)
+
+
+def get_query_stats(app: Optional[Flask] = None) -> Optional[QueryStats]:
+    """Return the application's `QueryStats`, or None if instrumentation is off."""
+    app = app or current_app._get_current_object()  # type: ignore[attr-defined]  # pylint: disable=protected-access
+    if not app.config.get("DB_INSTRUMENT", False):
+        return None
+    stats: Optional[QueryStats] = app.extensions.get(_STATS_EXTENSION_KEY)
+    if stats is None:
+        stats = app.extensions.setdefault(
+            _STATS_EXTENSION_KEY,
+            QueryStats(
+                slow_ms=app.config.get("DB_SLOW_QUERY_MS", 100.0),
+                explain=app.config.get("DB_EXPLAIN_SLOW_QUERIES", True),
+            ),
+        )
+    return stats
+
+
+def request_query_totals() -> Dict[str, Any]:
+    """Return the number, total time and rows of the statements run so far in this context."""
+    return dict(g.get("query_totals") or {"count": 0, "time": 0.0, "rows": 0})
+
+
+def add_server_timing(response: Response) -> Response:
+    """After-request hook adding the request's database time as `Server-Timing`."""
+    totals = g.get("query_totals")
+    if totals:
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={totals["time"] * 1000:.2f};desc="{totals["count"]} queries"',
+        )
+    return response
@@ -0,0 +1,296 @@
+"""
+Sessions module for session storage and for keeping cheap routes out of it.
+
+By default (`SESSION_BACKEND = "sqlite"`) session data lives server-side in
+the `Sessions` table and the cookie only carries an opaque random key, so it
+is never re-signed or re-serialized. Sessions are loaded lazily on first
+access and written only when modified; an unmodified session is just touched
+once it is past half its lifetime. Whenever the session's `user_id` changes
+(login or logout) the stored row is deleted and the session is saved under
+a fresh key, so a planted or leaked key never becomes an authenticated
+session. `SESSION_BACKEND = "cookie"` keeps Flask's signed cookie sessions.
+
+Static files, health probes and the landing page do not need a shopper
+session. Views marked with `@sessionless` (and the `static` endpoint) do not
+get a session ID minted by `ensure_session_id`, skip the auth hook for
+anonymous visitors, and do not write a session cookie unless they change the
+session, so load-balancer probes and asset fetches cost almost nothing.
+"""
+
+import re
+import secrets
+import sqlite3
+import time
+from typing import Any, Callable, Dict, FrozenSet, Optional, TypeVar
+
+import click
+from flask import Flask, current_app, has_request_context, request
+from flask.cli import with_appcontext
+from flask.sessions import (
+    SecureCookieSessionInterface,
+    SessionInterface,
+    SessionMixin,
+    session_json_serializer,
+)
+from flask.wrappers import Request, Response
+from werkzeug.datastructures import CallbackDict
+
+from flaskr.db import get_db, get_pool, split_reads, writer_connection
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+SESSIONLESS_ENDPOINTS: FrozenSet[str] = frozenset({"static"})
+
+
+def sessionless(view: F) -> F:
+    """Mark a view as not needing a session; see the module docstring."""
+    view.sessionless = True  # type: ignore[attr-defined]
+    return view
+
+
+def is_sessionless() -> bool:
+    """Return True if the current request is routed to a sessionless view."""
+    if not has_request_context() or request.endpoint is None:
+        return False
+    if request.endpoint in SESSIONLESS_ENDPOINTS:
+        return True
+    view = current_app.view_functions.get(request.endpoint)
+    return bool(getattr(view, "sessionless", False))
+
+
+class SessionlessAwareInterface(SecureCookieSessionInterface):
+    """
+    Signed cookie sessions that sessionless routes never write.
+
+    A session that was explicitly modified is still saved, e.g. by the test
+    client's `session_transaction()`, which runs against the `/` route.
+    """
+
+    def save_session(self, app: Flask, session: SessionMixin, response: Response) -> None:
+        if is_sessionless() and not session.modified:
+            return
+        super().save_session(app, session, response)
+
+
+_SESSION_KEY_RE = re.compile(r"^[A-Za-z0-9_-]{32}$")
+
+
+def load_session_data(app: Flask, key: str) -> Optional[Dict[str, Any]]:
+    """
+    Read an unexpired session from the `Sessions` table.
+
+    Uses its own short-lived pooled connection, so it also works after the
+    request that opened the session has released its connections. It is a
+    read-only connection unless `DB_SPLIT_READS` is off, as for `get_db()`.
+
+    Returns:
+        Optional[Dict[str, Any]]: The data with its expiry under
+        `"_expires_at"`, or None if the session is missing or expired.
+    """
+    db = get_pool(app, readonly=split_reads(app)).acquire()
+    try:
+        row = db.execute(
+            "SELECT Data, ExpiresAt FROM Sessions WHERE SessionKey = ? AND ExpiresAt > ?",
+            (key, int(time.time())),
+        ).fetchone()
+    finally:
+        db.close()
+    if row is None:
+        return None
+    data: Dict[str, Any] = session_json_serializer.loads(row["Data"])
+    data["_expires_at"] = row["ExpiresAt"]
+    return data
+
+
+class ServerSideSession(CallbackDict, SessionMixin):  # type: ignore[type-arg]
+    """
+    Session dict that loads its data from the store on first access.
+
+    Args:
+        app (Flask): The application whose database holds the session.
+        key (Optional[str]): Opaque session key from the cookie, if any.
+    """
+
+    def __init__(self, app: Flask, key: Optional[str] = None) -> None:
+        def on_update(self: ServerSideSession) -> None:
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(None, on_update)
+        self.app = app
+        self.key = key
+        self.expires_at: Optional[int] = None
+        self.loaded_user_id: Optional[str] = None
+        self.modified = False
+        self.accessed = False
+        self.loaded = key is None
+
+    @property
+    def new(self) -> bool:  # type: ignore[override]
+        """True until the session has been stored."""
+        self.load()
+        return self.key is None
+
+    def load(self) -> None:
+        """Fetch the stored data the first time the session is used."""
+        self.accessed = True
+        if self.loaded:
+            return
+        self.loaded = True
+        data = load_session_data(self.app, self.key) if self.key else None
+        if data is None:
+            self.key = None  # unknown or expired: start a new session
+            return
+        self.expires_at = data.pop("_expires_at")
+        self.loaded_user_id = data.get("user_id")
+        dict.update(self, data)
+
+
+def _loading(name: str) -> Callable[..., Any]:
+    """Wrap the dict method `name` so it loads the session before running."""
+    method = getattr(CallbackDict, name)
+
+    def wrapper(self: ServerSideSession, *args: Any, **kwargs: Any) -> Any:
+        self.load()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+# Every read and write goes through one of these, so all of them must load.
+for _name in (
+    "__getitem__", "__contains__", "__iter__", "__len__", "__repr__", "__eq__",
+    "get", "keys", "values", "items", "copy", "setdefault", "pop", "popitem",
+    "update", "clear", "__setitem__", "__delitem__",
+):
+    setattr(ServerSideSession, _name, _loading(_name))
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Session interface storing data in the `Sessions` table under an opaque key."""
+
+    def open_session(  # pylint: disable=redefined-outer-name
+        self, app: Flask, request: Request
+    ) -> ServerSideSession:
+        key = request.cookies.get(self.get_cookie_name(app))
+        if key is None or not _SESSION_KEY_RE.match(key):
+            key = None
+        return ServerSideSession(app, key)
+
+    def save_session(  # type: ignore[override]
+        self, app: Flask, session: ServerSideSession, response: Response
+    ) -> None:
+        if session.accessed:
+            response.vary.add("Cookie")
+        if not session.loaded or (is_sessionless() and not session.modified):
+            return
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        now = int(time.time())
+
+        if not session.modified:
+            if session.key is not None and session.expires_at is not None:
+                if session.expires_at - now < lifetime // 2:
+                    with writer_connection() as db:
+                        db.execute(
+                            "UPDATE Sessions SET ExpiresAt = ? WHERE SessionKey = ?",
+                            (now + lifetime, session.key),
+                        )
+                        db.commit()
+            return
+
+        if session.key is not None and session.get("user_id") != session.loaded_user_id:
+            # Login or logout: retire the old key so it cannot be reused.
+            with writer_connection() as db:
+                db.execute("DELETE FROM Sessions WHERE SessionKey = ?", (session.key,))
+                db.commit()
+            session.key = None
+            if not session:
+                response.delete_cookie(name, domain=domain, path=path)
+
+        if not session:
+            if session.key is not None:
+                with writer_connection() as db:
+                    db.execute("DELETE FROM Sessions WHERE SessionKey = ?", (session.key,))
+                    db.commit()
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        set_cookie = session.key is None or session.permanent
+        if session.key is None:
+            session.key = secrets.token_urlsafe(24)
+        with writer_connection() as db:
+            db.execute(
+                """
+                INSERT INTO Sessions (SessionKey, Data, ExpiresAt) VALUES (?, ?, ?)
+                ON CONFLICT (SessionKey) DO UPDATE
+                SET Data = excluded.Data, ExpiresAt = excluded.ExpiresAt
+                """,
+                (session.key, session_json_serializer.dumps(dict(session)), now + lifetime),
+            )
+            db.commit()
+        session.expires_at = now + lifetime
+        session.loaded_user_id = session.get("user_id")
+        session.modified = False
+
+        if set_cookie:
+            response.set_cookie(
+                name,
+                session.key,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+                partitioned=self.get_cookie_partitioned(app),
+            )
+
+
+def make_session_interface(app: Flask) -> SessionInterface:
+    """Return the session interface selected by `SESSION_BACKEND`."""
+    if app.config.get("SESSION_BACKEND", "sqlite") == "cookie":
+        return SessionlessAwareInterface()
+    return ServerSideSessionInterface()
+
+
+def expire_sessions(db: sqlite3.Connection, batch_size: int = 500) -> int:
+    """
+    Delete expired rows from `Sessions`, in bounded batches.
+
+    Args:
+        db (sqlite3.Connection): A writable database connection.
+        batch_size (int): Maximum number of rows deleted per transaction.
+
+    Returns:
+        int: The total number of rows deleted.
+    """
+    now = int(time.time())
+    total = 0
+    while True:
+        deleted = db.execute(
+            """
+            DELETE FROM Sessions
+            WHERE SessionKey IN (
+                SELECT SessionKey FROM Sessions WHERE ExpiresAt <= ? LIMIT ?
+            )
+            """,
+            (now, batch_size),
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+@click.command("expire-sessions")
+@click.option("--batch-size", type=int, default=500, help="Rows deleted per batch.")
+@with_appcontext
+def expire_sessions_command(batch_size: int) -> None:
+    """Flask CLI command to purge expired server-side sessions, e.g. from cron."""
+    deleted = expire_sessions(get_db(), batch_size)
+    click.echo(f"Expired {deleted} sessions.")
@@ -3,13 +3,20 @@
 User authentication module.
 
 This module handles user registration, login, logout, and session management.
+The logged-in user is loaded lazily: `g.user` only queries `Authentication`
+when a view or template actually reads it, and the row is kept in a small
+per-app LRU cache with a TTL that login, logout and registration invalidate.
 """
 
 import secrets
-from typing import Union, Optional, Callable, Any, TypeVar
+import threading
+import time
+from collections import OrderedDict
+from typing import Union, Optional, Callable, Any, Dict, Tuple, TypeVar
 
 from flask import (
     Blueprint,
+    current_app,
     flash,
     g,
     redirect,
@@ -18,29 +25,120 @@ from flask import (
     session,
     url_for,
 )
+from werkzeug.local import LocalProxy
 from werkzeug.wrappers import Response as WerkzeugResponse
-from werkzeug.security import check_password_hash, generate_password_hash
 from flaskr.db import get_db
+from flaskr.passwords import PasswordHasherBusy, get_password_hasher
 
 bp = Blueprint("user", __name__, url_prefix="/user")
 
 F = TypeVar("F", bound=Callable[..., Any])
 
+_AUTH_CACHE_EXTENSION_KEY = "auth_cache"
+_auth_cache_lock = threading.Lock()
+
+
+class AuthCache:
+    """
+    Thread-safe LRU cache of (UserID, SessionID) -> `Authentication` row.
+
+    Misses are cached too, so a stale session cookie costs one query per TTL.
+    Entries expire after `ttl` seconds, which bounds how long another process
+    can keep serving a row after that process's own login or logout.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1024) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, session_id: str) -> Tuple[bool, Any]:
+        """
+        Look up a cached row.
+
+        Returns:
+            Tuple[bool, Any]: Whether the key was cached, and the row (or None).
+        """
+        key = (user_id, session_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, user_id: str, session_id: str, row: Any) -> None:
+        """Cache `row` for the pair, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[(user_id, session_id)] = (time.monotonic() + self.ttl, row)
+            self._entries.move_to_end((user_id, session_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop every cached session of `user_id`."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """Drop all cached rows."""
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the number of cached entries."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+def get_auth_cache() -> AuthCache:
+    """Return the current application's auth cache, creating it on first use."""
+    cache: Optional[AuthCache] = current_app.extensions.get(_AUTH_CACHE_EXTENSION_KEY)
+    if cache is None:
+        with _auth_cache_lock:
+            cache = current_app.extensions.get(_AUTH_CACHE_EXTENSION_KEY)
+            if cache is None:
+                cache = AuthCache(
+                    ttl=current_app.config.get("AUTH_CACHE_TTL", 30.0),
+                    max_entries=current_app.config.get("AUTH_CACHE_MAX_ENTRIES", 1024),
+                )
+                current_app.extensions[_AUTH_CACHE_EXTENSION_KEY] = cache
+    return cache
+
+
+def _hasher_busy(template: str, **context: Any) -> Tuple[str, int, Dict[str, str]]:
+    """Render `template` as a 503 when the password hashing pool is saturated."""
+    flash("The server is busy, please try again in a moment.")
+    return render_template(template, **context), 503, {"Retry-After": "1"}
+
+
+def invalidate_user(user_id: Optional[str]) -> None:
+    """Forget cached sessions of `user_id` after its `Authentication` row changed."""
+    if user_id:
+        get_auth_cache().invalidate(user_id)
+
 
 @bp.route("/register", methods=("GET", "POST"))
-def register() -> Union[str, WerkzeugResponse]:
+def register() -> Union[str, WerkzeugResponse, Tuple[str, int, Dict[str, str]]]:
     """
     Handle user registration.
 
     - Validates input (username must be 5 characters).
+    - Rejects a taken username before spending time on hashing the password.
     - Checks if the user exists in Customers.
     - If not registered, creates a new user in Authentication.
+    - Answers 503 if the password hashing pool is saturated.
     """
     prefill_username: str = request.args.get("username", "")
     if request.method == "POST":
         username: str = request.form.get("username", prefill_username).strip().upper()
         password: str = request.form["password"]
-        db = get_db()
         error: Optional[str] = None
 
         if not username:
@@ -49,8 +147,21 @@ def register() -> Union[str, WerkzeugResponse]:
             error = "User ID must be exactly 5 characters."
         elif not password:
             error = "Password is required."
+        elif get_db(write=False).execute(
+            "SELECT 1 FROM Authentication WHERE UserID = ?", (username,)
+        ).fetchone():
+            error = f"User {username} is already registered."
 
         if error is None:
+            # Hash before taking the writer so other writes are not held up.
+            try:
+                password_hash: str = get_password_hasher().hash(password)
+            except PasswordHasherBusy:
+                return _hasher_busy(
+                    "user/register.html", prefill_username=prefill_username
+                )
+
+            db = get_db()
             customer = db.execute(
                 "SELECT * FROM Customers WHERE CustomerID = ?", (username,)
             ).fetchone()
@@ -62,11 +173,12 @@ def register() -> Union[str, WerkzeugResponse]:
                     "INSERT INTO Authentication (UserID, PasswordHash, SessionID) VALUES (?, ?, ?)",
                     (
                         username,
-                        generate_password_hash(password),
+                        password_hash,
                         session.get("session_id"),
                     ),
                 )
                 db.commit()
+                invalidate_user(username)
             except db.IntegrityError:
                 db.rollback()
                 error = f"User {username} is already registered."
@@ -78,20 +190,68 @@ def register() -> Union[str, WerkzeugResponse]:
     return render_template("user/register.html", prefill_username=prefill_username)
 
 
+def _complete_login(user: Any, username: str, password: str) -> None:
+    """
+    Log `username` in after its password was verified.
+
+    Moves the user's cart to the current session and upgrades a password hash
+    made with outdated parameters. The writer is only taken for these updates.
+
+    Args:
+        user (Any): The user's `Authentication` row.
+        username (str): The user ID.
+        password (str): The verified plain-text password.
+    """
+    hasher = get_password_hasher()
+    new_hash: Optional[str] = None
+    if hasher.needs_rehash(user["PasswordHash"]):
+        try:
+            new_hash = hasher.hash(password)
+        except PasswordHasherBusy:
+            pass  # upgrade on a later login
+
+    old_session_id: Optional[str] = user["SessionID"]
+    new_session_id: str = session["session_id"]
+    session["user_id"] = username
+
+    db = get_db(write=True)
+    if new_hash is not None:
+        db.execute(
+            "UPDATE Authentication SET PasswordHash = ? WHERE UserID = ?",
+            (new_hash, username),
+        )
+
+    if old_session_id != new_session_id:
+        db.execute(
+            "UPDATE Shopping_cart SET ShopperID = ? WHERE ShopperID = ?",
+            (new_session_id, old_session_id),
+        )
+        db.execute(
+            "UPDATE Authentication SET SessionID = ? WHERE UserID = ?",
+            (new_session_id, username),
+        )
+    db.commit()
+    invalidate_user(username)
+
+
 @bp.route("/login", methods=("GET", "POST"))
-def login() -> Union[str, WerkzeugResponse]:
+def login() -> Union[str, WerkzeugResponse, Tuple[str, int, Dict[str, str]]]:
     """
     Handle user login.
 
     - Checks if the user exists in Authentication.
     - If not, verifies if they exist in Customers.
     - If valid, updates session and redirects to products.
+    - Rehashes the password if it was hashed with outdated parameters.
+    - Answers 503 if the password hashing pool is saturated.
     """
     if request.method == "POST":
         username: str = request.form["username"].strip().upper()
         password: str = request.form["password"]
-        db = get_db()
+        # Verify on a reader so the writer is only held for the final updates.
+        db = get_db(write=False)
         error: Optional[str] = None
+        hasher = get_password_hasher()
 
         if not username:
             error = "User ID is required."
@@ -114,24 +274,15 @@ def login() -> Union[str, WerkzeugResponse]:
                     return redirect(url_for("user.register", username=username))
                 else:
                     error = "Username not found, please register."
-            elif not check_password_hash(user["PasswordHash"], password):
-                error = "Password incorrect."
+            else:
+                try:
+                    if not hasher.verify(user["PasswordHash"], password):
+                        error = "Password incorrect."
+                except PasswordHasherBusy:
+                    return _hasher_busy("user/login.html")
 
         if error is None:
-            old_session_id: Optional[str] = user["SessionID"]
-            new_session_id: str = session["session_id"]
-            session["user_id"] = username
-
-            if old_session_id != new_session_id:
-                db.execute(
-                    "UPDATE Shopping_cart SET ShopperID = ? WHERE ShopperID = ?",
-                    (new_session_id, old_session_id),
-                )
-                db.execute(
-                    "UPDATE Authentication SET SessionID = ? WHERE UserID = ?",
-                    (new_session_id, username),
-                )
-            db.commit()
+            _complete_login(user, username, password)
             return redirect(url_for("products.list_products"))
 
         flash(error)
@@ -139,27 +290,52 @@ def login() -> Union[str, WerkzeugResponse]:
     return render_template("user/login.html")
 
 
-@bp.before_app_request
-def load_logged_in_user() -> None:
+def fetch_logged_in_user() -> Any:
     """
-    Load the currently logged-in user.
+    Return the `Authentication` row of the session's user, or None.
 
-    Retrieves user authentication information from the session
-    and stores it in `g.user` for request handling.
+    The row is looked up once per request, through the auth cache when
+    `AUTH_CACHE_ENABLED` is set.
     """
+    if "auth_row" in g:
+        return g.auth_row
+
     user_id: Optional[str] = session.get("user_id")
     session_id: Optional[str] = session.get("session_id")
-    if user_id is None or session_id is None:
-        g.user = None
-    else:
-        g.user = (
-            get_db()
-            .execute(
-                "SELECT * FROM Authentication WHERE UserID = ? AND SessionID = ?",
-                (user_id, session_id),
-            )
-            .fetchone()
+    row: Any = None
+    if user_id is not None and session_id is not None:
+        use_cache: bool = current_app.config.get("AUTH_CACHE_ENABLED", True)
+        cached, row = (
+            get_auth_cache().get(user_id, session_id) if use_cache else (False, None)
         )
+        if not cached:
+            row = (
+                get_db(write=False)
+                .execute(
+                    "SELECT * FROM Authentication WHERE UserID = ? AND SessionID = ?",
+                    (user_id, session_id),
+                )
+                .fetchone()
+            )
+            if use_cache:
+                get_auth_cache().put(user_id, session_id, row)
+
+    g.auth_row = row
+    return row
+
+
+@bp.before_app_request
+def load_logged_in_user() -> None:
+    """
+    Load the currently logged-in user.
+
+    Stores a lazy proxy in `g.user` that fetches the user's authentication
+    row on first use, so requests that never look at the user skip the query.
+    Test `g.user` for truthiness rather than comparing it with None.
+    The hook does not read the session itself, so sessionless routes that
+    never look at the user do not load it either.
+    """
+    g.user = LocalProxy(fetch_logged_in_user)
 
 
 @bp.route("/logout")
@@ -167,6 +343,7 @@ def logout() -> WerkzeugResponse:
     """
     Log out the user by clearing the session and generating a new session ID.
     """
+    invalidate_user(session.get("user_id"))
     session.clear()
     session["session_id"] = secrets.token_hex(16)
     return redirect(url_for("products.list_products"))
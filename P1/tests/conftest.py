@@ -10,6 +10,7 @@ import pytest
 from flask import Flask
 
 from flaskr import create_app
+from flaskr.db import close_pool
 
 
 # 读取 `data.sql` 文件的内容
@@ -43,6 +44,7 @@ def app() -> Generator[Flask, None, None]:
 
     yield app_instance
 
+    close_pool(app_instance)
     os.close(db_fd)
     os.unlink(db_path)  # 删除临时数据库文件
 
@@ -155,3 +155,23 @@ def test_database_content(app: Flask) -> None:
     with app.app_context():
         db = get_db()
         verify_database_content(db)
+
+
+def test_sessionless_routes_skip_session_cookie(client: FlaskClient) -> None:
+    """Static files, /hello and the landing page must not mint a session cookie."""
+    for path in ("/hello", "/static/style.css", "/"):
+        response = client.get(path)
+        assert response.status_code == 200
+        assert "Set-Cookie" not in response.headers, path
+
+    response = client.get("/products")
+    assert "session=" in response.headers["Set-Cookie"]
+
+
+def test_landing_page_still_knows_logged_in_user(client: FlaskClient) -> None:
+    """The landing page skips session creation but still shows the user's nav."""
+    client.post("/user/register", data={"username": "NEWUS", "password": "newpassword"})
+    client.post("/user/login", data={"username": "NEWUS", "password": "newpassword"})
+    response = client.get("/")
+    assert b"Log Out" in response.data
+    assert "Set-Cookie" not in response.headers
@@ -1,12 +1,18 @@
 """Module tests for cart functionality."""
 
+import time
 from datetime import timedelta
 
 from flask import Flask, session, url_for
-from flask.testing import FlaskClient
+from flask.testing import FlaskClient, FlaskCliRunner
 
 from flaskr.db import get_db
-from flaskr.cart import get_est_time, cleanup_old_cart_entries, remove_from_cart
+from flaskr.cart import (
+    get_est_time,
+    cleanup_old_cart_entries,
+    remove_from_cart,
+    start_cart_expiry_worker,
+)
 
 
 def test_view_cart_empty(client: FlaskClient) -> None:
@@ -236,3 +242,164 @@ def test_remove_from_cart_without_session(app: Flask) -> None:
         assert response.status_code in (302, 303)
         # Verify that the redirect location is correct
         assert url_for("cart.view_cart") in response.location
+
+
+def test_add_bulk_to_cart_json(client: FlaskClient) -> None:
+    """
+    POST a JSON list of items to /cart/add-bulk and verify every row,
+    including repeated products, is merged into the cart.
+    """
+    with client.session_transaction() as sess:
+        sess["session_id"] = "test-session-123"
+
+    client.post("/cart/add/", data={"product_id": "1", "quantity": "1"})
+    response = client.post(
+        "/cart/add-bulk",
+        json={
+            "items": [
+                {"product_id": 1, "quantity": 2},
+                {"product_id": 2},
+                {"product_id": 2, "quantity": 4},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    assert response.json is not None
+    assert response.json["status"] == "success"
+    assert response.json["count"] == 3
+
+    with client.application.app_context():
+        rows = get_db().execute(
+            """
+            SELECT ProductID, Quantity FROM Shopping_cart
+            WHERE ShopperID = ? ORDER BY ProductID
+            """,
+            ("test-session-123",),
+        ).fetchall()
+        assert [tuple(row) for row in rows] == [(1, 3), (2, 5)]
+
+
+def test_add_bulk_to_cart_form(client: FlaskClient) -> None:
+    """Test that repeated product_id/quantity form fields are accepted."""
+    with client.session_transaction() as sess:
+        sess["session_id"] = "test-session-123"
+
+    response = client.post(
+        "/cart/add-bulk",
+        data={"product_id": ["1", "2"], "quantity": ["2", "1"]},
+    )
+    assert response.status_code == 200
+
+    with client.application.app_context():
+        total = get_db().execute(
+            "SELECT SUM(Quantity) FROM Shopping_cart WHERE ShopperID = ?",
+            ("test-session-123",),
+        ).fetchone()[0]
+        assert total == 3
+
+
+def test_add_bulk_to_cart_rejects_bad_input(client: FlaskClient) -> None:
+    """Test that invalid bulk payloads are rejected without touching the cart."""
+    with client.session_transaction() as sess:
+        sess["session_id"] = "test-session-123"
+
+    bad_payloads = [
+        {"json": {}},
+        {"json": {"items": []}},
+        {"json": {"items": [{"product_id": "x", "quantity": 1}]}},
+        {"json": {"items": [{"product_id": 1, "quantity": 1}, {"product_id": 2, "quantity": 0}]}},
+        {"data": {"product_id": ["1", "2"], "quantity": ["1"]}},
+    ]
+    for payload in bad_payloads:
+        response = client.post("/cart/add-bulk", **payload)
+        assert response.status_code == 400
+        assert (response.json or {}).get("status") == "error"
+
+    with client.application.app_context():
+        count = get_db().execute(
+            "SELECT COUNT(*) FROM Shopping_cart WHERE ShopperID = ?",
+            ("test-session-123",),
+        ).fetchone()[0]
+        assert count == 0
+
+
+def _insert_stale_cart_rows(app: Flask, count: int) -> None:
+    """Insert `count` cart rows dated 60 days ago plus one fresh row."""
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            """
+            INSERT INTO Shopping_cart (ShopperID, ProductID, Quantity, AddedAt)
+            VALUES ('stale-session', ?, 1, datetime('now', '-60 days'))
+            """,
+            [(product_id,) for product_id in range(100, 100 + count)],
+        )
+        db.execute(
+            "INSERT INTO Shopping_cart (ShopperID, ProductID) VALUES ('fresh-session', 1)"
+        )
+        db.commit()
+
+
+def _cart_rows(app: Flask, shopper_id: str) -> int:
+    """Count the cart rows belonging to `shopper_id`."""
+    with app.app_context():
+        return get_db().execute(
+            "SELECT COUNT(*) FROM Shopping_cart WHERE ShopperID = ?", (shopper_id,)
+        ).fetchone()[0]
+
+
+def test_cleanup_old_cart_entries_in_batches(app: Flask) -> None:
+    """Test that cleanup deletes every stale row across several small batches."""
+    _insert_stale_cart_rows(app, 7)
+    with app.app_context():
+        assert cleanup_old_cart_entries(batch_size=3) == 7
+    assert _cart_rows(app, "stale-session") == 0
+    assert _cart_rows(app, "fresh-session") == 1
+
+
+def test_expire_carts_command(runner: FlaskCliRunner, app: Flask) -> None:
+    """Test the expire-carts CLI command honours the retention option."""
+    _insert_stale_cart_rows(app, 2)
+    result = runner.invoke(args=["expire-carts", "--days", "90"])
+    assert "Expired 0 cart entries." in result.output
+
+    result = runner.invoke(args=["expire-carts", "--batch-size", "1"])
+    assert "Expired 2 cart entries." in result.output
+    assert _cart_rows(app, "fresh-session") == 1
+
+    assert runner.invoke(args=["expire-carts", "--batch-size", "0"]).exit_code != 0
+
+
+def test_expire_carts_with_zero_retention(runner: FlaskCliRunner, app: Flask) -> None:
+    """Test that --days 0 is honoured rather than replaced by the default."""
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            """
+            INSERT INTO Shopping_cart (ShopperID, ProductID, Quantity, AddedAt)
+            VALUES ('recent-session', 1, 1, datetime('now', '-1 hours'))
+            """
+        )
+        db.commit()
+
+    runner.invoke(args=["expire-carts"])
+    assert _cart_rows(app, "recent-session") == 1
+    runner.invoke(args=["expire-carts", "--days", "0"])
+    assert _cart_rows(app, "recent-session") == 0
+
+
+def test_cart_expiry_worker(app: Flask) -> None:
+    """Test that the background worker expires stale carts on its own."""
+    _insert_stale_cart_rows(app, 3)
+    app.config["CART_EXPIRY_INTERVAL"] = 0.01
+    app.config["CART_EXPIRY_BATCH_SIZE"] = 2
+    stop = start_cart_expiry_worker(app)
+    try:
+        deadline = time.monotonic() + 5
+        while _cart_rows(app, "stale-session") and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        stop.set()
+        app.extensions["cart_expiry_worker"][0].join(timeout=5)
+    assert _cart_rows(app, "stale-session") == 0
+    assert _cart_rows(app, "fresh-session") == 1
@@ -0,0 +1,130 @@
+"""Module tests for the in-process product catalog cache."""
+
+from typing import Any
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from flaskr.catalog import CatalogProduct, get_catalog, get_catalog_cache
+from flaskr.db import get_db
+from tests.test_helpers import CHECKOUT_FORM
+
+
+def test_catalog_is_cached_between_requests(client: FlaskClient, app: Flask) -> None:
+    """Test that repeated catalog pages are served from a single snapshot."""
+    client.get("/products")
+    client.get("/products?category=1")
+    with app.app_context():
+        metrics = get_catalog_cache().metrics()
+    assert metrics["misses"] == 1
+    assert metrics["hits"] >= 1
+    assert metrics["products"] == 2
+
+
+def test_catalog_reloads_after_product_change(app: Flask) -> None:
+    """Test that a change to Products invalidates the snapshot once the TTL passes."""
+    app.config["CATALOG_CACHE_TTL"] = 0
+    with app.app_context():
+        db = get_db()
+        first = get_catalog(db)
+        assert first is not None
+        assert get_catalog(db) is first
+
+        db.execute("UPDATE Products SET UnitPrice = 19.99 WHERE ProductID = 1")
+        db.commit()
+
+        second = get_catalog(db)
+        assert second is not None and second is not first
+        assert second.by_id[1]["UnitPrice"] == 19.99
+        assert get_catalog_cache().metrics()["revalidations"] == 1
+
+
+def test_catalog_respects_size_cap(client: FlaskClient, app: Flask) -> None:
+    """Test that catalogs larger than the cap are read from SQL instead."""
+    app.config["CATALOG_CACHE_MAX_PRODUCTS"] = 1
+    with app.app_context():
+        assert get_catalog(get_db()) is None
+        assert get_catalog(get_db()) is None
+        metrics = get_catalog_cache().metrics()
+    assert metrics["misses"] == 1
+    assert metrics["bypasses"] == 1
+
+    html = client.get("/products").get_data(as_text=True)
+    assert "Wireless Mouse" in html and "Keyboard" in html
+
+
+def test_view_cart_uses_catalog(client: FlaskClient, app: Flask) -> None:
+    """Test that the cart page joins cart rows against the cached catalog."""
+    with client.session_transaction() as sess:
+        sess["session_id"] = "test-session-123"
+    client.post("/cart/add/", data={"product_id": "2", "quantity": "3"})
+    client.post("/cart/add/", data={"product_id": "42", "quantity": "1"})
+
+    html = client.get("/cart/").get_data(as_text=True)
+    assert "Keyboard" in html
+    assert "137.97" in html
+    with app.app_context():
+        assert get_catalog_cache().metrics()["products"] == 2
+
+
+def test_view_cart_shows_products_newer_than_snapshot(client: FlaskClient, app: Flask) -> None:
+    """Test that a cart product missing from the snapshot is still listed and totalled."""
+    app.config["CATALOG_CACHE_TTL"] = 60
+    client.post("/cart/add/", data={"product_id": "2", "quantity": "1"})
+    client.get("/cart/")
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            """
+            INSERT INTO Products (ProductID, ProductName, SupplierID, CategoryID,
+                QuantityPerUnit, UnitPrice, UnitsInStock)
+            VALUES (3, 'Webcam', 1, 1, '1 unit', 10, 5)
+            """
+        )
+        db.commit()
+    client.post("/cart/add/", data={"product_id": "3", "quantity": "2"})
+
+    html = client.get("/cart/").get_data(as_text=True)
+    assert "Keyboard" in html and "Webcam" in html
+    assert "65.99" in html
+    with app.app_context():
+        assert get_catalog_cache().metrics()["products"] == 2
+
+
+def test_catalog_product_is_read_only(app: Flask) -> None:
+    """Test that cached rows behave like read-only sqlite3.Row objects."""
+    with app.app_context():
+        catalog = get_catalog(get_db())
+        assert catalog is not None
+        product = catalog.by_id[1]
+    assert isinstance(product, CatalogProduct)
+    assert product["ProductName"] == "Wireless Mouse"
+    with pytest.raises(KeyError):
+        _ = product["PasswordHash"]
+    with pytest.raises(AttributeError):
+        product.UnitPrice = 0
+
+
+def test_orders_do_not_invalidate_catalog(
+    client: FlaskClient, auth_actions: Any, app: Flask
+) -> None:
+    """Test that checkout's stock decrement leaves the catalog version alone."""
+    client.post("/user/register", data={"username": "NEWUS", "password": "newpassword"})
+    auth_actions.login("NEWUS", "newpassword")
+    client.post("/cart/add/", data={"product_id": "1", "quantity": "2"})
+    with app.app_context():
+        db = get_db()
+        version = db.execute("SELECT version FROM Catalog_version").fetchone()[0]
+        stock = db.execute("SELECT UnitsInStock FROM Products WHERE ProductID = 1").fetchone()[0]
+
+    client.post("/checkout/", data=CHECKOUT_FORM)
+    with app.app_context():
+        db = get_db()
+        assert db.execute("SELECT version FROM Catalog_version").fetchone()[0] == version
+        assert db.execute(
+            "SELECT UnitsInStock FROM Products WHERE ProductID = 1"
+        ).fetchone()[0] == stock - 2
+
+    products = client.get("/api/products").get_json()["products"]
+    assert products[0]["UnitsInStock"] == stock - 2
@@ -7,6 +7,7 @@ invalid sessions, database errors, and order storage.
 from typing import Any
 
 from flaskr.db import get_db
+from tests.test_helpers import CHECKOUT_FORM
 
 
 def test_checkout_requires_login(client: Any, auth_actions: Any) -> None:
@@ -290,3 +291,54 @@ def test_checkout_post_user_not_in_db(client: Any, auth_actions: Any, app: Any)
     })
     assert response.status_code == 302
     assert response.headers["Location"] == "/user/login"
+
+
+def test_checkout_writes_order_details_and_stock(client: Any, auth_actions: Any, app: Any) -> None:
+    """Ensure checkout writes line items and decrements stock in the same order."""
+    client.post("/user/register", data={"username": "NEWUS", "password": "newpassword"})
+    auth_actions.login("NEWUS", "newpassword")
+    client.post("/cart/add/", data={"product_id": "1", "quantity": "3"})
+    client.post("/cart/add/", data={"product_id": "2", "quantity": "1"})
+
+    response = client.post("/checkout/", data=CHECKOUT_FORM)
+    assert response.headers["Location"] == "/orders/"
+
+    with app.app_context():
+        db = get_db()
+        order = db.execute("SELECT OrderID FROM Orders WHERE CustomerID = 'NEWUS'").fetchone()
+        lines = db.execute(
+            """
+            SELECT ProductID, UnitPrice, Quantity FROM "Order Details"
+            WHERE OrderID = ? ORDER BY ProductID
+            """,
+            (order["OrderID"],),
+        ).fetchall()
+        assert [tuple(line) for line in lines] == [(1, 25.99, 3), (2, 45.99, 1)]
+        stock = db.execute("SELECT UnitsInStock FROM Products ORDER BY ProductID").fetchall()
+        assert [row[0] for row in stock] == [97, 49]
+
+
+def test_checkout_insufficient_stock_rolls_back(client: Any, auth_actions: Any, app: Any) -> None:
+    """Ensure an order that exceeds stock leaves no order, no lines and the cart intact."""
+    client.post("/user/register", data={"username": "NEWUS", "password": "newpassword"})
+    auth_actions.login("NEWUS", "newpassword")
+    client.post("/cart/add/", data={"product_id": "1", "quantity": "1"})
+    client.post("/cart/add/", data={"product_id": "2", "quantity": "51"})
+
+    response = client.post("/checkout/", data=CHECKOUT_FORM)
+    assert response.headers["Location"] == "/cart/"
+
+    with client.session_transaction() as sess:
+        session_id = sess["session_id"]
+
+    with app.app_context():
+        db = get_db()
+        orders = db.execute("SELECT COUNT(*) FROM Orders WHERE CustomerID = 'NEWUS'")
+        assert orders.fetchone()[0] == 0
+        assert db.execute('SELECT COUNT(*) FROM "Order Details"').fetchone()[0] == 0
+        stock = db.execute("SELECT UnitsInStock FROM Products ORDER BY ProductID").fetchall()
+        assert [row[0] for row in stock] == [100, 50]
+        cart = db.execute(
+            "SELECT COUNT(*) FROM Shopping_cart WHERE ShopperID = ?", (session_id,)
+        ).fetchone()[0]
+        assert cart == 2
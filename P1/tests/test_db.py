@@ -5,7 +5,16 @@ import sqlite3
 import pytest
 from flask import Flask
 
-from flaskr.db import get_db, init_app, initialize_northwind, close_db
+from flaskr.db import (
+    get_db,
+    init_app,
+    initialize_northwind,
+    close_db,
+    close_pool,
+    get_pool,
+    ConnectionPool,
+    PoolTimeout,
+)
 
 from tests.test_helpers import verify_database_content
 
@@ -81,3 +90,77 @@ def test_initialize_northwind(app: Flask) -> None:
         assert emp is not None
         assert emp["LastName"] == "WEB"
         assert emp["FirstName"] == "WEB"
+
+
+def test_pool_reuses_connection_across_contexts(app: Flask) -> None:
+    """Test that a released connection is handed out again on the next checkout."""
+    with app.app_context():
+        first = get_db()
+    with app.app_context():
+        second = get_db()
+        assert second is first
+        assert second.execute("SELECT 1").fetchone()[0] == 1
+
+    metrics = get_pool(app).metrics()
+    assert metrics["checkouts"] >= 2
+    assert metrics["in_use"] == 0
+
+
+def test_pool_applies_pragmas(app: Flask) -> None:
+    """Test that pooled connections are configured for WAL and a busy timeout."""
+    app.config["DB_BUSY_TIMEOUT_MS"] = 1234
+    close_pool(app)
+    with app.app_context():
+        db = get_db()
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert db.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+
+
+def test_pool_rolls_back_uncommitted_work(app: Flask) -> None:
+    """Test that an open transaction is rolled back when the connection is released."""
+    with app.app_context():
+        db = get_db()
+        db.execute("DELETE FROM Products")
+        assert db.in_transaction
+    with app.app_context():
+        count = get_db().execute("SELECT COUNT(*) FROM Products").fetchone()[0]
+        assert count == 2
+
+
+def test_pool_timeout_when_exhausted(app: Flask) -> None:
+    """Test that checkout waits and then raises PoolTimeout when the pool is full."""
+    pool = ConnectionPool(app.config["DATABASE"], size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    metrics = pool.metrics()
+    assert metrics["waits"] == 1
+    assert metrics["timeouts"] == 1
+    assert metrics["wait_time"] > 0
+    conn.close()
+    assert pool.acquire() is conn
+    pool.close()
+
+
+def test_safe_requests_use_read_only_connection(app: Flask) -> None:
+    """Test that GET requests read through a query-only connection."""
+    with app.test_request_context("/products", method="GET"):
+        db = get_db()
+        assert db.execute("PRAGMA query_only").fetchone()[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            db.execute("DELETE FROM Products")
+        writer = get_db(write=True)
+        assert writer is not db
+        assert writer.execute("PRAGMA query_only").fetchone()[0] == 0
+        assert get_db(write=True) is writer
+        assert get_db() is db
+
+
+def test_unsafe_requests_use_writer_connection(app: Flask) -> None:
+    """Test that POST requests share the single writer connection."""
+    with app.test_request_context("/cart/add/", method="POST"):
+        db = get_db()
+        assert db.execute("PRAGMA query_only").fetchone()[0] == 0
+        assert get_db(write=True) is db
+    assert get_pool(app).size == 1
@@ -1,9 +1,19 @@
 """Helper functions for test modules.
 
 This module contains helper functions to verify that the test database contains
-the expected data for Customers and Products.
+the expected data for Customers and Products, and form data shared by the
+checkout tests.
 """
 
+CHECKOUT_FORM = {
+    "ship_name": "John Doe",
+    "ship_address": "123 Main St",
+    "ship_city": "Anytown",
+    "ship_country": "USA",
+    "place_order": "true",
+}
+
+
 def verify_database_content(db):
     """
     Verify that the test database has the expected data:
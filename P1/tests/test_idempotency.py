@@ -0,0 +1,143 @@
+"""Module tests for idempotency keys on cart and checkout writes."""
+
+from typing import Any
+
+from flask import Flask
+from flask.testing import FlaskClient, FlaskCliRunner
+
+from flaskr.db import get_db
+from tests.test_helpers import CHECKOUT_FORM
+
+
+def _quantity(app: Flask, shopper_id: str, product_id: int) -> Any:
+    """Return the cart quantity of one product, or None if it is not in the cart."""
+    with app.app_context():
+        row = get_db().execute(
+            "SELECT Quantity FROM Shopping_cart WHERE ShopperID = ? AND ProductID = ?",
+            (shopper_id, product_id),
+        ).fetchone()
+        return row["Quantity"] if row else None
+
+
+def test_add_to_cart_retry_is_replayed(client: FlaskClient, app: Flask) -> None:
+    """Test that a retried add with the same key is not applied twice."""
+    with client.session_transaction() as sess:
+        sess["session_id"] = "retry-cart"
+    headers = {"Idempotency-Key": "add-1"}
+
+    first = client.post("/cart/add/", data={"product_id": "1", "quantity": "2"}, headers=headers)
+    retry = client.post("/cart/add/", data={"product_id": "1", "quantity": "2"}, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json == first.json
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert _quantity(app, "retry-cart", 1) == 2
+
+    client.post(
+        "/cart/add/",
+        data={"product_id": "1", "quantity": "2", "idempotency_key": "add-2"},
+    )
+    assert _quantity(app, "retry-cart", 1) == 4
+
+
+def test_idempotency_key_conflicts(client: FlaskClient, app: Flask) -> None:
+    """Test reuse with another payload, an in-flight claim and an oversized key."""
+    with client.session_transaction() as sess:
+        sess["session_id"] = "retry-cart"
+    headers = {"Idempotency-Key": "add-1"}
+    client.post("/cart/add/", data={"product_id": "1"}, headers=headers)
+
+    response = client.post("/cart/add/", data={"product_id": "2"}, headers=headers)
+    assert response.status_code == 422
+
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            """
+            INSERT INTO Idempotency_keys (ShopperID, Endpoint, IdempotencyKey, RequestHash)
+            VALUES ('retry-cart', 'cart.add_to_cart', 'in-flight', x'00')
+            """
+        )
+        db.commit()
+    response = client.post(
+        "/cart/add/", data={"product_id": "1"}, headers={"Idempotency-Key": "in-flight"}
+    )
+    assert response.status_code == 409
+
+    response = client.post(
+        "/cart/add/", data={"product_id": "1"}, headers={"Idempotency-Key": "k" * 256}
+    )
+    assert response.status_code == 400
+    assert _quantity(app, "retry-cart", 1) == 1
+
+
+def test_checkout_retry_places_one_order(client: Any, auth_actions: Any, app: Flask) -> None:
+    """Test that a retried checkout replays the redirect instead of ordering again."""
+    client.post("/user/register", data={"username": "NEWUS", "password": "newpassword"})
+    auth_actions.login("NEWUS", "newpassword")
+    client.post("/cart/add/", data={"product_id": "1", "quantity": "1"})
+
+    headers = {"Idempotency-Key": "order-1"}
+    first = client.post("/checkout/", data=CHECKOUT_FORM, headers=headers)
+    client.post("/cart/add/", data={"product_id": "1", "quantity": "1"})
+    retry = client.post("/checkout/", data=CHECKOUT_FORM, headers=headers)
+
+    assert first.headers["Location"] == retry.headers["Location"] == "/orders/"
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    with app.app_context():
+        orders = get_db().execute(
+            "SELECT COUNT(*) FROM Orders WHERE CustomerID = 'NEWUS'"
+        ).fetchone()[0]
+    assert orders == 1
+
+
+def test_expired_keys_are_reclaimed_and_purged(
+    client: FlaskClient, app: Flask, runner: FlaskCliRunner
+) -> None:
+    """Test that keys past their TTL run the view again and are purged by the CLI."""
+    with client.session_transaction() as sess:
+        sess["session_id"] = "retry-cart"
+    headers = {"Idempotency-Key": "add-1"}
+    client.post("/cart/add/", data={"product_id": "1"}, headers=headers)
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE Idempotency_keys SET CreatedAt = datetime('now', '-2 days')")
+        db.commit()
+    response = client.post("/cart/add/", data={"product_id": "1"}, headers=headers)
+    assert "Idempotent-Replayed" not in response.headers
+    assert _quantity(app, "retry-cart", 1) == 2
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE Idempotency_keys SET CreatedAt = datetime('now', '-2 days')")
+        db.commit()
+    result = runner.invoke(args=["expire-idempotency-keys"])
+    assert "Expired 1 idempotency keys." in result.output
+
+
+def test_abandoned_claim_is_taken_over(client: FlaskClient, app: Flask) -> None:
+    """Test that a claim without a response blocks retries only until its lease ends."""
+    with client.session_transaction() as sess:
+        sess["session_id"] = "stuck-cart"
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            """
+            INSERT INTO Idempotency_keys (ShopperID, Endpoint, IdempotencyKey, RequestHash)
+            VALUES ('stuck-cart', 'cart.add_to_cart', 'add-1', x'00')
+            """
+        )
+        db.commit()
+    headers = {"Idempotency-Key": "add-1"}
+    response = client.post("/cart/add/", data={"product_id": "1"}, headers=headers)
+    assert response.status_code == 409
+    assert _quantity(app, "stuck-cart", 1) is None
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE Idempotency_keys SET CreatedAt = datetime('now', '-2 minutes')")
+        db.commit()
+    response = client.post("/cart/add/", data={"product_id": "1"}, headers=headers)
+    assert response.status_code == 200
+    assert _quantity(app, "stuck-cart", 1) == 1
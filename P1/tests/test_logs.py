@@ -0,0 +1,75 @@
+"""Module tests for the queued JSON logging pipeline."""
+
+import io
+import json
+import logging
+import queue
+
+from flask import Flask
+
+from flaskr.logs import JsonFormatter, LogPipeline, NonBlockingQueueHandler, init_logging
+
+
+def test_json_formatter_includes_extra_fields() -> None:
+    """Test that records become one JSON object with their `extra` fields."""
+    record = logging.LogRecord(
+        "flaskr.test", logging.WARNING, __file__, 1, "Order %s failed", (7,), None
+    )
+    record.order_id = 7
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "WARNING"
+    assert entry["logger"] == "flaskr.test"
+    assert entry["message"] == "Order 7 failed"
+    assert entry["order_id"] == 7
+    assert "args" not in entry
+
+
+def test_pipeline_writes_from_background_thread(app: Flask) -> None:
+    """Test that records are written as JSON by the listener, with the endpoint."""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    pipeline = LogPipeline(handler)
+    logger = logging.getLogger("flaskr.test_logs")
+    logger.addHandler(pipeline.handler)
+    try:
+        with app.test_request_context("/hello"):
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("Failed %s", "badly", extra={"cart_id": "c1"})
+    finally:
+        logger.removeHandler(pipeline.handler)
+        pipeline.stop()
+
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "Failed badly"
+    assert entry["cart_id"] == "c1"
+    assert entry["endpoint"] == "hello"
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_full_queue_drops_instead_of_blocking() -> None:
+    """Test that a full queue drops records and counts them."""
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    logger = logging.getLogger("flaskr.test_logs.full")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.warning("first")
+        logger.warning("second")
+    finally:
+        logger.removeHandler(handler)
+        logger.propagate = True
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().getMessage() == "first"
+
+
+def test_init_logging_installs_one_handler_per_process(app: Flask) -> None:
+    """Test that the pipeline is shared by every app in the process."""
+    pipeline = init_logging(app)
+    assert pipeline is not None
+    assert init_logging(app) is pipeline
+    handlers = logging.getLogger("flaskr").handlers
+    assert handlers.count(pipeline.handler) == 1
+    assert app.logger.handlers == handlers
@@ -0,0 +1,103 @@
+"""Module tests for request metrics and the Prometheus `/metrics` endpoint."""
+
+# pylint: disable=redefined-outer-name
+
+from typing import Generator
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from flaskr import create_app
+from flaskr.db import close_pool
+from flaskr.metrics import RequestMetrics
+
+
+@pytest.fixture
+def app(app: Flask) -> Generator[Flask, None, None]:
+    """Serve the test database from an app with metrics enabled."""
+    metrics_app = create_app(
+        {"TESTING": True, "DATABASE": app.config["DATABASE"], "METRICS_ENABLED": True}
+    )
+    yield metrics_app
+    close_pool(metrics_app)
+
+
+def test_metrics_endpoint_reports_requests(client: FlaskClient) -> None:
+    """Test latency histograms, status counts and cache counters in the output."""
+    client.get("/products")
+    client.get("/no-such-page")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    assert "Set-Cookie" not in response.headers
+    body = response.get_data(as_text=True)
+
+    assert (
+        'flaskr_http_responses_total{endpoint="products.list_products",'
+        'method="GET",status="200"} 1'
+    ) in body
+    assert 'flaskr_http_responses_total{endpoint="<unmatched>",method="GET",status="404"} 1' in body
+    assert (
+        'flaskr_http_request_duration_seconds_count{endpoint="products.list_products",'
+        'method="GET"} 1'
+    ) in body
+    assert "flaskr_http_requests_in_flight 1" in body  # the scrape itself
+    assert 'flaskr_cache_misses_total{cache="catalog"} 1' in body
+    assert 'flaskr_db_pool_checkouts_total{pool="read"}' in body
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    """Test that exported buckets accumulate and end with +Inf."""
+    metrics = RequestMetrics()
+    for seconds in (0.001, 0.02, 20.0):
+        metrics.started()
+        metrics.finished("view", "GET", 200, seconds, None)
+    lines = metrics.render()
+
+    buckets = [
+        line for line in lines if line.startswith("flaskr_http_request_duration_seconds_bucket")
+    ]
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts)
+    assert counts[0] == 1
+    assert buckets[-1].endswith('le="+Inf"} 3')
+    assert "flaskr_http_requests_in_flight 0" in lines
+    assert not any(line.startswith("flaskr_db_request_duration_seconds_") for line in lines)
+
+
+def test_failed_requests_count_as_500(app: Flask) -> None:
+    """Test that a view that raises is recorded as a 500 and leaves no request in flight."""
+
+    @app.route("/boom")
+    def boom() -> str:
+        raise RuntimeError("boom")
+
+    app.config["TESTING"] = False
+    client = app.test_client()
+    assert client.get("/boom").status_code == 500
+
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'flaskr_http_responses_total{endpoint="boom",method="GET",status="500"} 1' in body
+    assert "flaskr_http_requests_in_flight 1" in body
+
+
+def test_metrics_are_off_by_default(app: Flask) -> None:
+    """Test that without METRICS_ENABLED neither hooks nor the route are registered."""
+    disabled = create_app({"TESTING": True, "DATABASE": app.config["DATABASE"]})
+    try:
+        assert disabled.test_client().get("/metrics").status_code == 404
+    finally:
+        close_pool(disabled)
+
+
+def test_metrics_token_is_required_when_set(app: Flask) -> None:
+    """Test that METRICS_TOKEN gates /metrics behind a bearer token."""
+    app.config["METRICS_TOKEN"] = "secret"
+    client = app.test_client()
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "flaskr_http_requests_in_flight" in response.get_data(as_text=True)
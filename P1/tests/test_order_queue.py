@@ -0,0 +1,153 @@
+"""Module tests for the group-commit order queue."""
+
+import threading
+from typing import Any, Dict, List
+
+import pytest
+from flask import Flask
+
+from flaskr.checkout import InsufficientStockError, write_order
+from flaskr.db import close_pool, get_db
+from flaskr.order_queue import OrderIntent, OrderQueue, get_order_queue
+
+SHIPPING = (1, "John Doe", "123 Main St", "Anytown", "", "", "USA")
+
+
+def _fill_cart(app: Flask, cart_id: str, product_id: int, quantity: int) -> None:
+    """Put one product into a shopper's cart."""
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO Shopping_cart (ShopperID, ProductID, Quantity) VALUES (?, ?, ?)",
+            (cart_id, product_id, quantity),
+        )
+        db.commit()
+
+
+def test_place_batch_isolates_failing_orders(app: Flask) -> None:
+    """Test that one failing intent does not undo the others in its batch."""
+    _fill_cart(app, "cart-a", 1, 2)
+    _fill_cart(app, "cart-b", 2, 999)
+    _fill_cart(app, "cart-c", 2, 1)
+
+    order_queue = OrderQueue(app, write_order)
+    batch = [
+        OrderIntent("CUST1", "cart-a", SHIPPING),
+        OrderIntent("CUST1", "cart-b", SHIPPING),
+        OrderIntent("CUST2", "cart-c", SHIPPING),
+    ]
+    order_queue.place_batch(batch)
+
+    assert all(intent.done.is_set() for intent in batch)
+    assert isinstance(batch[1].error, InsufficientStockError)
+    assert batch[0].error is None and batch[2].error is None
+    assert batch[0].order_id != batch[2].order_id
+    assert order_queue.metrics()["batches"] == 1
+
+    with app.app_context():
+        db = get_db()
+        carts = db.execute(
+            "SELECT ShopperID FROM Shopping_cart WHERE ShopperID LIKE 'cart-%'"
+        ).fetchall()
+        assert [row[0] for row in carts] == ["cart-b"]
+        stock = db.execute("SELECT UnitsInStock FROM Products ORDER BY ProductID").fetchall()
+        assert [row[0] for row in stock] == [98, 49]
+
+
+def test_concurrent_submits_share_a_commit(app: Flask) -> None:
+    """Test that orders arriving together are committed in one batch."""
+    app.config.update(ORDER_QUEUE_MAX_WAIT=0.5, ORDER_QUEUE_MAX_BATCH=4)
+    for i in range(4):
+        _fill_cart(app, f"burst-{i}", 1, 1)
+
+    order_queue = get_order_queue(app, write_order)
+    results: Dict[int, Any] = {}
+
+    def submit(i: int) -> None:
+        results[i] = order_queue.submit("CUST1", f"burst-{i}", SHIPPING)
+
+    threads: List[threading.Thread] = [
+        threading.Thread(target=submit, args=(i,)) for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(set(results.values())) == 4
+    metrics = order_queue.metrics()
+    assert metrics["orders"] == 4
+    assert metrics["batches"] < 4
+
+
+def test_timeout_only_withdraws_pending_orders(app: Flask) -> None:
+    """Test that a timed-out caller waits for a taken order and withdraws a pending one."""
+    _fill_cart(app, "slow-a", 1, 1)
+    _fill_cart(app, "slow-b", 1, 1)
+    taken = threading.Event()
+    release = threading.Event()
+
+    def slow_write_order(db: Any, user_id: str, cart_id: Any, shipping: Any) -> int:
+        taken.set()
+        release.wait(5)
+        return write_order(db, user_id, cart_id, shipping)
+
+    order_queue = OrderQueue(app, slow_write_order, max_batch=1, max_wait=0, timeout=0.1)
+    results: Dict[str, Any] = {}
+
+    def submit_first() -> None:
+        results["a"] = order_queue.submit("CUST1", "slow-a", SHIPPING)
+
+    first = threading.Thread(target=submit_first)
+    first.start()
+    assert taken.wait(5)
+
+    with pytest.raises(TimeoutError):
+        order_queue.submit("CUST1", "slow-b", SHIPPING)
+    release.set()
+    first.join(timeout=10)
+
+    assert isinstance(results["a"], int)
+    assert order_queue.metrics()["orders"] == 1
+    with app.app_context():
+        carts = get_db().execute(
+            "SELECT ShopperID FROM Shopping_cart WHERE ShopperID LIKE 'slow-%'"
+        ).fetchall()
+    assert [row[0] for row in carts] == ["slow-b"]
+
+
+@pytest.mark.parametrize("split_reads", [True, False])
+def test_checkout_through_order_queue(
+    client: Any, auth_actions: Any, app: Flask, split_reads: bool
+) -> None:
+    """Test that checkout places orders through the queue when it is enabled.
+
+    With `DB_SPLIT_READS` off the request's reads lease the single writer,
+    which must be released before the queue thread needs it.
+    """
+    close_pool(app)
+    app.config.update(
+        ORDER_QUEUE_ENABLED=True, DB_SPLIT_READS=split_reads, DB_POOL_TIMEOUT=1
+    )
+    client.post("/user/register", data={"username": "NEWUS", "password": "newpassword"})
+    auth_actions.login("NEWUS", "newpassword")
+    client.post("/cart/add/", data={"product_id": "1", "quantity": "1"})
+
+    response = client.post(
+        "/checkout/",
+        data={
+            "ship_name": "Queued",
+            "ship_address": "1 Queue St",
+            "ship_city": "Batchville",
+            "ship_country": "USA",
+            "place_order": "true",
+        },
+    )
+    assert response.headers["Location"] == "/orders/"
+
+    with app.app_context():
+        order = get_db().execute(
+            "SELECT ShipName FROM Orders WHERE CustomerID = 'NEWUS'"
+        ).fetchone()
+        assert order["ShipName"] == "Queued"
+    assert get_order_queue(app, write_order).metrics()["orders"] == 1
@@ -1,11 +1,14 @@
 """Tests for orders functionality."""
 
-from typing import Callable
+from typing import Callable, List
 
+import pytest
 from flask import Flask
-from flask.testing import FlaskClient
+from flask.testing import FlaskClient, FlaskCliRunner
 
 from flaskr.db import get_db
+from flaskr.orders import fetch_order_page, fetch_order_summary
+from flaskr.products import decode_cursor
 
 
 def test_view_orders_requires_login(client: FlaskClient) -> None:
@@ -162,3 +165,124 @@ def test_cart_cleared_after_order(client: FlaskClient, app: Flask) -> None:
             "SELECT * FROM Shopping_cart WHERE ShopperID = ?", ("test-session-123",)
         ).fetchall()
         assert len(cart_items) == 0
+
+
+def _insert_orders(app: Flask, dates: List[str]) -> None:
+    """Insert one order per date for NEWUS, each with a single line item."""
+    with app.app_context():
+        db = get_db()
+        for i, date in enumerate(dates):
+            order_id = db.execute(
+                """
+                INSERT INTO Orders (
+                    CustomerID, EmployeeID, OrderDate, ShipVia,
+                    ShipName, ShipAddress, ShipCity, ShipCountry
+                ) VALUES ('NEWUS', 999999, ?, 1, ?, 'Addr', 'City', 'Country')
+                """,
+                (date, f"Order {i}"),
+            ).lastrowid
+            db.execute(
+                """
+                INSERT INTO "Order Details" (OrderID, ProductID, UnitPrice, Quantity, Discount)
+                VALUES (?, 1, 10, ?, 0)
+                """,
+                (order_id, i + 1),
+            )
+        db.commit()
+
+
+def test_fetch_order_page_keyset_and_items(app: Flask) -> None:
+    """Test keyset pages on (OrderDate, OrderID) with aggregated line items."""
+    _insert_orders(app, ["2024-03-01", "2024-03-02", "2024-03-02", "2024-03-03"])
+
+    with app.app_context():
+        db = get_db()
+        seen: List[str] = []
+        after = None
+        while True:
+            orders, cursor = fetch_order_page(db, "NEWUS", after, limit=3)
+            seen += [order["ShipName"] for order in orders]
+            if cursor is None:
+                break
+            after = decode_cursor(cursor)
+
+        assert seen == ["Order 3", "Order 2", "Order 1", "Order 0"]
+        orders, _ = fetch_order_page(db, "NEWUS", limit=1)
+        assert orders[0]["OrderTotal"] == 40
+        assert orders[0]["Items"] == [
+            {
+                "ProductID": 1,
+                "ProductName": "Wireless Mouse",
+                "UnitPrice": 10,
+                "Quantity": 4,
+                "Discount": 0,
+            }
+        ]
+
+        orders, _ = fetch_order_page(db, "NEWUS", limit=1, with_items=False)
+        assert "Items" not in orders[0]
+
+        plan = " ".join(
+            row[3]
+            for row in db.execute(
+                "EXPLAIN QUERY PLAN SELECT OrderID FROM Orders WHERE CustomerID = ? "
+                "ORDER BY OrderDate DESC, OrderID DESC",
+                ("NEWUS",),
+            ).fetchall()
+        )
+        assert "idx_orders_customer_date" in plan
+
+
+def test_view_orders_paginates(client: FlaskClient, app: Flask) -> None:
+    """Test that the orders page shows one page with totals and a next link."""
+    client.post("/user/register", data={"username": "NEWUS", "password": "testpass"})
+    with client.session_transaction() as sess:
+        sess["user_id"] = "NEWUS"
+    app.config["ORDERS_PAGE_SIZE"] = 1
+    _insert_orders(app, ["2024-03-01", "2024-03-02"])
+
+    html = client.get("/orders/").get_data(as_text=True)
+    assert "Order 1" in html and "Order 0" not in html
+    assert "Total:</strong> $20.00" in html
+    assert "Next page" in html
+
+    with app.app_context():
+        cursor = fetch_order_page(get_db(), "NEWUS", limit=1)[1]
+    html = client.get(f"/orders/?after={cursor}").get_data(as_text=True)
+    assert "Order 0" in html and "Next page" not in html
+
+
+def test_checkout_maintains_order_stats(
+    client: FlaskClient, app: Flask, runner: FlaskCliRunner
+) -> None:
+    """Test that checkout updates the rollup and the rebuild command backfills it."""
+    client.post("/user/register", data={"username": "NEWUS", "password": "testpass"})
+    with client.session_transaction() as sess:
+        sess["user_id"] = "NEWUS"
+    checkout_data = {
+        "ship_name": "John Doe",
+        "ship_address": "123 Test St",
+        "ship_city": "Test City",
+        "ship_country": "Test Country",
+        "place_order": "true",
+    }
+    for quantity in ("2", "1"):
+        client.post("/cart/add/", data={"product_id": "1", "quantity": quantity})
+        client.post("/checkout/", data=checkout_data)
+
+    with app.app_context():
+        db = get_db()
+        summary = fetch_order_summary(db, "NEWUS")
+        assert summary["OrderCount"] == 2
+        assert summary["LifetimeSpend"] == pytest.approx(3 * 25.99)
+        assert fetch_order_summary(db, "NOONE")["OrderCount"] == 0
+
+        db.execute("DELETE FROM CustomerOrderStats")
+        db.commit()
+
+    result = runner.invoke(args=["rebuild-order-stats"])
+    assert "Rebuilt order stats for 3 customers." in result.output
+
+    html = client.get("/orders/").get_data(as_text=True)
+    assert "Orders:</strong> 2" in html
+    assert f"${3 * 25.99:.2f}" in html
@@ -1,7 +1,16 @@
 """Module tests for product functionality."""
 
+import os
+import sqlite3
+import tempfile
+
+import pytest
 from flask import Flask
-from flask.testing import FlaskClient
+from flask.testing import FlaskClient, FlaskCliRunner
+
+from flaskr import create_app
+from flaskr.db import close_pool, get_db
+from flaskr.products import fts_match_expression, encode_cursor
 
 
 def test_list_products(client: FlaskClient) -> None:
@@ -92,3 +101,164 @@ def test_product_details_display(client: FlaskClient) -> None:
     assert "Category" in html
     assert "Quantity(Unit)" in html
     assert "Add to Cart" in html
+
+
+def test_search_prefix_matching(client: FlaskClient) -> None:
+    """Test that partial words match through the full-text index."""
+    response = client.get("/products?search=wire mou")
+    html = response.get_data(as_text=True)
+    assert "Wireless Mouse" in html
+    assert "Keyboard" not in html
+
+
+def test_search_index_tracks_product_changes(client: FlaskClient, app: Flask) -> None:
+    """Test that inserts and renames are reflected in search results."""
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            """
+            INSERT INTO Products (ProductName, SupplierID, CategoryID, QuantityPerUnit)
+            VALUES ('Gaming Headset', 1, 2, '1 unit')
+            """
+        )
+        db.execute(
+            "UPDATE Products SET ProductName = 'Mechanical Keyboard' WHERE ProductName = 'Keyboard'"
+        )
+        db.commit()
+
+    assert "Gaming Headset" in client.get("/products?search=headset").get_data(as_text=True)
+    html = client.get("/products?search=mechanical").get_data(as_text=True)
+    assert "Mechanical Keyboard" in html
+
+
+def test_search_falls_back_to_like(client: FlaskClient, app: Flask) -> None:
+    """Test that search still works when the FTS5 index is missing."""
+    with app.app_context():
+        db = get_db()
+        db.executescript(
+            """
+            DROP TRIGGER Products_fts_ai;
+            DROP TRIGGER Products_fts_ad;
+            DROP TRIGGER Products_fts_au;
+            DROP TABLE Products_fts;
+            """
+        )
+
+    html = client.get("/products?search=ireless").get_data(as_text=True)
+    assert "Wireless Mouse" in html
+
+
+def test_rebuild_search_index_command(runner: FlaskCliRunner, app: Flask) -> None:
+    """Test that the CLI command rebuilds the index from the Products table."""
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO Products_fts (Products_fts) VALUES ('delete-all')")
+        db.commit()
+
+    result = runner.invoke(args=["rebuild-search-index"])
+    assert "Rebuilt the product search index." in result.output
+
+    with app.app_context():
+        count = get_db().execute(
+            "SELECT COUNT(*) FROM Products_fts WHERE Products_fts MATCH 'keyboard'"
+        ).fetchone()[0]
+        assert count == 1
+
+
+def test_fts_match_expression() -> None:
+    """Test that user input is turned into quoted prefix terms."""
+    assert fts_match_expression('wire "mou') == '"wire"* "mou"*'
+    assert fts_match_expression("%%") is None
+
+
+def test_api_products_keyset_pagination(client: FlaskClient) -> None:
+    """Test that /api/products pages through the catalog with cursor tokens."""
+    first = client.get("/api/products?limit=1").get_json()
+    assert [p["ProductName"] for p in first["products"]] == ["Wireless Mouse"]
+    assert first["next_cursor"]
+
+    second = client.get(f"/api/products?limit=1&cursor={first['next_cursor']}").get_json()
+    assert [p["ProductName"] for p in second["products"]] == ["Keyboard"]
+    assert second["next_cursor"] is None
+
+
+def test_api_products_search_pagination(client: FlaskClient, app: Flask) -> None:
+    """Test that relevance-ordered search results page without repeats."""
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            """
+            INSERT INTO Products (ProductName, SupplierID, CategoryID, QuantityPerUnit)
+            VALUES (?, 1, 1, '1 unit')
+            """,
+            [(f"Wireless Charger {i}",) for i in range(5)],
+        )
+        db.commit()
+
+    seen, cursor = [], ""
+    while True:
+        page = client.get(f"/api/products?search=wireless&limit=2&cursor={cursor}").get_json()
+        seen.extend(p["ProductID"] for p in page["products"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 6
+
+
+def test_api_products_invalid_cursor(client: FlaskClient) -> None:
+    """Test that a malformed cursor is rejected."""
+    response = client.get("/api/products?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "error"
+
+
+def test_list_products_next_page_link(client: FlaskClient) -> None:
+    """Test that the HTML listing links to the next page and follows it."""
+    html = client.get("/products?limit=1").get_data(as_text=True)
+    assert "Next page" in html
+    assert "Keyboard" not in html
+
+    cursor = encode_cursor({"id": 1})
+    html = client.get(f"/products?limit=1&after={cursor}").get_data(as_text=True)
+    assert "Keyboard" in html
+    assert "Wireless Mouse" not in html
+    assert "Next page" not in html
+
+
+@pytest.mark.parametrize("catalog_cache", [True, False])
+def test_products_on_minimal_schema(catalog_cache: bool) -> None:
+    """Test listing products on the minimal Products table initialize_northwind creates."""
+    db_fd, db_path = tempfile.mkstemp()
+    db = sqlite3.connect(db_path)
+    db.execute("CREATE TABLE Employees (EmployeeID INTEGER PRIMARY KEY, LastName, FirstName)")
+    db.close()
+    app = create_app(
+        {"TESTING": True, "DATABASE": db_path, "CATALOG_CACHE_ENABLED": catalog_cache}
+    )
+    try:
+        with app.app_context():
+            db = get_db()
+            db.execute(
+                "INSERT INTO Products (ProductName, UnitPrice, UnitsInStock) "
+                "VALUES ('Wireless Mouse', 25.99, 7)"
+            )
+            db.commit()
+
+        client = app.test_client()
+        assert "Wireless Mouse" in client.get("/products").get_data(as_text=True)
+        products = client.get("/api/products?category=1").get_json()["products"]
+        assert products == [
+            {
+                "ProductID": 1,
+                "ProductName": "Wireless Mouse",
+                "CategoryID": None,
+                "QuantityPerUnit": None,
+                "UnitPrice": 25.99,
+                "UnitsInStock": 7,
+                "ReorderLevel": None,
+            }
+        ]
+    finally:
+        close_pool(app)
+        os.close(db_fd)
+        os.unlink(db_path)
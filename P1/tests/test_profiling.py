@@ -0,0 +1,78 @@
+"""Module tests for the sampling request profiler."""
+
+# pylint: disable=redefined-outer-name
+
+import os
+import time
+from typing import Generator
+
+import pytest
+from flask import Flask
+
+from flaskr import create_app
+from flaskr.db import close_pool
+from flaskr.profiling import PROFILE_HEADER, StackSampler, collapse_stack
+
+
+@pytest.fixture
+def profiled_app(app: Flask, tmp_path: str) -> Generator[Flask, None, None]:
+    """An app that profiles requests carrying the profile token."""
+    profiled = create_app(
+        {
+            "TESTING": True,
+            "DATABASE": app.config["DATABASE"],
+            "PROFILE_TOKEN": "secret",
+            "PROFILE_DIR": str(tmp_path),
+            "PROFILE_INTERVAL": 0.001,
+        }
+    )
+
+    @profiled.route("/slow")
+    def slow() -> str:
+        deadline = time.monotonic() + 0.05
+        while time.monotonic() < deadline:
+            pass
+        return "done"
+
+    yield profiled
+    close_pool(profiled)
+
+
+def test_profiling_is_off_by_default(app: Flask) -> None:
+    """Test that no hooks run and no sampler exists unless profiling is configured."""
+    app.test_client().get("/hello", headers={PROFILE_HEADER: "anything"})
+    assert "stack_sampler" not in app.extensions
+
+
+def test_token_header_profiles_request(profiled_app: Flask, tmp_path: str) -> None:
+    """Test that a request with the token is sampled and written as collapsed stacks."""
+    client = profiled_app.test_client()
+    client.get("/slow", headers={PROFILE_HEADER: "wrong"})
+    assert "stack_sampler" not in profiled_app.extensions
+
+    assert client.get("/slow", headers={PROFILE_HEADER: "secret"}).status_code == 200
+    sampler: StackSampler = profiled_app.extensions["stack_sampler"]
+    assert sampler.profiled == 1
+    sampler.flush()
+
+    with open(os.path.join(tmp_path, "slow.folded"), encoding="utf8") as f:
+        lines = f.read().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert stack.startswith("slow;")
+    assert int(count) >= 1
+    assert any("slow (test_profiling.py:" in line for line in lines)
+
+
+def test_collapse_stack_is_outermost_first() -> None:
+    """Test that the current function is the last frame of its collapsed stack."""
+
+    def inner() -> list:
+        import sys  # pylint: disable=import-outside-toplevel
+
+        return collapse_stack(sys._getframe())  # pylint: disable=protected-access
+
+    names = inner()
+    assert names[-1].startswith("inner (test_profiling.py:")
+    assert names[-2].startswith("test_collapse_stack_is_outermost_first")
+    assert all(";" not in name for name in names)
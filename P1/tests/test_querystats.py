@@ -0,0 +1,75 @@
+"""Module tests for SQL timing instrumentation and the slow-query log."""
+
+# pylint: disable=redefined-outer-name
+
+import logging
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from flaskr.db import close_pool, get_db
+from flaskr.querystats import get_query_stats, normalize_sql, request_query_totals
+
+
+@pytest.fixture
+def instrumented_app(app: Flask) -> Flask:
+    """Turn on instrumentation and rebuild the pools so new connections use it."""
+    app.config.update(DB_INSTRUMENT=True, CATALOG_CACHE_ENABLED=False)
+    close_pool(app)
+    return app
+
+
+def test_instrumentation_is_off_by_default(client: FlaskClient, app: Flask) -> None:
+    """Test that no statistics or Server-Timing header are produced by default."""
+    response = client.get("/products")
+    assert "Server-Timing" not in response.headers
+    assert get_query_stats(app) is None
+
+
+def test_statements_are_timed_per_endpoint(instrumented_app: Flask) -> None:
+    """Test per-statement counters, histograms and the per-request header."""
+    client = instrumented_app.test_client()
+    response = client.get("/products")
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+    stats = get_query_stats(instrumented_app)
+    assert stats is not None
+    statements = stats.metrics()["statements"]
+    listing = next(
+        entry for sql, entry in statements.items() if sql.startswith("SELECT p.ProductID")
+    )
+    assert listing["calls"] == 1
+    assert listing["rows"] == 2
+    assert listing["endpoints"] == {"products.list_products": 1}
+    assert sum(listing["histogram"]) == 1
+
+    with instrumented_app.test_request_context("/"):
+        get_db().execute("SELECT 1").fetchone()
+        get_db().execute("SELECT 2").fetchall()
+        assert request_query_totals()["count"] == 2
+
+
+def test_slow_queries_are_logged_with_plan(
+    instrumented_app: Flask, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test that statements over the threshold are logged with EXPLAIN QUERY PLAN."""
+    instrumented_app.config["DB_SLOW_QUERY_MS"] = 0
+    instrumented_app.extensions.pop("query_stats", None)
+    close_pool(instrumented_app)
+
+    with caplog.at_level(logging.WARNING, logger="flaskr.querystats"):
+        with instrumented_app.app_context():
+            get_db().execute(
+                "SELECT * FROM Products WHERE ProductID = ?", (1,)
+            ).fetchone()
+
+    message = next(r.getMessage() for r in caplog.records if "ProductID = ?" in r.getMessage())
+    assert message.startswith("Slow query")
+    assert "SEARCH Products USING INTEGER PRIMARY KEY" in message
+    assert get_query_stats(instrumented_app).metrics()["slow"] >= 1
+
+
+def test_normalize_sql() -> None:
+    """Test that formatting differences collapse to one statement key."""
+    assert normalize_sql("SELECT  *\n   FROM t") == normalize_sql("SELECT * FROM t")
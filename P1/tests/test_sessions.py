@@ -0,0 +1,114 @@
+"""Module tests for the server-side session store."""
+
+from typing import Any, List
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient, FlaskCliRunner
+
+from flaskr import sessions
+from flaskr.db import close_pool, get_db
+from flaskr.sessions import SessionlessAwareInterface, make_session_interface
+
+
+def _stored_sessions(app: Flask) -> List[Any]:
+    """Return every row of the `Sessions` table."""
+    with app.app_context():
+        return get_db().execute("SELECT SessionKey, ExpiresAt FROM Sessions").fetchall()
+
+
+def test_cookie_carries_only_an_opaque_key(client: FlaskClient, app: Flask) -> None:
+    """Test that session data is stored server-side and the cookie is written once."""
+    response = client.get("/products")
+    cookie = response.headers["Set-Cookie"]
+    rows = _stored_sessions(app)
+    assert len(rows) == 1
+    assert cookie.startswith(f"session={rows[0]['SessionKey']};")
+
+    with client.session_transaction() as sess:
+        session_id = sess["session_id"]
+
+    response = client.get("/products")
+    assert "Set-Cookie" not in response.headers
+
+    client.post("/user/register", data={"username": "NEWUS", "password": "newpassword"})
+    client.post("/user/login", data={"username": "NEWUS", "password": "newpassword"})
+    with client.session_transaction() as sess:
+        assert sess["user_id"] == "NEWUS"
+        assert sess["session_id"] == session_id
+    assert len(_stored_sessions(app)) == 1
+
+
+def test_login_and_logout_rotate_the_session_key(client: FlaskClient, app: Flask) -> None:
+    """Test that the cookie key changes on login and logout and old keys stop working."""
+    client.post("/user/register", data={"username": "NEWUS", "password": "newpassword"})
+    client.get("/products")
+    anonymous_key = client.get_cookie("session").value
+
+    client.post("/user/login", data={"username": "NEWUS", "password": "newpassword"})
+    login_key = client.get_cookie("session").value
+    assert login_key != anonymous_key
+    assert [row["SessionKey"] for row in _stored_sessions(app)] == [login_key]
+
+    client.get("/user/logout")
+    logout_key = client.get_cookie("session").value
+    assert logout_key not in (anonymous_key, login_key)
+    assert [row["SessionKey"] for row in _stored_sessions(app)] == [logout_key]
+
+    client.set_cookie("session", login_key)
+    with client.session_transaction() as sess:
+        assert "user_id" not in sess
+
+
+def test_session_is_loaded_lazily(
+    client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that requests which never read the session skip the store."""
+    client.get("/products")
+    loads: List[str] = []
+    load = sessions.load_session_data
+    monkeypatch.setattr(
+        sessions, "load_session_data", lambda app, key: loads.append(key) or load(app, key)
+    )
+
+    client.get("/hello")
+    client.get("/static/style.css")
+    assert not loads
+
+    client.get("/products")
+    assert len(loads) == 1
+
+
+def test_sessions_follow_db_split_reads(client: FlaskClient, app: Flask) -> None:
+    """Test that loading a session opens no read-only pool when reads are not split."""
+    close_pool(app)
+    app.config["DB_SPLIT_READS"] = False
+    client.get("/products")
+    with client.session_transaction() as sess:
+        assert "session_id" in sess
+    assert "sqlite_read_pool" not in app.extensions
+
+
+def test_unknown_or_expired_key_starts_new_session(
+    client: FlaskClient, app: Flask, runner: FlaskCliRunner
+) -> None:
+    """Test that a stale cookie gets a fresh session and expired rows are purged."""
+    client.get("/products")
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE Sessions SET ExpiresAt = 0")
+        db.commit()
+
+    response = client.get("/products")
+    assert "Set-Cookie" in response.headers
+    assert len(_stored_sessions(app)) == 2
+
+    result = runner.invoke(args=["expire-sessions"])
+    assert "Expired 1 sessions." in result.output
+    assert len(_stored_sessions(app)) == 1
+
+
+def test_cookie_backend_can_be_selected(app: Flask) -> None:
+    """Test that SESSION_BACKEND = "cookie" keeps signed cookie sessions."""
+    app.config["SESSION_BACKEND"] = "cookie"
+    assert isinstance(make_session_interface(app), SessionlessAwareInterface)
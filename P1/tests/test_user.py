@@ -2,6 +2,7 @@
 
 # pylint: disable=redefined-outer-name, unused-argument
 
+import threading
 from typing import Any
 
 import pytest
@@ -10,6 +11,8 @@ from flask import Flask
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from flaskr.db import get_db
+from flaskr.passwords import PasswordHasher, PasswordHasherBusy
+from flaskr.user import AuthCache, get_auth_cache
 
 
 class AuthActions:
@@ -211,3 +214,154 @@ def test_login_with_different_session_ids(client: FlaskClient, app: Flask) -> No
         ).fetchone()
         assert row is not None
         assert row["SessionID"] == new_session
+
+
+def test_user_lookup_is_lazy_and_cached(client: FlaskClient, app: Flask, auth: AuthActions) -> None:
+    """Test that g.user is only queried when used, then served from the cache."""
+    client.post("/user/register", data={"username": "NEWUS", "password": "newpassword"})
+    auth.login("NEWUS", "newpassword")
+    with app.app_context():
+        cache = get_auth_cache()
+    cache.clear()
+
+    client.get("/hello")
+    assert cache.metrics() == {"hits": 0, "misses": 0, "entries": 0}
+
+    client.get("/products")
+    client.get("/products")
+    assert cache.metrics() == {"hits": 1, "misses": 1, "entries": 1}
+
+    auth.logout()
+    assert cache.metrics()["entries"] == 0
+
+
+def test_auth_cache_expiry_and_eviction() -> None:
+    """Test that cached rows expire after the TTL and the LRU size is bounded."""
+    cache = AuthCache(ttl=0.0, max_entries=2)
+    cache.put("AAAAA", "s1", {"UserID": "AAAAA"})
+    assert cache.get("AAAAA", "s1") == (False, None)
+
+    cache = AuthCache(ttl=60.0, max_entries=2)
+    cache.put("AAAAA", "s1", "a")
+    cache.put("BBBBB", "s2", "b")
+    assert cache.get("AAAAA", "s1") == (True, "a")
+    cache.put("CCCCC", "s3", None)
+    assert cache.get("BBBBB", "s2") == (False, None)
+    assert cache.get("CCCCC", "s3") == (True, None)
+
+    cache.invalidate("AAAAA")
+    assert cache.get("AAAAA", "s1") == (False, None)
+
+
+def test_login_rehashes_outdated_password(client: FlaskClient, app: Flask) -> None:
+    """Test that a hash made with other parameters is upgraded on login."""
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO Authentication (UserID, PasswordHash, SessionID) VALUES (?, ?, ?)",
+            ("OLDHS", generate_password_hash("secret", "pbkdf2:sha256:1000"), "old"),
+        )
+        db.commit()
+
+    response = client.post("/user/login", data={"username": "OLDHS", "password": "secret"})
+    assert response.headers["Location"] == "/products"
+
+    with app.app_context():
+        stored = get_db().execute(
+            "SELECT PasswordHash FROM Authentication WHERE UserID = 'OLDHS'"
+        ).fetchone()["PasswordHash"]
+    assert stored.startswith("scrypt:")
+    assert check_password_hash(stored, "secret")
+
+
+def test_saturated_hasher_returns_503(
+    client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that login and register answer 503 when hashing is saturated."""
+
+    def busy(*args: Any) -> str:
+        raise PasswordHasherBusy("busy")
+
+    monkeypatch.setattr(PasswordHasher, "hash", busy)
+    monkeypatch.setattr(PasswordHasher, "verify", busy)
+
+    response = client.post("/user/register", data={"username": "NEWUS", "password": "pw"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    monkeypatch.undo()
+    client.post("/user/register", data={"username": "NEWUS", "password": "pw"})
+    monkeypatch.setattr(PasswordHasher, "verify", busy)
+    response = client.post("/user/login", data={"username": "NEWUS", "password": "pw"})
+    assert response.status_code == 503
+
+
+def test_register_rejects_taken_username_before_hashing(
+    client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test that registering a taken username never reaches the password hasher."""
+    client.post("/user/register", data={"username": "NEWUS", "password": "pw"})
+
+    def busy(*args: Any) -> str:
+        raise PasswordHasherBusy("busy")
+
+    monkeypatch.setattr(PasswordHasher, "hash", busy)
+    response = client.post("/user/register", data={"username": "NEWUS", "password": "pw2"})
+    assert response.status_code == 200
+    assert b"User NEWUS is already registered." in response.data
+
+
+def test_password_hasher_bounds_pending_work(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the hasher rejects work beyond its pending limit."""
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash(password: str, method: str = "scrypt") -> str:
+        started.set()
+        release.wait(5)
+        return generate_password_hash(password, method)
+
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1, max_pending=1)
+    monkeypatch.setattr("flaskr.passwords.generate_password_hash", slow_hash)
+    worker = threading.Thread(target=hasher.hash, args=("first",))
+    worker.start()
+    try:
+        assert started.wait(5)
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash("second")
+        assert hasher.rejected == 1
+    finally:
+        release.set()
+        worker.join()
+
+    monkeypatch.undo()
+    assert hasher.verify(hasher.hash("third"), "third")
+    assert not hasher.needs_rehash(hasher.hash("fourth"))
+    assert hasher.needs_rehash(generate_password_hash("fifth", "scrypt"))
+    hasher.close()
+
+
+def test_password_hasher_times_out_as_busy(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a hash stuck behind slow work raises PasswordHasherBusy and is cancelled."""
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash(password: str, method: str = "scrypt") -> str:
+        started.set()
+        release.wait(5)
+        return generate_password_hash(password, method)
+
+    hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=1, max_pending=2, timeout=0.05)
+    monkeypatch.setattr("flaskr.passwords.generate_password_hash", slow_hash)
+    try:
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash("first")
+        assert started.wait(5)
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash("queued")
+        assert hasher.timeouts == 2
+    finally:
+        release.set()
+
+    monkeypatch.undo()
+    hasher.timeout = 5
+    assert hasher.verify(hasher.hash("second"), "second")
+    hasher.close()
@@ -13,14 +13,35 @@ from flaskr.views.main import main_bp
 from flaskr.views.unit import unit_bp
 
 from . import db
+from .logs import init_logging
+from .metrics import init_metrics
+from .profiling import init_profiling
 from .db import get_db
+from .ledger import rebuild_lease_balances_command
 
 
 def create_app(test_config: Optional[Dict[str, Any]] = None) -> Flask:
     """Create and configure the Flask application."""
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_mapping(  # type: ignore
-        SECRET_KEY="dev", DATABASE=os.path.join(app.instance_path, "flaskr.sqlite")
+        SECRET_KEY="dev",
+        DATABASE=os.path.join(app.instance_path, "flaskr.sqlite"),
+        DB_INSTRUMENT=False,
+        DB_SLOW_QUERY_MS=100.0,
+        DB_EXPLAIN_SLOW_QUERIES=True,
+        METRICS_ENABLED=False,
+        METRICS_PATH="/metrics",
+        METRICS_TOKEN=None,
+        PROFILE_SAMPLE_RATE=0.0,
+        PROFILE_TOKEN=None,
+        PROFILE_DIR=None,
+        PROFILE_INTERVAL=0.005,
+        PROFILE_FLUSH_INTERVAL=10.0,
+        LOG_ASYNC=True,
+        LOG_LEVEL="INFO",
+        LOG_FILE=None,
+        LOG_QUEUE_SIZE=10_000,
+        DASHBOARD_PAGE_SIZE=50,
     )
 
     if test_config is not None:
@@ -31,16 +52,25 @@ def create_app(test_config: Optional[Dict[str, Any]] = None) -> Flask:
     except OSError:
         pass
 
+    init_logging(app)
     db.init_app(app)
+    init_metrics(app)
+    init_profiling(app)
 
     app.register_blueprint(main_bp)
     app.register_blueprint(bill_bp)
     app.register_blueprint(unit_bp)
     app.register_blueprint(export_bp)
 
+    app.cli.add_command(rebuild_lease_balances_command)
+
     # on first run, initialize the database; we don't cover this in tests
     if not os.path.exists(app.config["DATABASE"]):  # type: ignore # pragma: no cover
         with app.app_context():
             db.init_db()  # pragma: no cover
+    else:
+        # bring a database from an older schema.sql up to date before serving
+        with app.app_context():
+            db.migrate_db()
 
     return app
@@ -1,19 +1,30 @@
 """Database utility functions for the Flask app."""
+import logging
 import sqlite3
-from typing import Optional
+from typing import Callable, Dict, List, Optional
 
 import click
 from flask import Flask, current_app, g
 from flask.cli import with_appcontext
 
+from .querystats import InstrumentedConnection, add_server_timing, get_query_stats
+
+logger = logging.getLogger(__name__)
+
 
 def get_db() -> sqlite3.Connection:
     """Get a database connection, create one if not exists."""
     if "db" not in g:
+        # Only wrap statements in QueryCursor when DB_INSTRUMENT is on.
+        stats = get_query_stats()
         g.db = sqlite3.connect(
-            current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
+            current_app.config["DATABASE"],
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            factory=sqlite3.Connection if stats is None else InstrumentedConnection,
         )
         g.db.row_factory = sqlite3.Row
+        if stats is not None:
+            g.db.query_stats = stats
     return g.db
 
 
@@ -24,6 +35,132 @@ def close_db(_e: Optional[Exception] = None) -> None:
         db.close()
 
 
+# Each migration carries its own DDL as it stood when the version was added,
+# so later edits to schema.sql never change what an old version does.
+def _create_lease_balances(db: sqlite3.Connection) -> None:
+    """Version 1: create and fill the LeaseBalance ledger."""
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS LeaseBalance (
+          lease_id INTEGER PRIMARY KEY,
+          total_due DECIMAL(10,2) NOT NULL DEFAULT 0,
+          total_paid DECIMAL(10,2) NOT NULL DEFAULT 0,
+          FOREIGN KEY (lease_id) REFERENCES Lease(id)
+        )
+    """
+    )
+    # Malformed or non-object other_charges JSON counts as no charges.
+    db.execute("DELETE FROM LeaseBalance")
+    db.execute(
+        """
+        INSERT INTO LeaseBalance (lease_id, total_due, total_paid)
+        SELECT L.id,
+          COALESCE((
+            SELECT SUM(B.rent_amount + (
+              SELECT COALESCE(SUM(CAST(C.value AS REAL)), 0)
+              FROM json_each(COALESCE(
+                CASE WHEN json_valid(B.other_charges) THEN
+                  CASE json_type(B.other_charges) WHEN 'object' THEN B.other_charges END
+                END, '{}')) C
+            ))
+            FROM Bill B WHERE B.lease_id = L.id
+          ), 0),
+          COALESCE((
+            SELECT SUM(P.amount) FROM Payment P JOIN Bill B ON B.id = P.bill_id
+            WHERE B.lease_id = L.id
+          ), 0)
+        FROM Lease L
+    """
+    )
+
+
+def _index_lease_lookups(db: sqlite3.Connection) -> None:
+    """Version 2: index the lease, bill and payment lookups."""
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_lease_apartment_start ON Lease (apartment_id, start_date)"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS idx_bill_lease_sent ON Bill (lease_id, sent_at)")
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_payment_bill_date "
+        "ON Payment (bill_id, payment_date, amount)"
+    )
+
+
+def _index_unit_numbers(db: sqlite3.Connection) -> None:
+    """Version 3: index the unit number the dashboard orders and pages by."""
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_apartment_unit_number ON Apartment (unit_number)"
+    )
+
+
+_LATEST_LEASE = """
+    SELECT id FROM Lease WHERE apartment_id = Apartment.id
+    ORDER BY start_date DESC, id DESC LIMIT 1
+"""
+
+
+def _add_current_lease(db: sqlite3.Connection) -> None:
+    """Version 4: add Apartment.current_lease_id with its triggers and fill it in."""
+    columns = {row[1] for row in db.execute("PRAGMA table_info(Apartment)")}
+    if "current_lease_id" not in columns:
+        db.execute("ALTER TABLE Apartment ADD COLUMN current_lease_id INTEGER REFERENCES Lease(id)")
+    db.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_lease_current_insert AFTER INSERT ON Lease
+        BEGIN
+          UPDATE Apartment SET current_lease_id = ({_LATEST_LEASE})
+          WHERE id = NEW.apartment_id;
+        END
+    """
+    )
+    db.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_lease_current_update
+        AFTER UPDATE OF apartment_id, start_date ON Lease
+        BEGIN
+          UPDATE Apartment SET current_lease_id = ({_LATEST_LEASE})
+          WHERE id IN (OLD.apartment_id, NEW.apartment_id);
+        END
+    """
+    )
+    db.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_lease_current_delete AFTER DELETE ON Lease
+        BEGIN
+          UPDATE Apartment SET current_lease_id = ({_LATEST_LEASE})
+          WHERE id = OLD.apartment_id;
+        END
+    """
+    )
+    db.execute(f"UPDATE Apartment SET current_lease_id = ({_LATEST_LEASE})")
+
+
+# Schema changes for databases created before them, keyed by the
+# PRAGMA user_version they bring the database to.
+MIGRATIONS: Dict[int, Callable[[sqlite3.Connection], None]] = {
+    1: _create_lease_balances,
+    2: _index_lease_lookups,
+    3: _index_unit_numbers,
+    4: _add_current_lease,
+}
+SCHEMA_VERSION = max(MIGRATIONS)
+
+
+def migrate_db() -> List[int]:
+    """Apply pending migrations in order and return the versions applied."""
+    db = get_db()
+    current: int = db.execute("PRAGMA user_version").fetchone()[0]
+    applied: List[int] = []
+    for version in sorted(v for v in MIGRATIONS if v > current):
+        MIGRATIONS[version](db)
+        db.execute(f"PRAGMA user_version = {version}")
+        db.commit()
+        applied.append(version)
+    if applied:
+        logger.info("Migrated database to schema version %d", applied[-1])
+    return applied
+
+
 def init_db() -> None:
     """Initialize the database schema and seed data."""
     db = get_db()
@@ -39,6 +176,7 @@ def init_db() -> None:
             db.executescript(content.decode("utf8"))
         else:
             db.executescript(content)
+    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
 
 @click.command("init-db")
@@ -49,10 +187,20 @@ def init_db_command() -> None:
     click.echo("Initialized the database.")
 
 
+@click.command("migrate-db")
+@with_appcontext
+def migrate_db_command() -> None:
+    """Flask CLI command to bring an existing database up to date."""
+    applied = migrate_db()
+    click.echo(f"Applied {len(applied)} migrations; schema version {SCHEMA_VERSION}.")
+
+
 def init_app(app: Flask) -> None:
     """Register database functions with the Flask app."""
     def teardown(_: Optional[BaseException] = None) -> None:
         close_db()
 
     app.teardown_appcontext(teardown)
+    app.after_request(add_server_timing)
     app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_db_command)
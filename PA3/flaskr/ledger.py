@@ -0,0 +1,116 @@
+"""Per-lease running balance kept in step with bills and payments."""
+import json
+import sqlite3
+from typing import Any, List, Optional, Tuple
+
+import click
+from flask.cli import with_appcontext
+
+from flaskr.db import get_db
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS LeaseBalance (
+  lease_id INTEGER PRIMARY KEY,
+  total_due DECIMAL(10,2) NOT NULL DEFAULT 0,
+  total_paid DECIMAL(10,2) NOT NULL DEFAULT 0,
+  FOREIGN KEY (lease_id) REFERENCES Lease(id)
+);
+"""
+
+
+def _charge_amount(value: Any) -> float:
+    """Return one charge as a number, treating a non-numeric value as zero."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def charges_total(other_charges: Optional[str]) -> float:
+    """Sum a bill's other_charges JSON, treating malformed JSON as no charges."""
+    if not other_charges:
+        return 0.0
+    try:
+        charges = json.loads(other_charges)
+    except json.JSONDecodeError:
+        return 0.0
+    if not isinstance(charges, dict):
+        return 0.0
+    return sum(_charge_amount(v) for v in charges.values())
+
+
+def record_bill(db: sqlite3.Connection, lease_id: int, amount_due: float) -> None:
+    """Add a new bill's rent and charges to its lease's balance."""
+    db.execute(
+        """
+        INSERT INTO LeaseBalance (lease_id, total_due) VALUES (?, ?)
+        ON CONFLICT (lease_id) DO UPDATE SET total_due = total_due + excluded.total_due
+    """,
+        (lease_id, amount_due),
+    )
+
+
+def record_payment(db: sqlite3.Connection, bill_id: int, amount: float) -> None:
+    """Add a payment to the balance of the lease its bill belongs to."""
+    db.execute(
+        """
+        INSERT INTO LeaseBalance (lease_id, total_paid)
+        SELECT lease_id, ? FROM Bill WHERE id = ?
+        ON CONFLICT (lease_id) DO UPDATE SET total_paid = total_paid + excluded.total_paid
+    """,
+        (amount, bill_id),
+    )
+
+
+_EXPECTED_BALANCES = """
+    SELECT L.id AS lease_id,
+        COALESCE((SELECT SUM(B.rent_amount + charges_total(B.other_charges))
+                  FROM Bill B WHERE B.lease_id = L.id), 0) AS total_due,
+        COALESCE((SELECT SUM(P.amount) FROM Payment P JOIN Bill B ON B.id = P.bill_id
+                  WHERE B.lease_id = L.id), 0) AS total_paid
+    FROM Lease L
+"""
+
+
+def rebuild_lease_balances(db: sqlite3.Connection) -> int:
+    """Recompute every lease's balance from its full history; return the lease count."""
+    db.create_function("charges_total", 1, charges_total, deterministic=True)
+    db.executescript(LEDGER_SCHEMA)
+    db.execute("DELETE FROM LeaseBalance")
+    count = db.execute(
+        f"INSERT INTO LeaseBalance (lease_id, total_due, total_paid) {_EXPECTED_BALANCES}"
+    ).rowcount
+    db.commit()
+    return count
+
+
+def verify_lease_balances(db: sqlite3.Connection) -> List[Tuple[int, float, float]]:
+    """Return (lease_id, stored, expected) for every balance that has drifted."""
+    db.create_function("charges_total", 1, charges_total, deterministic=True)
+    rows = db.execute(
+        f"""
+        WITH expected AS ({_EXPECTED_BALANCES})
+        SELECT E.lease_id,
+            ROUND(COALESCE(LB.total_paid, 0) - COALESCE(LB.total_due, 0), 2) AS stored,
+            ROUND(E.total_paid - E.total_due, 2) AS expected
+        FROM expected E LEFT JOIN LeaseBalance LB ON LB.lease_id = E.lease_id
+    """
+    ).fetchall()
+    return [tuple(row) for row in rows if row["stored"] != row["expected"]]
+
+
+@click.command("rebuild-lease-balances")
+@click.option("--verify", is_flag=True, help="Only report drifted balances.")
+@with_appcontext
+def rebuild_lease_balances_command(verify: bool) -> None:
+    """Flask CLI command to rebuild or verify the lease balance ledger."""
+    db = get_db()
+    if verify:
+        drifted = verify_lease_balances(db)
+        for lease_id, stored, expected in drifted:
+            click.echo(f"Lease {lease_id}: stored {stored:.2f}, expected {expected:.2f}")
+        click.echo(f"{len(drifted)} drifted balances.")
+        if drifted:
+            raise SystemExit(1)
+        return
+    click.echo(f"Rebuilt {rebuild_lease_balances(db)} lease balances.")
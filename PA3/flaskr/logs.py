@@ -0,0 +1,129 @@
+"""Queued JSON logging so request threads never block on log output."""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from flask import Flask, has_request_context, request
+
+LOGGER_NAME = "flaskr"
+
+_RECORD_ATTRS = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None)).keys()
+) | {"message", "asctime", "endpoint"}
+_logging_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record, including its extra= fields, as one JSON line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "endpoint", None):
+            entry["endpoint"] = record.endpoint  # type: ignore[attr-defined]
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class StderrHandler(logging.StreamHandler):  # type: ignore[type-arg]
+    """Stream handler writing to the current sys.stderr."""
+
+    def __init__(self) -> None:
+        super().__init__(sys.stderr)
+
+    @property  # type: ignore[override]
+    def stream(self) -> Any:
+        """The current sys.stderr, so redirection and test capture are honoured."""
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, _: Any) -> None:
+        pass
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when full."""
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        if has_request_context():
+            record.endpoint = request.endpoint
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:  # pylint: disable=too-few-public-methods
+    """A queue handler plus the listener thread that drains it."""
+
+    def __init__(self, stream_handler: logging.Handler, max_queue: int = 10_000) -> None:
+        self.pid = os.getpid()
+        self.handler = NonBlockingQueueHandler(queue.Queue(max(1, max_queue)))
+        self.listener = logging.handlers.QueueListener(
+            self.handler.queue, stream_handler, respect_handler_level=True
+        )
+        self.listener.start()
+        self.running = True
+
+    def stop(self) -> None:
+        """Flush the queue and stop the listener."""
+        if self.running:
+            self.running = False
+            self.listener.stop()
+
+
+_pipeline: Optional[LogPipeline] = None  # pylint: disable=invalid-name
+
+
+def init_logging(app: Flask) -> Optional[LogPipeline]:
+    """Attach the per-process pipeline to the flaskr logger unless LOG_ASYNC is off."""
+    global _pipeline  # pylint: disable=global-statement
+    if not app.config.get("LOG_ASYNC", True):
+        return None
+    logger = logging.getLogger(LOGGER_NAME)
+    with _logging_lock:
+        if _pipeline is None or _pipeline.pid != os.getpid():
+            log_file = app.config.get("LOG_FILE")
+            stream_handler: logging.Handler = (
+                logging.FileHandler(log_file, encoding="utf8") if log_file else StderrHandler()
+            )
+            stream_handler.setFormatter(JsonFormatter())
+            if _pipeline is not None:
+                logger.removeHandler(_pipeline.handler)
+            _pipeline = LogPipeline(stream_handler, app.config.get("LOG_QUEUE_SIZE", 10_000))
+            atexit.register(_pipeline.stop)
+            logger.addHandler(_pipeline.handler)
+        logger.setLevel(app.config.get("LOG_LEVEL", "INFO"))
+    return _pipeline
@@ -0,0 +1,189 @@
+"""Per-endpoint request metrics served in Prometheus text format."""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, Response, current_app, g, request
+
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED_ENDPOINT = "<unmatched>"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:  # pylint: disable=too-few-public-methods
+    """Latency buckets, sum and count for one label set."""
+
+    __slots__ = ("buckets", "total", "count")
+
+    def __init__(self) -> None:
+        self.buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        """Add one observation; the caller holds the lock."""
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class RequestMetrics:
+    """Thread-safe in-flight, status and latency counters."""
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.latency: Dict[Labels, Histogram] = {}
+        self.db_time: Dict[Labels, Histogram] = {}
+        self.responses: Dict[Labels, int] = {}
+        self._lock = threading.Lock()
+
+    def started(self) -> None:
+        """Count a request as in flight."""
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(
+        self, endpoint: str, method: str, status: int, seconds: float, db_seconds: Optional[float]
+    ) -> None:
+        """Record a finished request."""
+        labels = (("endpoint", endpoint), ("method", method))
+        status_labels = labels + (("status", str(status)),)
+        with self._lock:
+            self.in_flight -= 1
+            self.latency.setdefault(labels, Histogram()).observe(seconds)
+            self.responses[status_labels] = self.responses.get(status_labels, 0) + 1
+            if db_seconds is not None:
+                self.db_time.setdefault(labels, Histogram()).observe(db_seconds)
+
+    def render(self) -> List[str]:
+        """Return the metrics as exposition lines."""
+        with self._lock:
+            return (
+                _samples(
+                    "pa3_http_requests_in_flight",
+                    "gauge",
+                    "Requests currently being served.",
+                    [((), self.in_flight)],
+                )
+                + _samples(
+                    "pa3_http_responses_total",
+                    "counter",
+                    "Responses by endpoint, method and status code.",
+                    sorted(self.responses.items()),
+                )
+                + _histogram(
+                    "pa3_http_request_duration_seconds",
+                    "Request latency by endpoint and method.",
+                    self.latency,
+                )
+                + _histogram(
+                    "pa3_db_request_duration_seconds",
+                    "Time spent in SQL per request (needs DB_INSTRUMENT).",
+                    self.db_time,
+                )
+            )
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Iterable[Tuple[str, str]]) -> str:
+    """Format a label set as {name="value",...}."""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def _samples(
+    name: str, kind: str, help_text: str, samples: Iterable[Tuple[Labels, float]]
+) -> List[str]:
+    """Return HELP and TYPE lines followed by the samples."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+
+def _histogram(name: str, help_text: str, histograms: Dict[Labels, Histogram]) -> List[str]:
+    """Return cumulative bucket, sum and count lines."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, hist in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), hist.buckets):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {hist.total!r}")
+        lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+    return lines
+
+
+def _request_started() -> None:
+    """Start timing the request."""
+    g.request_started = time.perf_counter()
+    current_app.extensions["request_metrics"].started()
+
+
+def _remember_status(response: Response) -> Response:
+    """Keep the status code for the teardown hook."""
+    g.response_status = response.status_code
+    return response
+
+
+def _request_finished(_: Optional[BaseException] = None) -> None:
+    """Record the request, including ones that raised."""
+    started: Optional[float] = g.pop("request_started", None)
+    if started is None:
+        return
+    totals = g.get("query_totals")
+    current_app.extensions["request_metrics"].finished(
+        request.endpoint or UNMATCHED_ENDPOINT,
+        request.method,
+        g.get("response_status", 500),
+        time.perf_counter() - started,
+        totals["time"] if totals else None,
+    )
+
+
+def _authorized() -> bool:
+    """Return True unless METRICS_TOKEN is set and the request does not send it."""
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token:
+        return True
+    sent = request.headers.get("Authorization", "")
+    return hmac.compare_digest(sent.encode(), f"Bearer {token}".encode())
+
+
+def metrics_view() -> Response:
+    """Serve the metrics in Prometheus text format, behind METRICS_TOKEN if set."""
+    if not _authorized():
+        return Response(
+            "Unauthorized\n", 401, {"WWW-Authenticate": "Bearer"}, content_type=CONTENT_TYPE
+        )
+    lines = current_app.extensions["request_metrics"].render()
+    query_stats = current_app.extensions.get("query_stats")
+    if query_stats is not None:
+        lines += _samples(
+            "pa3_db_slow_queries_total",
+            "counter",
+            "Statements slower than DB_SLOW_QUERY_MS.",
+            [((), query_stats.slow)],
+        )
+    return Response("\n".join(lines) + "\n", content_type=CONTENT_TYPE)
+
+
+def init_metrics(app: Flask) -> None:
+    """Register the metrics hooks and route if METRICS_ENABLED is on."""
+    if not app.config.get("METRICS_ENABLED", False):
+        return
+    app.extensions["request_metrics"] = RequestMetrics()
+    app.before_request(_request_started)
+    app.after_request(_remember_status)
+    app.teardown_request(_request_finished)
+    app.add_url_rule(app.config.get("METRICS_PATH", "/metrics"), "metrics", metrics_view)
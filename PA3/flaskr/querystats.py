@@ -0,0 +1,234 @@
+"""Opt-in SQL timing, per-statement histograms and a slow-query log."""
+import logging
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Flask, Response, current_app, g, has_app_context, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_BOUNDS_MS: Tuple[float, ...] = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+MAX_SQL_LENGTH = 200
+MAX_STATEMENTS = 500
+OTHER_STATEMENTS = "<other>"
+
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and truncate so equal statements share one key."""
+    return " ".join(sql.split())[:MAX_SQL_LENGTH]
+
+
+class QueryStats:
+    """Thread-safe per-statement call counts, latency, rows and histograms."""
+
+    def __init__(self, slow_ms: float = 100.0, explain: bool = True) -> None:
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.slow = 0
+        self._statements: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, sql: str, seconds: float, rows: int, endpoint: str) -> None:
+        """Record one finished statement."""
+        key = normalize_sql(sql)
+        bucket = bisect_left(HISTOGRAM_BOUNDS_MS, seconds * 1000)
+        with self._lock:
+            if key not in self._statements and len(self._statements) >= MAX_STATEMENTS:
+                key = OTHER_STATEMENTS
+            entry = self._statements.setdefault(
+                key,
+                {
+                    "calls": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "rows": 0,
+                    "histogram": [0] * (len(HISTOGRAM_BOUNDS_MS) + 1),
+                    "endpoints": {},
+                },
+            )
+            entry["calls"] += 1
+            entry["total_ms"] += seconds * 1000
+            entry["max_ms"] = max(entry["max_ms"], seconds * 1000)
+            entry["rows"] += rows
+            entry["histogram"][bucket] += 1
+            entry["endpoints"][endpoint] = entry["endpoints"].get(endpoint, 0) + 1
+            if seconds * 1000 >= self.slow_ms:
+                self.slow += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return a copy of the counters, slowest total time first."""
+        with self._lock:
+            statements = sorted(
+                self._statements.items(), key=lambda item: item[1]["total_ms"], reverse=True
+            )
+            return {
+                "histogram_bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+                "slow": self.slow,
+                "statements": {
+                    sql: dict(
+                        entry,
+                        histogram=list(entry["histogram"]),
+                        endpoints=dict(entry["endpoints"]),
+                    )
+                    for sql, entry in statements
+                },
+            }
+
+
+def _endpoint() -> str:
+    """Return the running endpoint, or "-" outside a request."""
+    return (request.endpoint or "-") if has_request_context() else "-"
+
+
+class QueryCursor(sqlite3.Cursor):
+    """Cursor that times a statement from execute() until its rows are fetched."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._pending: Optional[Tuple[str, Any, float]] = None
+        self._rows = 0
+
+    def _run(self, method: Any, sql: str, params: Any, plan_params: Any) -> "QueryCursor":
+        self._finish()
+        started = time.perf_counter()
+        method(sql, params)
+        self._pending = (sql, plan_params, time.perf_counter() - started)
+        self._rows = 0
+        if self.description is None:
+            self._finish(max(self.rowcount, 0))
+        return self
+
+    def execute(self, sql: str, parameters: Any = ()) -> "QueryCursor":  # type: ignore[override]
+        """Run a statement and start timing it."""
+        return self._run(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> "QueryCursor":  # type: ignore[override]
+        """Run a statement per parameter set, timed as one; no plan is logged."""
+        return self._run(super().executemany, sql, seq_of_parameters, None)
+
+    def _timed(self, method: Any, *args: Any) -> Any:
+        started = time.perf_counter()
+        result = method(*args)
+        if self._pending is not None:
+            sql, params, elapsed = self._pending
+            self._pending = (sql, params, elapsed + time.perf_counter() - started)
+        return result
+
+    def fetchone(self) -> Any:
+        """Fetch the next row and record the statement."""
+        row = self._timed(super().fetchone)
+        self._finish(0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args: Any) -> List[Any]:
+        """Fetch the next rows and record the statement."""
+        rows = self._timed(super().fetchmany, *args)
+        self._finish(len(rows))
+        return rows
+
+    def fetchall(self) -> List[Any]:
+        """Fetch the remaining rows and record the statement."""
+        rows = self._timed(super().fetchall)
+        self._finish(self._rows + len(rows))
+        return rows
+
+    def __next__(self) -> Any:
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish(self._rows)
+            raise
+        self._rows += 1
+        return row
+
+    def close(self) -> None:
+        """Record any pending statement and close the cursor."""
+        self._finish(self._rows)
+        super().close()
+
+    def _finish(self, rows: int = 0) -> None:
+        """Record the pending statement and log it if it was slow."""
+        if self._pending is None:
+            return
+        sql, params, seconds = self._pending
+        self._pending = None
+        stats: Optional[QueryStats] = getattr(self.connection, "query_stats", None)
+        if stats is None:
+            return
+        stats.observe(sql, seconds, rows, _endpoint())
+        if has_app_context():
+            totals = g.setdefault("query_totals", {"count": 0, "time": 0.0, "rows": 0})
+            totals["count"] += 1
+            totals["time"] += seconds
+            totals["rows"] += rows
+        if seconds * 1000 >= stats.slow_ms:
+            plan = ""
+            if stats.explain and params is not None and sql.lstrip().upper().startswith(
+                _EXPLAINABLE
+            ):
+                try:
+                    plan = "\n".join(
+                        row[3]
+                        for row in self.connection.cursor(sqlite3.Cursor)
+                        .execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                        .fetchall()
+                    )
+                except sqlite3.Error:
+                    plan = "(no plan)"
+            logger.warning(
+                "Slow query (%.1f ms, %d rows) in %s: %s\n%s",
+                seconds * 1000,
+                rows,
+                _endpoint(),
+                normalize_sql(sql),
+                plan,
+            )
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose execute() and executemany() go through QueryCursor."""
+
+    query_stats: Optional[QueryStats] = None
+
+    def execute(self, *args: Any) -> sqlite3.Cursor:  # type: ignore[override]
+        """Run a statement on a new QueryCursor."""
+        return self.cursor(QueryCursor).execute(*args)
+
+    def executemany(self, *args: Any) -> sqlite3.Cursor:  # type: ignore[override]
+        """Run a statement per parameter set on a new QueryCursor."""
+        return self.cursor(QueryCursor).executemany(*args)
+
+
+def get_query_stats(app: Optional[Flask] = None) -> Optional[QueryStats]:
+    """Return the app's QueryStats, or None unless DB_INSTRUMENT is set."""
+    app = app or current_app._get_current_object()  # type: ignore[attr-defined]  # pylint: disable=protected-access
+    if not app.config.get("DB_INSTRUMENT", False):
+        return None
+    return app.extensions.setdefault(
+        "query_stats",
+        QueryStats(
+            slow_ms=app.config.get("DB_SLOW_QUERY_MS", 100.0),
+            explain=app.config.get("DB_EXPLAIN_SLOW_QUERIES", True),
+        ),
+    )
+
+
+def request_query_totals() -> Dict[str, Any]:
+    """Return the count, time and rows of the statements run in this context."""
+    return dict(g.get("query_totals") or {"count": 0, "time": 0.0, "rows": 0})
+
+
+def add_server_timing(response: Response) -> Response:
+    """Report the request's database time in a Server-Timing header."""
+    totals = g.get("query_totals")
+    if totals:
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={totals["time"] * 1000:.2f};desc="{totals["count"]} queries"',
+        )
+    return response
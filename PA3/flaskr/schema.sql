@@ -1,3 +1,4 @@
+DROP TABLE IF EXISTS LeaseBalance;
 DROP TABLE IF EXISTS Payment;
 DROP TABLE IF EXISTS Bill;
 DROP TABLE IF EXISTS Lease;
@@ -9,7 +10,8 @@ CREATE TABLE Apartment (
   unit_number TEXT NOT NULL,
   unit_size INTEGER NOT NULL,
   ownership_type TEXT NOT NULL CHECK (ownership_type IN ('sold', 'rent_controlled', 'rent_stabilized', 'market')),
-  is_special BOOLEAN NOT NULL DEFAULT FALSE
+  is_special BOOLEAN NOT NULL DEFAULT FALSE,
+  current_lease_id INTEGER REFERENCES Lease(id)
 );
 
 CREATE TABLE Tenant (
@@ -50,3 +52,45 @@ CREATE TABLE Payment (
   remitter_name TEXT NOT NULL,
   FOREIGN KEY (bill_id) REFERENCES Bill(id)
 );
+
+CREATE TABLE LeaseBalance (
+  lease_id INTEGER PRIMARY KEY,
+  total_due DECIMAL(10,2) NOT NULL DEFAULT 0,
+  total_paid DECIMAL(10,2) NOT NULL DEFAULT 0,
+  FOREIGN KEY (lease_id) REFERENCES Lease(id)
+);
+
+-- Secondary indexes, shaped after the views' lookups. Also applied to
+-- existing databases by `flask migrate-db`.
+CREATE INDEX IF NOT EXISTS idx_apartment_unit_number ON Apartment (unit_number);
+CREATE INDEX IF NOT EXISTS idx_lease_apartment_start ON Lease (apartment_id, start_date);
+CREATE INDEX IF NOT EXISTS idx_bill_lease_sent ON Bill (lease_id, sent_at);
+CREATE INDEX IF NOT EXISTS idx_payment_bill_date ON Payment (bill_id, payment_date, amount);
+
+-- Apartment.current_lease_id points at the unit's latest lease so listings
+-- join one lease per unit. Kept up to date by these triggers, which also
+-- cover leases inserted by seed.sql. Applied by `flask migrate-db` too.
+CREATE TRIGGER IF NOT EXISTS trg_lease_current_insert AFTER INSERT ON Lease
+BEGIN
+  UPDATE Apartment SET current_lease_id = (
+    SELECT id FROM Lease WHERE apartment_id = Apartment.id
+    ORDER BY start_date DESC, id DESC LIMIT 1
+  ) WHERE id = NEW.apartment_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_lease_current_update
+AFTER UPDATE OF apartment_id, start_date ON Lease
+BEGIN
+  UPDATE Apartment SET current_lease_id = (
+    SELECT id FROM Lease WHERE apartment_id = Apartment.id
+    ORDER BY start_date DESC, id DESC LIMIT 1
+  ) WHERE id IN (OLD.apartment_id, NEW.apartment_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_lease_current_delete AFTER DELETE ON Lease
+BEGIN
+  UPDATE Apartment SET current_lease_id = (
+    SELECT id FROM Lease WHERE apartment_id = Apartment.id
+    ORDER BY start_date DESC, id DESC LIMIT 1
+  ) WHERE id = OLD.apartment_id;
+END;
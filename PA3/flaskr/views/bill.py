@@ -1,32 +1,41 @@
 """Bill management views."""
 import json
+import logging
 import sqlite3
-from typing import Any, Dict, Tuple, Union
+from typing import Any, Dict, Optional, Tuple, Union
 
-from flask import Blueprint, render_template, request
+from flask import Blueprint, current_app, render_template, request
 
 from flaskr.db import get_db
+from flaskr.ledger import charges_total, record_bill, record_payment
+
+logger = logging.getLogger(__name__)
 
 bill_bp = Blueprint("bill", __name__)
 
 
 @bill_bp.route("/bill-payment")
 def bill_payment_dashboard() -> str:
-    """Display the bill payment dashboard."""
+    """Display one page of unsold units with their current tenant and outstanding balance."""
     db = get_db()
     search: str = request.args.get("search", "").lower()
     ownership: str = request.args.get("ownership", "")
     special_only: bool = request.args.get("special") == "1"
+    after_unit: Optional[str] = request.args.get("after_unit")
+    after_id: Optional[int] = request.args.get("after_id", type=int)
+    page_size: int = current_app.config.get("DASHBOARD_PAGE_SIZE", 50)
 
     query: str = """
-        SELECT A.id AS apartment_id, A.unit_number, A.ownership_type, A.is_special, T.full_name
+        SELECT A.id AS apartment_id, A.unit_number, A.ownership_type, A.is_special, T.full_name,
+            ROUND(COALESCE(LB.total_due, 0) - COALESCE(LB.total_paid, 0), 2) AS outstanding
         FROM Apartment A
-        JOIN Lease L ON L.apartment_id = A.id
+        JOIN Lease L ON L.id = A.current_lease_id
         JOIN Tenant T ON T.id = L.tenant_id
-        WHERE 1=1
+        LEFT JOIN LeaseBalance LB ON LB.lease_id = L.id
+        WHERE A.ownership_type <> 'sold'
     """
 
-    args: list[str] = []
+    args: list[Any] = []
 
     if search:
         query += " AND (LOWER(A.unit_number) LIKE ? OR LOWER(T.full_name) LIKE ?)"
@@ -39,16 +48,21 @@ def bill_payment_dashboard() -> str:
     if special_only:
         query += " AND A.is_special = 1"
 
+    if after_unit is not None and after_id is not None:
+        query += " AND (A.unit_number, A.id) > (?, ?)"
+        args.extend([after_unit, after_id])
+
+    query += " ORDER BY A.unit_number, A.id LIMIT ?"
+    args.append(page_size + 1)
+
     data = db.execute(query, args).fetchall()
-    filtered_data: list[Any] = []
-    for row in data:
-        if row["ownership_type"] == "sold":
-            continue
-        if row["full_name"] is None:
-            continue  # pragma: no cover
-        filtered_data.append(row)
+    next_args: Optional[Dict[str, Any]] = None
+    if len(data) > page_size:
+        data = data[:page_size]
+        next_args = dict(request.args)
+        next_args.update(after_unit=data[-1]["unit_number"], after_id=data[-1]["apartment_id"])
 
-    return render_template("bill_payment.html", data=filtered_data)
+    return render_template("bill_payment.html", data=data, next_args=next_args)
 
 
 @bill_bp.route("/unit/<int:unit_id>/create-bill", methods=["POST"])
@@ -60,12 +74,10 @@ def create_bill(unit_id: int) -> Tuple[str, int]:
     lease = db.execute(
         """
         SELECT L.id AS lease_id, T.email, T.full_name
-        FROM Lease L
-        JOIN Apartment A ON L.apartment_id = A.id
+        FROM Apartment A
+        JOIN Lease L ON L.id = A.current_lease_id
         JOIN Tenant T ON T.id = L.tenant_id
         WHERE A.id = ?
-        ORDER BY L.start_date DESC
-        LIMIT 1
     """,
         (unit_id,),
     ).fetchone()
@@ -73,6 +85,7 @@ def create_bill(unit_id: int) -> Tuple[str, int]:
     if not lease:
         return "Lease not found", 404
 
+    other_charges = json.dumps(data["other_charges"])
     db.execute(
         """
             INSERT INTO Bill (lease_id, billing_month, rent_amount, other_charges,
@@ -83,22 +96,28 @@ def create_bill(unit_id: int) -> Tuple[str, int]:
             lease["lease_id"],
             data["billing_month"] + "-01",
             data["rent_amount"],
-            json.dumps(data["other_charges"]),
+            other_charges,
             data["balance_used"],
             data["total_amount"],
         ),
     )
+    record_bill(
+        db, lease["lease_id"], float(data["rent_amount"]) + charges_total(other_charges)
+    )
     db.commit()
 
-    print("Simulated Email Sent")
-    print("To:", lease["email"])
-    print("Subject: New Rent Bill Issued")
-    print(f"Dear {lease['full_name']},")
-    print(f"Here is your bill for {data['billing_month']}:")
-    print(f" - Rent: ${data['rent_amount']:.2f}")
-    print(f" - Other Charges: {data['other_charges']}")
-    print(f" - Balance Used: ${data['balance_used']:.2f}")
-    print(f" - Total Due: ${data['total_amount']:.2f}")
+    logger.info(
+        "Simulated email sent: New Rent Bill Issued",
+        extra={
+            "to": lease["email"],
+            "tenant": lease["full_name"],
+            "billing_month": data["billing_month"],
+            "rent_amount": data["rent_amount"],
+            "other_charges": data["other_charges"],
+            "balance_used": data["balance_used"],
+            "total_amount": data["total_amount"],
+        },
+    )
 
     return "", 200
 
@@ -153,12 +172,9 @@ def create_payment(unit_id: int) -> Tuple[str, int]:
         "check_number",
         "remitter_name",
     ]
-    # if not all(field in data and data[field] for field in required_fields):
-    #     return "Missing required fields", 400
     if not all(field in data for field in required_fields):
         return "Missing required fields", 400
 
-
     try:
         amount = float(data["amount"])
         if amount < 0:
@@ -174,16 +190,17 @@ def create_payment(unit_id: int) -> Tuple[str, int]:
         """,
             (
                 data["bill_id"],
-                data["amount"],
+                amount,
                 data["payment_date"],
                 data["check_number"],
                 data["remitter_name"],
             ),
         )
+        record_payment(db, data["bill_id"], amount)
         db.commit()
         return "", 200
     except sqlite3.DatabaseError as e:
-        print("Payment Insert Error:", e)
+        logger.error("Payment insert failed: %s", e)
         return "Database error", 500
 
 
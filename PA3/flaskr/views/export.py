@@ -20,7 +20,7 @@ def export_units() -> Any:
             T.full_name AS owner_name, 
             L.monthly_rent, L.end_date
         FROM Apartment A
-        LEFT JOIN Lease L ON L.apartment_id = A.id
+        LEFT JOIN Lease L ON L.id = A.current_lease_id
         LEFT JOIN Tenant T ON T.id = L.tenant_id
         ORDER BY A.unit_number
     """
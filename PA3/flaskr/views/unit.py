@@ -1,8 +1,9 @@
 """Unit management views."""
-import json
-from typing import Any, Dict, Tuple, Union
+import sqlite3
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Tuple, Union
 
-from flask import Blueprint, render_template, request
+from flask import Blueprint, jsonify, render_template, request
 
 from flaskr.db import get_db
 
@@ -27,10 +28,12 @@ def units_overview() -> str:
         CASE WHEN L.id IS NOT NULL THEN 1 ELSE 0 END AS has_lease,
         T.full_name     AS tenant_name,
         L.monthly_rent,
-        L.end_date
+        L.end_date,
+        ROUND(COALESCE(LB.total_paid, 0) - COALESCE(LB.total_due, 0), 2) AS balance
         FROM Apartment A
-        LEFT JOIN Lease   L ON L.apartment_id = A.id
+        LEFT JOIN Lease   L ON L.id = A.current_lease_id
         LEFT JOIN Tenant  T ON T.id = L.tenant_id
+        LEFT JOIN LeaseBalance LB ON LB.lease_id = L.id
         WHERE 1=1
     """
     args: list[str] = []
@@ -48,121 +51,93 @@ def units_overview() -> str:
     return render_template("units_overview.html", data=data)
 
 
-@unit_bp.route("/unit/<int:unit_id>")
-def unit_detail(unit_id: int) -> Union[str, Tuple[str, int]]: # pylint: disable=too-many-locals
-    """Display detailed information about a specific unit."""
-    db = get_db()
-    lease_info = db.execute(
+RECENT_LIMIT = 6
+
+
+def load_unit_detail(db: sqlite3.Connection, unit_id: int) -> Optional[Dict[str, Any]]:
+    """Load a unit's current lease and balance, bills and payments with one query each."""
+    row = db.execute(
         """
         SELECT A.id AS apartment_id, A.unit_number, A.unit_size, A.ownership_type, A.is_special,
             T.full_name, T.email,
-            L.monthly_rent, L.start_date, L.end_date, L.id AS lease_id
+            L.monthly_rent, L.start_date, L.end_date, L.id AS lease_id,
+            ROUND(COALESCE(LB.total_paid, 0) - COALESCE(LB.total_due, 0), 2) AS balance
         FROM Apartment A
-        JOIN Lease L ON L.apartment_id = A.id
+        JOIN Lease L ON L.id = A.current_lease_id
         JOIN Tenant T ON T.id = L.tenant_id
+        LEFT JOIN LeaseBalance LB ON LB.lease_id = L.id
         WHERE A.id = ?
-        ORDER BY L.start_date DESC LIMIT 1
     """,
         (unit_id,),
     ).fetchone()
+    if row is None:
+        return None
 
-    if lease_info is None:
-        return f"No lease data found for unit {unit_id}", 404
-
-    if lease_info["ownership_type"].lower() == "sold":
-        lease_info["monthly_rent"] = 0.0
-
-    lease_id = lease_info["lease_id"]
+    lease = dict(row)
+    if lease["ownership_type"].lower() == "sold":
+        lease["monthly_rent"] = 0.0
 
     bills = db.execute(
         """
-        SELECT id, sent_at, total_amount
+        SELECT id, billing_month, rent_amount, total_amount, sent_at
         FROM Bill
         WHERE lease_id = ?
         ORDER BY sent_at DESC
-        LIMIT 6
     """,
-        (lease_id,),
+        (lease["lease_id"],),
     ).fetchall()
-
-    all_bills = db.execute(
+    payments = db.execute(
         """
-        SELECT id, sent_at, total_amount
-        FROM Bill
-        WHERE lease_id = ?
-        ORDER BY sent_at DESC
+        SELECT P.id, P.payment_date, P.amount
+        FROM Payment P
+        JOIN Bill B ON B.id = P.bill_id
+        WHERE B.lease_id = ?
+        ORDER BY P.payment_date DESC
     """,
-        (lease_id,),
+        (lease["lease_id"],),
     ).fetchall()
 
-    bill_options = db.execute(
-        """
-        SELECT id, billing_month, rent_amount, total_amount
-        FROM Bill
-        WHERE lease_id = ?
-        ORDER BY billing_month DESC
-    """,
-        (lease_id,),
-    ).fetchall()
+    return {
+        "lease": lease,
+        "balance": lease.pop("balance"),
+        "bills": bills[:RECENT_LIMIT],
+        "payments": payments[:RECENT_LIMIT],
+        "all_bills": bills,
+        "all_payments": payments,
+        "bill_years": sorted({b["sent_at"].year for b in bills}),
+        "payment_years": sorted({p["payment_date"].year for p in payments}),
+        "bill_options": sorted(bills, key=lambda b: b["billing_month"], reverse=True),
+        "apartment_id": lease["apartment_id"],
+    }
 
-    bill_years = sorted(set(b["sent_at"].year for b in all_bills))
 
-    payments = db.execute(
-        """
-        SELECT id, payment_date, amount
-        FROM Payment
-        WHERE bill_id IN (
-            SELECT id FROM Bill WHERE lease_id = ?
-        )
-        ORDER BY payment_date DESC
-        LIMIT 6
-    """,
-        (lease_id,),
-    ).fetchall()
+@unit_bp.route("/unit/<int:unit_id>")
+def unit_detail(unit_id: int) -> Union[str, Tuple[str, int]]:
+    """Display detailed information about a specific unit."""
+    detail = load_unit_detail(get_db(), unit_id)
+    if detail is None:
+        return f"No lease data found for unit {unit_id}", 404
+    return render_template("unit_detail.html", **detail)
 
-    all_payments = db.execute(
-        """
-        SELECT id, payment_date, amount
-        FROM Payment
-        WHERE bill_id IN (
-            SELECT id FROM Bill WHERE lease_id = ?
-        )
-        ORDER BY payment_date DESC
-    """,
-        (lease_id,),
-    ).fetchall()
 
-    payment_years = sorted(set(p["payment_date"].year for p in all_payments))
-    all_bills_calc = db.execute(
-        "SELECT rent_amount, other_charges FROM Bill WHERE lease_id = ?", (lease_id,)
-    ).fetchall()
+def _jsonable(value: Any) -> Any:
+    """Convert rows and dates in loader output to JSON-friendly values."""
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (dict, sqlite3.Row)):
+        return {k: _jsonable(value[k]) for k in value.keys()}
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
 
-    total_due: float = 0.0
-    for bill in all_bills_calc:
-        total_due += bill["rent_amount"]
-        if bill["other_charges"]:
-            try:
-                charges: Dict[str, float] = json.loads(bill["other_charges"])
-                total_due += sum(float(v) for v in charges.values())  # pragma: no cover
-            except json.JSONDecodeError:  # pragma: no cover
-                pass  # pragma: no cover
-
-    total_paid: float = sum(p["amount"] for p in all_payments)
-    balance: float = round(total_paid - total_due, 2)
-
-    return render_template(
-        "unit_detail.html",
-        lease=lease_info,
-        balance=balance,
-        bills=bills,
-        payments=payments,
-        all_bills=all_bills,
-        all_payments=all_payments,
-        payment_years=payment_years,
-        bill_years=bill_years,
-        apartment_id=lease_info["apartment_id"],
-        bill_options=bill_options,
-    )
+
+@unit_bp.route("/unit/<int:unit_id>/data")
+def unit_detail_data(unit_id: int) -> Any:
+    """Return the unit detail page's data as JSON."""
+    detail = load_unit_detail(get_db(), unit_id)
+    if detail is None:
+        return jsonify(error=f"No lease data found for unit {unit_id}"), 404
+    return jsonify(_jsonable(detail))
 
 
 @unit_bp.route("/unit/<int:unit_id>/update-lease", methods=["POST"])
@@ -174,12 +149,10 @@ def update_lease(unit_id: int) -> Tuple[str, int]:
     lease = db.execute(
         """
         SELECT L.id AS lease_id, T.id AS tenant_id
-        FROM Lease L
-        JOIN Apartment A ON L.apartment_id = A.id
+        FROM Apartment A
+        JOIN Lease L ON L.id = A.current_lease_id
         JOIN Tenant T ON L.tenant_id = T.id
         WHERE A.id = ?
-        ORDER BY L.start_date DESC
-        LIMIT 1
     """,
         (unit_id,),
     ).fetchone()
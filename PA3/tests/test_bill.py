@@ -48,11 +48,11 @@ class DummyDB:
         self.rows = rows or []
         self.fail = fail
         self.committed = False
+        self.queries: list[tuple[str, Any]] = []
 
     def execute(self, query: str, args: Any = None) -> DummyCursor:
         """Simulate executing a SQL query."""
-        print(query)
-        print(args)
+        self.queries.append((query, args))
         if self.fail:
             raise sqlite3.DatabaseError("Simulated DB error")
         return DummyCursor(self.rows)
@@ -93,21 +93,15 @@ def client(app: Flask) -> FlaskClient: # pylint: disable=redefined-outer-name
 def test_bill_payment_dashboard_filters(
     monkeypatch: Any, client: FlaskClient, qs: str # pylint: disable=redefined-outer-name
 ) -> None:
-    """Test filtering logic on the bill payment dashboard."""
+    """Test that the dashboard filters in SQL and renders what the query returns."""
     rows = [
-        {
-            "apartment_id": 1,
-            "unit_number": "101",
-            "ownership_type": "sold",
-            "is_special": 0,
-            "full_name": "Alice",
-        },
         {
             "apartment_id": 2,
             "unit_number": "102",
             "ownership_type": "rent_controlled",
             "is_special": 1,
             "full_name": "Bob",
+            "outstanding": 250.0,
         },
     ]
     dummy = DummyDB(rows=rows)
@@ -117,9 +111,13 @@ def test_bill_payment_dashboard_filters(
     assert resp.status_code == 200
     text = resp.get_data(as_text=True)
 
-    # '101' should always be filtered out (sold), and '102' always shown
+    # sold units are excluded by the query itself, not after fetching
+    query, args = dummy.queries[0]
+    assert "A.ownership_type <> 'sold'" in query
+    assert args[-1] == 51  # one page plus one row to detect the next page
     assert "102" in text
-    assert "101" not in text
+    assert "$250.00" in text
+    assert "Next page" not in text
 
 
 def test_create_and_detail_and_payment_paths( # pylint: disable=too-many-locals,too-many-statements
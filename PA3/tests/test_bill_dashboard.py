@@ -0,0 +1,44 @@
+"""Tests for the bill payment dashboard against the test database."""
+from flask import Flask
+from flask.testing import FlaskClient
+
+from flaskr.db import get_db  # pylint: disable=import-error
+from flaskr.ledger import rebuild_lease_balances  # pylint: disable=import-error
+
+
+def test_dashboard_pages_current_leases(client: FlaskClient, app: Flask) -> None:
+    """Test current-lease-only rows, outstanding balances and keyset pages."""
+    app.config["DASHBOARD_PAGE_SIZE"] = 2
+    with app.app_context():
+        db = get_db()
+        db.executescript(
+            """
+            INSERT INTO Apartment (id, unit_number, unit_size, ownership_type, is_special)
+            VALUES (3, '103', 500, 'market', 0), (4, '104', 500, 'market', 1);
+            INSERT INTO Tenant (id, full_name, email)
+            VALUES (3, 'Carol', 'carol@example.com'), (4, 'Dan', 'dan@example.com'),
+                   (5, 'Old Tenant', 'old@example.com');
+            INSERT INTO Lease (id, apartment_id, tenant_id, start_date, end_date, monthly_rent)
+            VALUES (3, 3, 3, '2025-01-01', '2025-12-31', 900),
+                   (4, 4, 4, '2025-01-01', '2025-12-31', 950),
+                   (5, 2, 5, '2020-01-01', '2020-12-31', 1000);
+            INSERT INTO Bill (lease_id, billing_month, rent_amount, other_charges,
+                balance_used, total_amount)
+            VALUES (2, '2025-06-01', 1300, NULL, 0, 1300);
+            """
+        )
+        rebuild_lease_balances(db)
+
+    page = client.get("/bill-payment").get_data(as_text=True)
+    assert "101" not in page  # sold
+    assert "Old Tenant" not in page  # superseded lease of unit 102
+    assert "Bob" in page and "$1300.00" in page
+    assert "Carol" in page and "Dan" not in page
+    assert "after_unit=103" in page and "after_id=3" in page
+
+    page = client.get("/bill-payment?after_unit=103&after_id=3").get_data(as_text=True)
+    assert "Dan" in page and "Bob" not in page and "Carol" not in page
+    assert "Next page" not in page
+
+    page = client.get("/bill-payment?special=1").get_data(as_text=True)
+    assert "Dan" in page and "Carol" not in page
@@ -0,0 +1,71 @@
+"""Tests for the Apartment.current_lease_id pointer."""
+from flask import Flask
+from flask.testing import FlaskClient
+
+from flaskr.db import get_db  # pylint: disable=import-error
+
+
+def _current_lease(app: Flask, unit_id: int) -> int:
+    with app.app_context():
+        return get_db().execute(
+            "SELECT current_lease_id FROM Apartment WHERE id = ?", (unit_id,)
+        ).fetchone()[0]
+
+
+def _add_old_and_new_leases(app: Flask) -> None:
+    """Give unit 2 an expired lease and a newer one."""
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO Tenant (id, full_name, email) VALUES (3, 'Carol', 'carol@example.com')"
+        )
+        db.executemany(
+            """
+            INSERT INTO Lease (id, apartment_id, tenant_id, start_date, end_date, monthly_rent)
+            VALUES (?, 2, ?, ?, ?, ?)
+            """,
+            [
+                (3, 1, "2023-01-01", "2023-12-31", 1100),
+                (4, 3, "2026-01-01", "2026-12-31", 1400),
+            ],
+        )
+        db.commit()
+
+
+def test_pointer_follows_latest_lease(app: Flask) -> None:
+    """Test that the triggers keep the pointer on the latest lease."""
+    assert _current_lease(app, 2) == 2
+    _add_old_and_new_leases(app)
+    assert _current_lease(app, 2) == 4
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE Lease SET start_date = '2022-01-01' WHERE id = 4")
+        db.commit()
+    assert _current_lease(app, 2) == 2
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE Lease SET apartment_id = 1 WHERE id = 2")
+        db.commit()
+    assert _current_lease(app, 2) == 3
+    assert _current_lease(app, 1) == 2
+
+    with app.app_context():
+        db = get_db()
+        db.execute("DELETE FROM Lease WHERE id IN (3, 4)")
+        db.commit()
+    assert _current_lease(app, 2) is None
+
+
+def test_listings_show_one_row_per_unit(client: FlaskClient, app: Flask) -> None:
+    """Test that lease history does not duplicate units in the listings."""
+    _add_old_and_new_leases(app)
+
+    html = client.get("/units").data.decode()
+    assert html.count("<h3>102</h3>") == 1
+    assert "Carol" in html
+    assert "Bob" not in html
+
+    detail = client.get("/unit/2/data").get_json()
+    assert detail["lease"]["lease_id"] == 4
@@ -1,13 +1,16 @@
 """Unit tests for database-related functionality."""
 
 import io
+import os
 import sqlite3
 from unittest.mock import patch
 
 import pytest
 from flask import Flask
 
-from flaskr.db import close_db, get_db, init_db  # pylint: disable=import-error
+from flaskr import create_app  # pylint: disable=import-error
+from flaskr.db import SCHEMA_VERSION, close_db, get_db, init_db  # pylint: disable=import-error
+from flaskr.ledger import rebuild_lease_balances  # pylint: disable=import-error
 
 
 def test_get_db_returns_same_connection(app: Flask) -> None:
@@ -49,3 +52,95 @@ def test_init_db_with_string_content(app: Flask) -> None:
             ).fetchone()
             assert result is not None
             assert result["name"] == "test_string"
+
+
+# The tables as the first schema.sql created them, before any migration.
+BASELINE_SCHEMA = """
+CREATE TABLE Apartment (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  unit_number TEXT NOT NULL,
+  unit_size INTEGER NOT NULL,
+  ownership_type TEXT NOT NULL,
+  is_special BOOLEAN NOT NULL DEFAULT FALSE
+);
+CREATE TABLE Tenant (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  full_name TEXT NOT NULL,
+  email TEXT NOT NULL UNIQUE
+);
+CREATE TABLE Lease (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  tenant_id INTEGER NOT NULL,
+  apartment_id INTEGER NOT NULL,
+  start_date DATE,
+  end_date DATE,
+  monthly_rent DECIMAL(10,2)
+);
+CREATE TABLE Bill (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  lease_id INTEGER NOT NULL,
+  billing_month DATE NOT NULL,
+  rent_amount DECIMAL(10,2) NOT NULL,
+  other_charges TEXT,
+  balance_used DECIMAL(10,2) NOT NULL,
+  total_amount DECIMAL(10,2) NOT NULL,
+  sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE Payment (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  bill_id INTEGER NOT NULL,
+  amount DECIMAL(10,2) NOT NULL,
+  payment_date DATE NOT NULL,
+  check_number TEXT,
+  remitter_name TEXT NOT NULL
+);
+"""
+
+
+def test_create_app_migrates_baseline_database(tmp_path) -> None:
+    """Test that an app started on a pre-migration database serves every view."""
+    db_file = tmp_path / "baseline.sqlite"
+    conn = sqlite3.connect(db_file)
+    with open(os.path.join(os.getcwd(), "tests", "data.sql"), encoding="utf8") as f:
+        conn.executescript(BASELINE_SCHEMA + f.read())
+    conn.close()
+
+    app = create_app({"TESTING": True, "DATABASE": str(db_file)})
+    client = app.test_client()
+    for path in ("/units", "/unit/2", "/bill-payment", "/units/export"):
+        assert client.get(path).status_code == 200, path
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert db.execute(
+            "SELECT current_lease_id FROM Apartment WHERE id = 2"
+        ).fetchone()[0] == 2
+
+
+def test_migration_backfills_lease_balances(tmp_path) -> None:
+    """Test that migration 1 fills LeaseBalance as the ledger would rebuild it."""
+    db_file = tmp_path / "baseline.sqlite"
+    conn = sqlite3.connect(db_file)
+    with open(os.path.join(os.getcwd(), "tests", "data.sql"), encoding="utf8") as f:
+        conn.executescript(BASELINE_SCHEMA + f.read())
+    conn.executemany(
+        "INSERT INTO Bill (lease_id, billing_month, rent_amount, other_charges,"
+        " balance_used, total_amount) VALUES (?, '2024-01-01', 1000, ?, 0, 1000)",
+        [(1, '{"water": 10, "gas": "5.5"}'), (1, "{oops"), (2, "[1, 2]"), (2, None)],
+    )
+    conn.execute(
+        "INSERT INTO Payment (bill_id, amount, payment_date, remitter_name)"
+        " VALUES (1, 400, '2024-01-05', 'Tenant')"
+    )
+    conn.commit()
+    conn.close()
+
+    app = create_app({"TESTING": True, "DATABASE": str(db_file)})
+    with app.app_context():
+        db = get_db()
+        query = "SELECT lease_id, total_due, total_paid FROM LeaseBalance ORDER BY lease_id"
+        migrated = [tuple(row) for row in db.execute(query)]
+        rebuild_lease_balances(db)
+        assert migrated == [tuple(row) for row in db.execute(query)]
+        assert migrated[0] == (1, 2015.5, 400)
@@ -0,0 +1,120 @@
+"""Tests for the lease balance ledger."""
+from flask import Flask
+from flask.testing import FlaskClient, FlaskCliRunner
+
+from flaskr.db import get_db  # pylint: disable=import-error
+from flaskr.ledger import charges_total, verify_lease_balances  # pylint: disable=import-error
+
+
+def _balance(app: Flask, lease_id: int) -> float:
+    with app.app_context():
+        row = get_db().execute(
+            "SELECT ROUND(total_paid - total_due, 2) FROM LeaseBalance WHERE lease_id = ?",
+            (lease_id,),
+        ).fetchone()
+    return row[0]
+
+
+def test_bills_and_payments_update_balance(client: FlaskClient, app: Flask) -> None:
+    """Test that create_bill and create_payment maintain the balance incrementally."""
+    bill = {
+        "billing_month": "2025-06",
+        "rent_amount": 1300,
+        "other_charges": {"water": 20.5, "parking": 50},
+        "balance_used": 0,
+        "total_amount": 1370.5,
+    }
+    assert client.post("/unit/2/create-bill", json=bill).status_code == 200
+    assert _balance(app, 2) == -1370.5
+
+    with app.app_context():
+        bill_id = get_db().execute("SELECT id FROM Bill WHERE lease_id = 2").fetchone()[0]
+    payment = {
+        "bill_id": bill_id,
+        "amount": 1000,
+        "payment_date": "2025-06-10",
+        "check_number": "1",
+        "remitter_name": "Bob",
+    }
+    assert client.post("/unit/2/create-payment", json=payment).status_code == 200
+    assert _balance(app, 2) == -370.5
+
+    data = client.get("/unit/2/data").get_json()
+    assert data["balance"] == -370.5
+    assert "$-370.50" in client.get("/units").get_data(as_text=True)
+    with app.app_context():
+        assert verify_lease_balances(get_db()) == []
+
+
+def test_payment_stores_the_parsed_amount(client: FlaskClient, app: Flask) -> None:
+    """Test that the Payment row and the ledger record the same parsed amount."""
+    bill = {
+        "billing_month": "2025-01",
+        "rent_amount": 1300,
+        "other_charges": {},
+        "balance_used": 0,
+        "total_amount": 1300,
+    }
+    assert client.post("/unit/2/create-bill", json=bill).status_code == 200
+    with app.app_context():
+        bill_id = get_db().execute("SELECT id FROM Bill WHERE lease_id = 2").fetchone()[0]
+    payment = {
+        "bill_id": bill_id,
+        "amount": "1_000",
+        "payment_date": "2025-01-10",
+        "check_number": "7",
+        "remitter_name": "Bob",
+    }
+    assert client.post("/unit/2/create-payment", json=payment).status_code == 200
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute("SELECT amount FROM Payment").fetchone()[0] == 1000
+        assert verify_lease_balances(db) == []
+
+
+def test_rebuild_and_verify_command(app: Flask, runner: FlaskCliRunner) -> None:
+    """Test that verify reports drift and rebuild repairs it."""
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            """
+            INSERT INTO Bill (lease_id, billing_month, rent_amount, other_charges,
+                balance_used, total_amount)
+            VALUES (1, '2025-01-01', 1200, '{"fee": 5}', 0, 1205)
+            """
+        )
+        db.commit()
+
+    result = runner.invoke(args=["rebuild-lease-balances", "--verify"])
+    assert result.exit_code == 1
+    assert "Lease 1: stored 0.00, expected -1205.00" in result.output
+
+    result = runner.invoke(args=["rebuild-lease-balances"])
+    assert "Rebuilt 2 lease balances." in result.output
+    assert _balance(app, 1) == -1205
+    assert runner.invoke(args=["rebuild-lease-balances", "--verify"]).exit_code == 0
+
+
+def test_charges_total() -> None:
+    """Test that malformed JSON, non-object charges and non-numeric values count as zero."""
+    assert charges_total('{"a": 1, "b": "2.5"}') == 3.5
+    assert charges_total(None) == 0.0
+    assert charges_total("not-json") == 0.0
+    assert charges_total("[1, 2]") == 0.0
+    assert charges_total('{"a": 1, "b": "n/a", "c": null, "d": [2]}') == 1.0
+
+
+def test_create_bill_skips_non_numeric_charges(client: FlaskClient, app: Flask) -> None:
+    """Test that a non-numeric charge does not fail the bill or drift the balance."""
+    bill = {
+        "billing_month": "2025-06",
+        "rent_amount": 1300,
+        "other_charges": {"water": 20.5, "parking": "TBD"},
+        "balance_used": 0,
+        "total_amount": 1320.5,
+    }
+    assert client.post("/unit/2/create-bill", json=bill).status_code == 200
+    assert _balance(app, 2) == -1320.5
+    with app.app_context():
+        assert verify_lease_balances(get_db()) == []
@@ -0,0 +1,52 @@
+"""Tests for the queued JSON logging pipeline."""
+import io
+import json
+import logging
+
+import pytest
+from flask import Flask
+
+from flaskr.logs import JsonFormatter, LogPipeline, init_logging  # pylint: disable=import-error
+
+
+def test_pipeline_writes_json_with_extra_fields(app: Flask) -> None:
+    """Test that the listener thread writes records as JSON with the endpoint."""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    pipeline = LogPipeline(handler)
+    logger = logging.getLogger("flaskr.test_logs")
+    logger.addHandler(pipeline.handler)
+    try:
+        with app.test_request_context("/units"):
+            logger.warning("Unit %s missing", 9, extra={"unit_id": 9})
+    finally:
+        logger.removeHandler(pipeline.handler)
+        pipeline.stop()
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "Unit 9 missing"
+    assert entry["unit_id"] == 9
+    assert entry["endpoint"] == "unit.units_overview"
+
+
+def test_create_bill_logs_email_instead_of_printing(
+    client, app: Flask, caplog: pytest.LogCaptureFixture, capsys: pytest.CaptureFixture
+) -> None:
+    """Test that the simulated email is one structured log record."""
+    assert init_logging(app) is not None
+    with caplog.at_level(logging.INFO, logger="flaskr.views.bill"):
+        resp = client.post(
+            "/unit/1/create-bill",
+            json={
+                "billing_month": "2025-06",
+                "rent_amount": 1200,
+                "other_charges": {},
+                "balance_used": 0,
+                "total_amount": 1200,
+            },
+        )
+    assert resp.status_code == 200
+    record = next(r for r in caplog.records if r.name == "flaskr.views.bill")
+    assert record.to == "alice@example.com"  # type: ignore[attr-defined]
+    assert record.total_amount == 1200  # type: ignore[attr-defined]
+    assert capsys.readouterr().out == ""
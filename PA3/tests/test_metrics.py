@@ -0,0 +1,72 @@
+"""Tests for request metrics and the /metrics endpoint."""
+# pylint: disable=redefined-outer-name
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from flaskr import create_app  # pylint: disable=import-error
+from flaskr.metrics import RequestMetrics  # pylint: disable=import-error
+
+UNITS_GET = 'endpoint="unit.units_overview",method="GET"'
+
+
+@pytest.fixture
+def app(app: Flask) -> Flask:
+    """Serve the test database from an app with metrics enabled."""
+    return create_app(
+        {"TESTING": True, "DATABASE": app.config["DATABASE"], "METRICS_ENABLED": True}
+    )
+
+
+def test_metrics_endpoint_reports_requests(client: FlaskClient) -> None:
+    """Test that status counts and latency histograms are exported."""
+    client.get("/units")
+    client.get("/no-such-page")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.content_type.startswith("text/plain; version=0.0.4")
+    body = resp.get_data(as_text=True)
+    assert f'pa3_http_responses_total{{{UNITS_GET},status="200"}} 1' in body
+    assert 'pa3_http_responses_total{endpoint="<unmatched>",method="GET",status="404"} 1' in body
+    assert f"pa3_http_request_duration_seconds_count{{{UNITS_GET}}} 1" in body
+    assert "pa3_http_requests_in_flight 1" in body
+
+
+def test_db_time_needs_instrumentation(app: Flask) -> None:
+    """Test that per-request DB time is exported when DB_INSTRUMENT is on."""
+    app.config["DB_INSTRUMENT"] = True
+    client = app.test_client()
+    client.get("/units")
+    body = client.get("/metrics").get_data(as_text=True)
+    assert f"pa3_db_request_duration_seconds_count{{{UNITS_GET}}} 1" in body
+    assert "pa3_db_slow_queries_total 0" in body
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    """Test that exported buckets accumulate and end with +Inf."""
+    metrics = RequestMetrics()
+    for seconds in (0.001, 0.02, 20.0):
+        metrics.started()
+        metrics.finished("view", "GET", 200, seconds, None)
+    lines = metrics.render()
+    buckets = [
+        line for line in lines if line.startswith("pa3_http_request_duration_seconds_bucket")
+    ]
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts)
+    assert buckets[-1].endswith('le="+Inf"} 3')
+    assert "pa3_http_requests_in_flight 0" in lines
+
+
+def test_metrics_are_off_by_default(app: Flask) -> None:
+    """Test that /metrics is not served unless METRICS_ENABLED is on."""
+    disabled = create_app({"TESTING": True, "DATABASE": app.config["DATABASE"]})
+    assert disabled.test_client().get("/metrics").status_code == 404
+
+
+def test_metrics_token_is_required_when_set(app: Flask) -> None:
+    """Test that METRICS_TOKEN gates /metrics behind a bearer token."""
+    app.config["METRICS_TOKEN"] = "secret"
+    client = app.test_client()
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code == 200
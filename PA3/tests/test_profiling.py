@@ -0,0 +1,54 @@
+"""Tests for the sampling request profiler."""
+import sys
+import time
+
+from flask import Flask
+
+from flaskr import create_app  # pylint: disable=import-error
+from flaskr.profiling import PROFILE_HEADER, collapse_stack  # pylint: disable=import-error
+
+
+def test_profiling_is_off_by_default(client, app: Flask) -> None:
+    """Test that no sampler is created unless profiling is configured."""
+    client.get("/units", headers={PROFILE_HEADER: "anything"})
+    assert "stack_sampler" not in app.extensions
+
+
+def test_token_header_profiles_request(app: Flask, tmp_path) -> None:
+    """Test that a request sending the token is written as collapsed stacks."""
+    profiled = create_app(
+        {
+            "DATABASE": app.config["DATABASE"],
+            "PROFILE_TOKEN": "secret",
+            "PROFILE_DIR": str(tmp_path / "profiles"),
+            "PROFILE_INTERVAL": 0.001,
+        }
+    )
+
+    @profiled.route("/slow")
+    def slow() -> str:
+        deadline = time.monotonic() + 0.05
+        while time.monotonic() < deadline:
+            pass
+        return "done"
+
+    client = profiled.test_client()
+    client.get("/slow", headers={PROFILE_HEADER: "wrong"})
+    assert "stack_sampler" not in profiled.extensions
+
+    assert client.get("/slow", headers={PROFILE_HEADER: "secret"}).status_code == 200
+    sampler = profiled.extensions["stack_sampler"]
+    assert sampler.profiled == 1
+    sampler.flush()
+
+    lines = (tmp_path / "profiles" / "slow.folded").read_text(encoding="utf8").splitlines()
+    assert lines
+    assert all(line.startswith("slow;") for line in lines)
+    assert any("slow (test_profiling.py:" in line for line in lines)
+
+
+def test_collapse_stack_is_outermost_first() -> None:
+    """Test that the current function is the last collapsed frame."""
+    names = collapse_stack(sys._getframe())  # pylint: disable=protected-access
+    assert names[-1].startswith("test_collapse_stack_is_outermost_first (test_profiling.py:")
+    assert all(";" not in name for name in names)
@@ -0,0 +1,134 @@
+"""Query-plan regression checks for every view's SQL, and schema migrations."""
+from typing import Dict, Set
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskCliRunner
+
+from flaskr.db import SCHEMA_VERSION, get_db  # pylint: disable=import-error
+from flaskr.querystats import QueryStats  # pylint: disable=import-error
+
+# Listing pages show every unit, so they may scan the one table driving the
+# join; everything they join to, and every other view, must use an index.
+LISTING_ENDPOINTS = {"unit.units_overview", "bill.bill_payment_dashboard", "export.export_units"}
+# Views that run no SQL.
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+NO_SQL_ENDPOINTS = {"static", "metrics", "main.index", "main.dashboard"}
+
+
+def _exercise_views(app: Flask) -> None:
+    """Hit every view, with a bill and a payment on file, so its SQL is recorded."""
+    client = app.test_client()
+    bill = {
+        "billing_month": "2025-06",
+        "rent_amount": 1300,
+        "other_charges": {"water": 20},
+        "balance_used": 0,
+        "total_amount": 1320,
+    }
+    assert client.post("/unit/2/create-bill", json=bill).status_code == 200
+    payment = {
+        "bill_id": 1,
+        "amount": 100,
+        "payment_date": "2025-06-10",
+        "check_number": "1",
+        "remitter_name": "Bob",
+    }
+    assert client.post("/unit/2/create-payment", json=payment).status_code == 200
+    lease = {
+        "tenant_name": "Bob",
+        "tenant_email": "bob@example.com",
+        "start_date": "2025-01-01",
+        "end_date": "2025-12-31",
+        "monthly_rent": 1300,
+        "ownership_type": "market",
+        "is_special": 0,
+    }
+    assert client.post("/unit/2/update-lease", json=lease).status_code == 200
+    for url in (
+        "/units?search=bob&ownership=market&special=1",
+        "/unit/2",
+        "/unit/2/data",
+        "/bill/1",
+        "/payment/1",
+        "/bill-payment?search=bob&ownership=market&special=1",
+        "/units/export",
+    ):
+        assert client.get(url).status_code == 200, url
+
+
+def test_view_queries_use_indexes(app: Flask, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that no view's SQL falls back to an unexpected full table scan."""
+    statements: Dict[str, Set[str]] = {}
+    observe = QueryStats.observe
+
+    def record(self: QueryStats, sql: str, seconds: float, rows: int, endpoint: str) -> None:
+        statements.setdefault(sql, set()).add(endpoint)
+        observe(self, sql, seconds, rows, endpoint)
+
+    monkeypatch.setattr(QueryStats, "observe", record)
+    app.config["DB_INSTRUMENT"] = True
+    _exercise_views(app)
+
+    covered = set().union(*statements.values())
+    missing = set(app.view_functions) - NO_SQL_ENDPOINTS - covered
+    assert not missing, f"add these views to _exercise_views: {missing}"
+    app.config["DB_INSTRUMENT"] = False
+
+    scans = {}
+    with app.app_context():
+        db = get_db()
+        for sql in list(statements):
+            if not sql.lstrip().upper().startswith(EXPLAINABLE):
+                continue
+            plan = db.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * sql.count("?")).fetchall()
+            table_scans = [row[3] for row in plan if row[3].startswith("SCAN")]
+            allowed = 1 if statements[sql] <= LISTING_ENDPOINTS else 0
+            if len(table_scans) > allowed:
+                scans[sql] = table_scans
+    assert not scans
+
+
+def test_migrate_db_upgrades_old_database(app: Flask, runner: FlaskCliRunner) -> None:
+    """Test that migrate-db rebuilds what schema.sql creates on a pre-index database."""
+    objects_sql = (
+        "SELECT type, name FROM sqlite_master "
+        "WHERE type IN ('table', 'index', 'trigger') AND name NOT LIKE 'sqlite_%'"
+    )
+    with app.app_context():
+        db = get_db()
+        expected = set(db.execute(objects_sql).fetchall())
+        db.execute(
+            """
+            INSERT INTO Bill (lease_id, billing_month, rent_amount, other_charges,
+                balance_used, total_amount)
+            VALUES (1, '2025-01-01', 1200, NULL, 0, 1200)
+            """
+        )
+        for (name,) in db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+        ).fetchall():
+            db.execute(f"DROP INDEX {name}")
+        db.execute("DROP TABLE LeaseBalance")
+        for (name,) in db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        ).fetchall():
+            db.execute(f"DROP TRIGGER {name}")
+        db.execute("UPDATE Apartment SET current_lease_id = NULL")
+        db.execute("PRAGMA user_version = 0")
+        db.commit()
+
+    result = runner.invoke(args=["migrate-db"])
+    assert f"Applied {SCHEMA_VERSION} migrations" in result.output
+    assert "Applied 0 migrations" in runner.invoke(args=["migrate-db"]).output
+
+    with app.app_context():
+        db = get_db()
+        assert set(db.execute(objects_sql).fetchall()) == expected
+        assert db.execute(
+            "SELECT total_due FROM LeaseBalance WHERE lease_id = 1"
+        ).fetchone()[0] == 1200
+        assert db.execute(
+            "SELECT current_lease_id FROM Apartment WHERE id = 2"
+        ).fetchone()[0] == 2
+        assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
@@ -0,0 +1,59 @@
+"""Tests for SQL timing instrumentation and the slow-query log."""
+import logging
+import sqlite3
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from flaskr.db import get_db  # pylint: disable=import-error
+from flaskr.querystats import (  # pylint: disable=import-error
+    get_query_stats,
+    normalize_sql,
+    request_query_totals,
+)
+
+
+def test_instrumentation_is_off_by_default(client: FlaskClient, app: Flask) -> None:
+    """Test that no statistics or Server-Timing header are produced by default."""
+    resp = client.get("/units")
+    assert "Server-Timing" not in resp.headers
+    assert get_query_stats(app) is None
+    with app.app_context():
+        assert type(get_db()) is sqlite3.Connection  # pylint: disable=unidiomatic-typecheck
+
+
+def test_statements_are_timed_per_endpoint(app: Flask) -> None:
+    """Test per-statement counters and the per-request header."""
+    app.config["DB_INSTRUMENT"] = True
+    resp = app.test_client().get("/units")
+    assert resp.headers["Server-Timing"].startswith("db;dur=")
+
+    stats = get_query_stats(app)
+    assert stats is not None
+    entries = stats.metrics()["statements"].values()
+    assert any(entry["endpoints"] == {"unit.units_overview": entry["calls"]} for entry in entries)
+
+    with app.test_request_context("/"):
+        get_db().execute("SELECT 1").fetchone()
+        get_db().execute("SELECT 2").fetchall()
+        assert request_query_totals()["count"] == 2
+
+
+def test_slow_queries_are_logged_with_plan(
+    app: Flask, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test that statements over the threshold are logged with their query plan."""
+    app.config.update(DB_INSTRUMENT=True, DB_SLOW_QUERY_MS=0)
+    with caplog.at_level(logging.WARNING, logger="flaskr.querystats"):
+        with app.app_context():
+            get_db().execute("SELECT * FROM Apartment WHERE id = ?", (1,)).fetchone()
+
+    message = next(r.getMessage() for r in caplog.records if "id = ?" in r.getMessage())
+    assert message.startswith("Slow query")
+    assert "INTEGER PRIMARY KEY" in message
+
+
+def test_normalize_sql() -> None:
+    """Test that formatting differences collapse to one statement key."""
+    assert normalize_sql("SELECT  *\n   FROM t") == normalize_sql("SELECT * FROM t")
@@ -6,6 +6,8 @@ from typing import Any, Optional
 import pytest
 from flask.testing import FlaskClient
 
+from flaskr.db import get_db  # pylint: disable=import-error
+from flaskr.ledger import rebuild_lease_balances  # pylint: disable=import-error
 from flaskr.views import unit as unit_module  # pylint: disable=import-error
 
 
@@ -89,7 +91,7 @@ def test_unit_detail_and_balance(monkeypatch: Any, client: FlaskClient) -> None:
     monkeypatch.setattr(unit_module, "get_db", lambda: db)
     assert client.get("/unit/99").status_code == 404
 
-    # valid path + invalid JSON to hit except branch
+    # valid path
     lease = [
         {
             "apartment_id": 2,
@@ -103,18 +105,21 @@ def test_unit_detail_and_balance(monkeypatch: Any, client: FlaskClient) -> None:
             "start_date": datetime.datetime(2025, 1, 1),
             "end_date": datetime.datetime(2025, 12, 31),
             "lease_id": 2,
+            "balance": -800.0,
         }
     ]
     seq = [
         lease,  # lease_info
-        [],
-        [],
-        [],  # bills, all_bills, bill_options
-        [],
-        [],  # payments, all_payments
         [
-            {"rent_amount": 800, "other_charges": "not-a-json"}
-        ],  # all_bills_calc, triggers except
+            {
+                "id": 5,
+                "billing_month": datetime.date(2025, 2, 1),
+                "rent_amount": 800,
+                "total_amount": 800,
+                "sent_at": datetime.datetime(2025, 2, 1, 9, 0),
+            }
+        ],  # bills
+        [],  # payments
     ]
     db = SeqDB(seq)
     monkeypatch.setattr(unit_module, "get_db", lambda: db)
@@ -153,3 +158,42 @@ def test_dummydb_commit_sets_flag() -> None:
     assert not dummy.committed
     dummy.commit()
     assert dummy.committed
+
+
+def test_unit_detail_data_single_pass(client: FlaskClient, app: Any) -> None:
+    """Test the JSON endpoint derives recent lists, facets and balance from one load."""
+    with app.app_context():
+        db = get_db()
+        for month in range(1, 9):
+            db.execute(
+                """
+                INSERT INTO Bill (lease_id, billing_month, rent_amount, other_charges,
+                    balance_used, total_amount, sent_at)
+                VALUES (1, ?, 1200, '{"water": 10}', 0, 1210, ?)
+                """,
+                (f"2024-{month:02d}-01", f"202{4 if month < 8 else 5}-{month:02d}-02 00:00:00"),
+            )
+        db.execute(
+            """
+            INSERT INTO Payment (bill_id, amount, payment_date, remitter_name)
+            VALUES (1, 1210, '2024-01-05', 'Alice'), (2, 1000, '2025-02-05', 'Alice')
+            """
+        )
+        db.commit()
+        rebuild_lease_balances(db)
+
+    assert client.get("/unit/99/data").status_code == 404
+    data = client.get("/unit/1/data").get_json()
+    assert data["lease"]["unit_number"] == "101"
+    assert data["lease"]["monthly_rent"] == 0.0  # sold unit
+    assert len(data["all_bills"]) == 8
+    assert len(data["bills"]) == 6
+    assert data["bills"][0]["sent_at"].startswith("2025-08-02")
+    assert data["bill_years"] == [2024, 2025]
+    assert data["payment_years"] == [2024, 2025]
+    assert data["bill_options"][0]["billing_month"] == "2024-08-01"
+    assert data["balance"] == round(2210 - 8 * 1210, 2)
+
+    resp = client.get("/unit/1")
+    assert resp.status_code == 200
+    assert "Alice" in resp.get_data(as_text=True)